@@ -1,6 +1,17 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, Department, Establishment, IncidentReport, IncidentAssignment
+from . import search
+from .changelists import EstimatedCountPaginator
+from .models import User, Department, Establishment, IncidentReport, IncidentAssignment, IncidentAttachment, GeocodeCache, CategoryRoute, ImportCheckpoint
+
+# Admins of tables that grow without bound keep each changelist page to a fixed number of queries:
+# estimated counts, index seeks for the date hierarchy (changelists.py), filters on choice fields
+# only (a filter on a free-text field lists its distinct values from the whole table), related
+# rows joined in, and autocomplete pickers instead of <select>s of every row.
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    change_list_template = 'admin/luwasapp/indexed_change_list.html'
 
 class UserAdmin(BaseUserAdmin):
     fieldsets = (
@@ -20,26 +31,70 @@ class UserAdmin(BaseUserAdmin):
     ordering = ('username',)
     readonly_fields = ('date_joined',)
 
+class CategoryRouteInline(admin.TabularInline):
+    model = CategoryRoute
+    extra = 0
+
 class DepartmentAdmin(admin.ModelAdmin):
     list_display = ('name',)
     search_fields = ('name',)
+    inlines = [CategoryRouteInline]
 
 class EstablishmentAdmin(admin.ModelAdmin):
-    list_display = ('name', 'location', 'department')
+    list_display = ('name', 'location', 'department', 'latitude', 'longitude')
     search_fields = ('name', 'location', 'department__name')
 
-class IncidentReportAdmin(admin.ModelAdmin):
+class IncidentReportAdmin(LargeTableAdmin):
     list_display = ('reportid', 'incident_type', 'severity', 'status', 'location', 'timestamp', 'category')
-    search_fields = ('incident_type', 'severity', 'status', 'location')
-    list_filter = ('incident_type', 'severity', 'status', 'timestamp')
+    # What the full-text index covers; searches go through it (get_search_results)
+    search_fields = ('incident_type', 'description', 'location', 'resolved_address')
+    list_filter = ('status', 'severity', 'category', 'geocode_status')
+    date_hierarchy = 'timestamp'
+    ordering = ('-reportid',)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Also used by autocomplete pickers; a number finds that incident as well
+        if not search_term.strip():
+            return queryset, False
+        matches = search.matching(queryset, search_term)
+        if search_term.strip().isdigit():
+            matches |= queryset.filter(pk=int(search_term))
+        return matches, False
+
+class IncidentAssignmentAdmin(LargeTableAdmin):
+    list_display = ('user', 'incident_report', 'notification_sent', 'assigned_at', 'notification_attempts', 'notification_error')
+    list_select_related = ('user', 'incident_report')
+    autocomplete_fields = ('user', 'incident_report')
+    # Username prefixes (matched in the users table, then through the (user, incident) index); a number
+    # finds that incident's assignments
+    search_fields = ('^user__username',)
+    list_filter = ('notification_sent',)
+    date_hierarchy = 'assigned_at'
+
+    def get_search_results(self, request, queryset, search_term):
+        if search_term.strip().isdigit():
+            return queryset.filter(incident_report_id=int(search_term)), False
+        return super().get_search_results(request, queryset, search_term)
+
+class IncidentAttachmentAdmin(LargeTableAdmin):
+    list_display = ('filename', 'incident_report', 'uploaded_by', 'status', 'size', 'created_at')
+    list_select_related = ('incident_report', 'uploaded_by')
+    list_filter = ('status',)
+    readonly_fields = ('incident_report', 'uploaded_by', 'size', 'received', 'file', 'content_type', 'thumbnails', 'completed_at')
+
+class GeocodeCacheAdmin(admin.ModelAdmin):
+    list_display = ('provider', 'lat_key', 'lon_key', 'address', 'found', 'fetched_at')
+    list_filter = ('provider', 'found')
 
-class IncidentAssignmentAdmin(admin.ModelAdmin):
-    list_display = ('user', 'incident_report', 'notification_sent', 'assigned_at')
-    search_fields = ('user__username', 'incident_report__reportid')
-    list_filter = ('notification_sent', 'assigned_at')
+class ImportCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('name', 'rows_read', 'rows_imported', 'rows_rejected', 'assignments_imported', 'updated_at', 'finished_at')
+    readonly_fields = ('fingerprint', 'offset', 'started_at', 'updated_at')
 
 admin.site.register(User, UserAdmin)
 admin.site.register(Department, DepartmentAdmin)
 admin.site.register(Establishment, EstablishmentAdmin)
 admin.site.register(IncidentReport, IncidentReportAdmin)
-admin.site.register(IncidentAssignment, IncidentAssignmentAdmin)
\ No newline at end of file
+admin.site.register(IncidentAssignment, IncidentAssignmentAdmin)
+admin.site.register(IncidentAttachment, IncidentAttachmentAdmin)
+admin.site.register(GeocodeCache, GeocodeCacheAdmin)
+admin.site.register(ImportCheckpoint, ImportCheckpointAdmin)
\ No newline at end of file
@@ -0,0 +1,61 @@
+from django.db import IntegrityError, transaction
+
+from . import counters, events
+from .models import IncidentAssignment, IncidentReport, User
+
+
+def _insert(assignments):
+    # The assignments actually inserted. One statement normally; when a concurrent request assigned one
+    # of the pairs first, the unique constraint fails it and the batch goes in pair by pair, skipping
+    # the pairs already taken, so only rows this call created are counted, announced and returned.
+    try:
+        with transaction.atomic():
+            return IncidentAssignment.objects.bulk_create(assignments, batch_size=500)
+    except IntegrityError:
+        pass
+
+    inserted = []
+    for assignment in assignments:
+        # An earlier batch of the failed statement may have set it
+        assignment.pk = None
+        assignment._state.adding = True
+        try:
+            with transaction.atomic():
+                IncidentAssignment.objects.bulk_create([assignment])
+        except IntegrityError:
+            continue
+        inserted.append(assignment)
+    return inserted
+
+
+def bulk_assign(user_ids, incident_ids):
+    # Assign every user to every incident; returns (created, already_assigned)
+    user_ids = set(User.objects.filter(pk__in=set(user_ids)).values_list('pk', flat=True))
+    incident_ids = set(IncidentReport.objects.filter(pk__in=set(incident_ids)).values_list('pk', flat=True))
+    if not user_ids or not incident_ids:
+        return [], 0
+
+    with transaction.atomic():
+        # One duplicate check for the whole batch instead of a get_or_create per pair
+        existing = set(
+            IncidentAssignment.objects
+            .filter(user_id__in=user_ids, incident_report_id__in=incident_ids)
+            .values_list('user_id', 'incident_report_id')
+        )
+        candidates = [
+            IncidentAssignment(user_id=user_id, incident_report_id=incident_id)
+            for user_id in sorted(user_ids)
+            for incident_id in sorted(incident_ids)
+            if (user_id, incident_id) not in existing
+        ]
+        # The unique constraint settles races with a concurrent assignment of the same pair
+        new_assignments = _insert(candidates)
+        # bulk_create skips post_save, so keep the dashboard counters in step here
+        counters.record_assignments(
+            (assignment.user_id, assignment.incident_report_id) for assignment in new_assignments
+        )
+        for assignment in new_assignments:
+            events.publish_on_commit('assigned', {'id': assignment.incident_report_id, 'user_id': assignment.user_id})
+
+    # Pairs a concurrent request assigned first count as already assigned
+    return new_assignments, len(existing) + len(candidates) - len(new_assignments)
@@ -0,0 +1,311 @@
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+
+from . import images
+from .models import IncidentAttachment, IncidentReport
+
+logger = logging.getLogger(__name__)
+
+# Incident photos. A client starts an upload with the file's name and size, then PUTs it in chunks
+# (Content-Range: bytes first-last/size) that are appended to a partial file on disk; after a dropped
+# connection it asks how much arrived and continues from there. The complete file is checked with
+# Pillow and moved under a content-hash name, and thumbnails are made off the request thread (or by
+# `manage.py process_attachments`). The first photo's small thumbnail becomes the incident's cover,
+# which is all a card renders. Files are served with Range support and, being immutable, cached for good.
+
+DEFAULTS = {
+    'MAX_SIZE': 20 * 1024 * 1024,
+    'MAX_PER_INCIDENT': 10,
+    'CHUNK_SIZE': 1024 * 1024,                  # suggested to clients
+    'MAX_CHUNK_SIZE': 8 * 1024 * 1024,
+    'MAX_PIXELS': 60_000_000,
+    # label: (width, height, crop); small fills a board card, large fits the detail page
+    'SIZES': {'small': (480, 320, True), 'large': (1600, 1600, False)},
+    'FORMAT': 'webp',
+    'QUALITY': 80,
+    'ABANDON_AFTER': timedelta(days=1),         # unfinished uploads are deleted after this
+    'WORKER': 'thread',                         # 'thread' makes thumbnails in-process, 'command' leaves it to process_attachments
+    'WORKER_THREADS': 2,
+}
+PARTIAL_DIR = 'attachments/partial'
+THUMBNAILS_DIR = 'attachments/thumbs'
+CACHE_SECONDS = 365 * 24 * 60 * 60
+THUMBNAIL_NAME = re.compile(r'^[0-9a-f]{16}-\d+x\d+\.(webp|jpg)$')
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+STREAM_BLOCK = 64 * 1024
+
+
+def get_setting(name):
+    return getattr(settings, 'ATTACHMENTS', {}).get(name, DEFAULTS[name])
+
+
+def _storage():
+    return IncidentAttachment._meta.get_field('file').storage
+
+
+def _partial_path(attachment_id):
+    return _storage().path(f'{PARTIAL_DIR}/{attachment_id}.part')
+
+
+class OffsetMismatch(Exception):
+    # A chunk that doesn't start where the upload stands; the client should ask and resume
+    def __init__(self, attachment):
+        super().__init__(f'The upload continues at byte {attachment.received}.')
+        self.attachment = attachment
+
+
+#======================================================UPLOADS======================================================#
+
+def start(incident, user, filename, size):
+    # A new upload to `incident`; ValueError with a message for the client if it can't be taken
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise ValueError('size must be the number of bytes in the file.')
+    max_size = get_setting('MAX_SIZE')
+    if not 0 < size <= max_size:
+        raise ValueError(f'Photos must be at most {max_size // (1024 * 1024)} MB.')
+    if incident.attachments.exclude(status='failed').count() >= get_setting('MAX_PER_INCIDENT'):
+        raise ValueError(f"An incident can have at most {get_setting('MAX_PER_INCIDENT')} photos.")
+
+    attachment = IncidentAttachment.objects.create(
+        incident_report=incident, uploaded_by=user, filename=os.path.basename(str(filename or 'photo'))[:255], size=size,
+    )
+    os.makedirs(os.path.dirname(_partial_path(attachment.pk)), exist_ok=True)
+    open(_partial_path(attachment.pk), 'wb').close()
+    return attachment
+
+
+def upload_state(attachment):
+    return {
+        'id': attachment.pk,
+        'upload_url': reverse('attachment_upload', args=[attachment.pk]),
+        'offset': attachment.received,
+        'size': attachment.size,
+        'chunk_size': get_setting('CHUNK_SIZE'),
+        'status': attachment.status,
+        'error': attachment.error,
+    }
+
+
+def receive(attachment, content_range, stream):
+    # Appends the chunk in `stream` described by `content_range`; completes the upload with its last
+    # chunk. Returns the updated attachment.
+    match = CONTENT_RANGE.match(content_range)
+    if match is None:
+        raise ValueError('Send Content-Range: bytes <first>-<last>/<size>.')
+    first, last, total = (int(value) for value in match.groups())
+    length = last - first + 1
+    if total != attachment.size or length <= 0 or last >= total:
+        raise ValueError(f'The range must lie within the {attachment.size} bytes declared.')
+    if length > get_setting('MAX_CHUNK_SIZE'):
+        raise ValueError(f"Chunks can be at most {get_setting('MAX_CHUNK_SIZE')} bytes.")
+    if attachment.status != 'uploading' or first != attachment.received:
+        raise OffsetMismatch(attachment)
+
+    with open(_partial_path(attachment.pk), 'r+b') as f:
+        f.seek(first)
+        remaining = length
+        while remaining:
+            block = stream.read(min(STREAM_BLOCK, remaining))
+            if not block:
+                break
+            f.write(block)
+            remaining -= len(block)
+    if remaining:
+        # The connection dropped mid-chunk; the bytes past `received` are overwritten by the retry
+        raise ValueError('The chunk ended early.')
+
+    # Only one request moves an upload on from a given offset
+    moved = IncidentAttachment.objects.filter(pk=attachment.pk, status='uploading', received=first).update(received=last + 1)
+    attachment.refresh_from_db()
+    if not moved:
+        raise OffsetMismatch(attachment)
+    if attachment.received == attachment.size:
+        _complete(attachment)
+    return attachment
+
+
+def _complete(attachment):
+    partial = _partial_path(attachment.pk)
+    try:
+        with open(partial, 'rb') as f:
+            extension = images.identify(f, get_setting('MAX_PIXELS'))
+            f.seek(0)
+            digest = images.content_hash(iter(lambda: f.read(STREAM_BLOCK), b''))
+    except ValueError as error:
+        os.remove(partial)
+        attachment.status, attachment.error = 'failed', str(error)
+        attachment.save(update_fields=['status', 'error'])
+        raise
+
+    # Under a name of its own: the same photo attached twice is deleted independently
+    name = f'attachments/{attachment.incident_report_id}/{attachment.pk}-{digest}{extension}'
+    path = _storage().path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(partial, path)
+    attachment.file.name = name
+    attachment.content_type = images.CONTENT_TYPES[extension]
+    attachment.status = 'processing'
+    attachment.completed_at = timezone.now()
+    attachment.save(update_fields=['file', 'content_type', 'status', 'completed_at'])
+    enqueue(attachment.pk)
+
+
+def abandoned():
+    # Uploads nobody finished in time
+    return IncidentAttachment.objects.filter(
+        status='uploading', created_at__lt=timezone.now() - get_setting('ABANDON_AFTER'),
+    )
+
+
+def delete_files(attachment):
+    # The partial or complete upload; thumbnails are named by content and may be shared
+    if attachment.file:
+        attachment.file.delete(save=False)
+    partial = _partial_path(attachment.pk)
+    if os.path.exists(partial):
+        os.remove(partial)
+
+
+#======================================================THUMBNAILS======================================================#
+
+def make_thumbnails(attachment_id):
+    # Makes the attachment's thumbnails and marks it ready; returns the new status, or None if it's gone
+    attachment = IncidentAttachment.objects.filter(pk=attachment_id).exclude(file='').first()
+    if attachment is None:
+        return None
+    try:
+        thumbnails = images.make_thumbnails(
+            attachment.file.storage, attachment.file.name, THUMBNAILS_DIR, get_setting('SIZES'),
+            get_setting('FORMAT'), get_setting('QUALITY'),
+        )
+    except Exception as error:
+        # An unreadable or vanished file; process_attachments --retry-failed tries again
+        IncidentAttachment.objects.filter(pk=attachment_id).update(status='failed', error=str(error)[:255])
+        raise
+
+    with transaction.atomic():
+        IncidentAttachment.objects.filter(pk=attachment_id).update(status='ready', thumbnails=thumbnails, error='')
+        # The first photo becomes the cover; either way the detail page's photos change
+        IncidentReport.objects.filter(pk=attachment.incident_report_id).update(
+            cover_thumbnail=Coalesce('cover_thumbnail', Value(thumbnails['small'])), updated_at=timezone.now(),
+        )
+    return 'ready'
+
+
+def refresh_cover(incident_id):
+    # After a photo is deleted: the oldest remaining photo's thumbnail, or none
+    cover = (
+        IncidentAttachment.objects.filter(incident_report_id=incident_id, status='ready')
+        .order_by('pk').values_list('thumbnails__small', flat=True).first()
+    )
+    IncidentReport.objects.filter(pk=incident_id).update(cover_thumbnail=cover, updated_at=timezone.now())
+
+
+def thumbnail_url(name):
+    return reverse('attachment_thumbnail', args=[os.path.basename(name)])
+
+
+def thumbnail_path(name):
+    # Storage name of a thumbnail served at /attachments/thumbs/<name>, or None if `name` isn't one
+    return f'{THUMBNAILS_DIR}/{name}' if THUMBNAIL_NAME.match(name) else None
+
+
+#======================================================SERVING======================================================#
+
+def _requested_range(header, size):
+    # (first, last) of a single-range Range header; None to send everything (no header, several ranges,
+    # or a form we don't handle); 'unsatisfiable' when it starts past the end
+    match = RANGE.match(header or '')
+    if match is None or match.group(1) == match.group(2) == '':
+        return None
+    first, last = match.groups()
+    if first == '':
+        # The last N bytes
+        length = min(int(last), size)
+        return (size - length, size - 1) if length else 'unsatisfiable'
+    first = int(first)
+    last = min(int(last), size - 1) if last else size - 1
+    if first >= size or first > last:
+        return 'unsatisfiable'
+    return first, last
+
+
+def _read_range(f, first, last):
+    try:
+        f.seek(first)
+        remaining = last - first + 1
+        while remaining:
+            block = f.read(min(STREAM_BLOCK, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+    finally:
+        f.close()
+
+
+def serve(request, storage, name, content_type):
+    # The stored file, or the byte range asked for; the name never changes, so neither does the file
+    size = storage.size(name)
+    requested = _requested_range(request.headers.get('Range'), size)
+    if requested == 'unsatisfiable':
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    f = storage.open(name)
+    if requested is None:
+        response = FileResponse(f, content_type=content_type)
+    else:
+        first, last = requested
+        response = StreamingHttpResponse(_read_range(f, first, last), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {first}-{last}/{size}'
+        response['Content-Length'] = last - first + 1
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = f'"{os.path.basename(name)}"'
+    response['Cache-Control'] = f'private, max-age={CACHE_SECONDS}, immutable'
+    return response
+
+
+#======================================================WORKER======================================================#
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=get_setting('WORKER_THREADS'), thread_name_prefix='attachments')
+        return _executor
+
+
+def _make_in_worker(attachment_id):
+    try:
+        make_thumbnails(attachment_id)
+    except Exception:
+        logger.exception('Making thumbnails for attachment %s failed', attachment_id)
+    finally:
+        connections.close_all()
+
+
+def enqueue(attachment_id):
+    # With the thread worker, thumbnails are made once the write commits
+    if get_setting('WORKER') == 'thread':
+        transaction.on_commit(lambda: _get_executor().submit(_make_in_worker, attachment_id))
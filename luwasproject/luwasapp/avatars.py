@@ -0,0 +1,134 @@
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.urls import reverse
+
+from . import images, users
+
+logger = logging.getLogger(__name__)
+
+# Profile images. An upload is checked with Pillow and stored under a name made from its content hash
+# (Django spools large uploads to a temporary file; storing and hashing read it in chunks). Square
+# thumbnails of each size are then made off the request thread, or by `manage.py profile_thumbnails`,
+# and recorded on User.profile_thumbnails with the image they were made from. Thumbnail names are
+# content hashes too (images.py), so /avatars/<name> is served with a far-future max-age.
+
+DEFAULTS = {
+    'SIZES': {'small': 96, 'large': 400},  # px; twice the sidebar and profile page avatars
+    'FORMAT': 'webp',                       # jpeg when Pillow is built without WebP
+    'QUALITY': 82,
+    'MAX_UPLOAD_SIZE': 10 * 1024 * 1024,
+    'MAX_PIXELS': 40_000_000,
+    'WORKER': 'thread',                     # 'thread' makes thumbnails in-process, 'command' leaves it to profile_thumbnails
+    'WORKER_THREADS': 1,
+}
+THUMBNAILS_DIR = 'profile_images/thumbs'
+CACHE_SECONDS = 365 * 24 * 60 * 60
+THUMBNAIL_NAME = re.compile(r'^[0-9a-f]{16}-\d+(x\d+)?\.(webp|jpg)$')
+
+
+def get_setting(name):
+    return getattr(settings, 'PROFILE_IMAGES', {}).get(name, DEFAULTS[name])
+
+
+#======================================================UPLOADS======================================================#
+
+def save_upload(user, upload):
+    # Checks `upload` and stores it as the user's profile image (saving the user is left to the caller).
+    # Raises ValueError with a message for the user if it isn't a usable picture.
+    max_size = get_setting('MAX_UPLOAD_SIZE')
+    if upload.size > max_size:
+        raise ValueError(f'Profile images can be at most {max_size // (1024 * 1024)} MB.')
+    extension = images.identify(upload, get_setting('MAX_PIXELS'))
+
+    upload.seek(0)
+    field = user._meta.get_field('profile_image')
+    name = f'{field.upload_to}{images.content_hash(upload.chunks())}{extension}'
+    if not field.storage.exists(name):
+        upload.seek(0)
+        name = field.storage.save(name, upload)
+    user.profile_image.name = name
+    user.profile_thumbnails = {}
+
+
+#======================================================THUMBNAILS======================================================#
+
+def is_current(user):
+    # Whether the user's thumbnails were made from the current image, in every size
+    thumbnails = user.profile_thumbnails or {}
+    return thumbnails.get('source') == user.profile_image.name and all(size in thumbnails for size in get_setting('SIZES'))
+
+
+def make_thumbnails(user_id):
+    # Makes and records the user's thumbnails; returns them, or None if the user has no image
+    from .models import User
+
+    user = User.objects.filter(pk=user_id).only('profile_image', 'profile_thumbnails').first()
+    if user is None or not user.profile_image:
+        return None
+    source = user.profile_image.name
+    sizes = {label: (size, size, True) for label, size in get_setting('SIZES').items()}
+    thumbnails = {'source': source, **images.make_thumbnails(
+        user.profile_image.storage, source, THUMBNAILS_DIR, sizes, get_setting('FORMAT'), get_setting('QUALITY'),
+    )}
+
+    # Unless the image changed meanwhile
+    if User.objects.filter(pk=user_id, profile_image=source).update(profile_thumbnails=thumbnails):
+        users.invalidate(user_id)
+    return thumbnails
+
+
+def url(user, size):
+    # URL of the user's thumbnail of `size`, or of the original until it is made; None without an image
+    if not user.profile_image:
+        return None
+    if not is_current(user):
+        return user.profile_image.url
+    return reverse('avatar', args=[os.path.basename(user.profile_thumbnails[size])])
+
+
+def thumbnail_path(name):
+    # Storage name of a thumbnail served at /avatars/<name>, or None if `name` isn't one
+    return f'{THUMBNAILS_DIR}/{name}' if THUMBNAIL_NAME.match(name) else None
+
+
+#======================================================WORKER======================================================#
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=get_setting('WORKER_THREADS'), thread_name_prefix='thumbnails')
+        return _executor
+
+
+def _make_in_worker(user_id):
+    try:
+        make_thumbnails(user_id)
+    except Exception:
+        logger.exception('Making profile thumbnails for user %s failed', user_id)
+    finally:
+        connections.close_all()
+
+
+def enqueue(user_id):
+    # With the thread worker, thumbnails are made once the write commits
+    if get_setting('WORKER') == 'thread':
+        transaction.on_commit(lambda: _get_executor().submit(_make_in_worker, user_id))
+
+
+def stale_users():
+    # Ids of users with an image whose thumbnails are missing or outdated
+    from .models import User
+
+    rows = User.objects.exclude(profile_image='').exclude(profile_image__isnull=True).only('profile_image', 'profile_thumbnails')
+    return [user.pk for user in rows.iterator() if not is_current(user)]
@@ -0,0 +1,83 @@
+import os
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.db import connections
+from django.utils import timezone
+
+# Helpers shared by the benchmark management commands
+
+
+@contextmanager
+def scratch_database(alias='benchmark', path=None, models=(), options=None, pragmas=None, keep=False):
+    # A throwaway SQLite database registered as an extra connection alias, with tables for `models`.
+    # `options` and `pragmas` are its OPTIONS and PRAGMAS (see SQLITE_PRODUCTION in settings).
+    if path is None:
+        fd, path = tempfile.mkstemp(prefix=f'luwas-{alias}-', suffix='.sqlite3')
+        os.close(fd)
+        os.remove(path)
+    connections.settings[alias] = connections.configure_settings({
+        'default': connections.settings['default'],
+        alias: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': str(path), 'OPTIONS': options or {}, 'PRAGMAS': pragmas or {}},
+    })[alias]
+    connection = connections[alias]
+    try:
+        if models:
+            with connection.schema_editor() as editor:
+                for model in models:
+                    editor.create_model(model)
+        yield connection
+    finally:
+        connection.close()
+        del connections[alias]
+        del connections.settings[alias]
+        if not keep:
+            for suffix in ('', '-wal', '-shm', '-journal'):
+                if os.path.exists(f'{path}{suffix}'):
+                    os.remove(f'{path}{suffix}')
+
+
+def insert_rows(connection, model, rows, batch_size=10000):
+    # Fast raw insert of dicts keyed by field name; unspecified fields get their defaults, and
+    # auto_now/auto_now_add fields the current time. Unlike bulk_create this keeps explicit values
+    # for those fields, such as historical timestamps.
+    fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    sql = f'INSERT INTO {connection.ops.quote_name(model._meta.db_table)} ({columns}) VALUES ({placeholders})'
+    now = timezone.now()
+    defaults = {
+        field.attname: field.to_python(now) if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+        else field.get_default()
+        for field in fields
+    }
+
+    inserted = 0
+    batch = []
+    with connection.cursor() as cursor:
+        for row in rows:
+            batch.append([
+                field.get_db_prep_save(row.get(field.attname, row.get(field.name, defaults[field.attname])), connection)
+                for field in fields
+            ])
+            if len(batch) >= batch_size:
+                cursor.executemany(sql, batch)
+                inserted += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(sql, batch)
+            inserted += len(batch)
+    return inserted
+
+
+def time_call(func, repeat=5):
+    # Median wall time in milliseconds over `repeat` runs, after one warm-up run
+    func()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
@@ -0,0 +1,63 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+from .models import IncidentReport
+
+BOARD_STATUSES = ['reported', 'resolved', 'closed']
+BOARD_PAGE_SIZE = 20
+
+# The only columns an incident card renders (updated_at versions its cached fragment)
+CARD_FIELDS = ['reportid', 'incident_type', 'category', 'status', 'location', 'timestamp', 'updated_at', 'cover_thumbnail']
+
+
+def encode_cursor(incident):
+    raw = f'{incident.timestamp.isoformat()}|{incident.reportid}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    # Returns (timestamp, reportid), or None for a missing or malformed cursor
+    if not cursor:
+        return None
+    try:
+        timestamp, reportid = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(timestamp), int(reportid)
+    except (ValueError, UnicodeError):
+        return None
+
+
+def _older_than(cursor):
+    timestamp, reportid = cursor
+    return Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, reportid__lt=reportid)
+
+
+def load_board(categories, statuses=BOARD_STATUSES, cursors=None, page_size=BOARD_PAGE_SIZE):
+    # One query for every column: the newest `page_size` cards per status after that status's cursor.
+    # Returns {status: {'incidents': [...], 'next_cursor': str or None}}.
+    cursors = cursors or {}
+    newest_per_status = Q()
+    for status in statuses:
+        page = IncidentReport.objects.filter(category__in=categories, status=status)
+        cursor = cursors.get(status)
+        if cursor is not None:
+            page = page.filter(_older_than(cursor))
+        # One extra row tells us whether there is another page
+        page = page.order_by('-timestamp', '-reportid').values('reportid')[:page_size + 1]
+        newest_per_status |= Q(reportid__in=page)
+
+    incidents = (
+        IncidentReport.objects.filter(newest_per_status)
+        .only(*CARD_FIELDS)
+        .order_by('-timestamp', '-reportid')
+    )
+
+    board = {status: {'incidents': [], 'next_cursor': None} for status in statuses}
+    for incident in incidents:
+        board[incident.status]['incidents'].append(incident)
+    for column in board.values():
+        if len(column['incidents']) > page_size:
+            del column['incidents'][page_size:]
+            column['next_cursor'] = encode_cursor(column['incidents'][-1])
+    return board
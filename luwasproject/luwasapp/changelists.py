@@ -0,0 +1,101 @@
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+# Admin changelists over tables that grow without bound (incidents, assignments, attachments). Stock
+# changelists run an exact COUNT(*) of the list (and another of the whole table), and the date
+# hierarchy runs SELECT DISTINCT over every row in range; both grow with the table. Here:
+#   - an unfiltered list of a large table is counted from the planner's statistics (sqlite_stat1,
+#     refreshed by ANALYZE; pg_class.reltuples, kept current by autovacuum), and a filtered list is
+#     counted up to COUNT_LIMIT matches
+#   - the date hierarchy offers each year, month or day after an EXISTS probe on the date column's
+#     index: at most 31 seeks, however many rows there are
+
+COUNT_LIMIT = 10_000
+
+
+def estimated_rows(model, using):
+    # Rows in the model's table according to the planner's statistics, or None without any
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            try:
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s', [table])
+            except DatabaseError:
+                # Never analyzed; SQLite has no sqlite_stat1 table yet
+                return None
+            # One row per index, led by the rows it covers: the table's for a full index, fewer for a
+            # partial one (assignment_outbox_idx), so the table's count is the largest
+            counts = [int(stat.split()[0]) for stat, in cursor.fetchall() if stat]
+            return max(counts) if counts else None
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [table])
+            row = cursor.fetchone()
+            return int(row[0]) if row and row[0] >= 0 else None
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    # Past COUNT_LIMIT rows the count is an estimate (unfiltered) or COUNT_LIMIT (filtered): the
+    # first COUNT_LIMIT matches are pageable, the rest are narrowed down with filters or search
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_rows(queryset.model, queryset.db)
+            if estimate is not None and estimate > COUNT_LIMIT:
+                return estimate
+        return queryset.order_by()[:COUNT_LIMIT].count()
+
+
+#======================================================DATE HIERARCHY======================================================#
+
+def _bound(day):
+    moment = datetime(day.year, day.month, day.day)
+    return timezone.make_aware(moment) if settings.USE_TZ else moment
+
+
+def _next_month(day):
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def _has_rows(queryset, field_name, first, stop):
+    return queryset.filter(**{f'{field_name}__gte': _bound(first), f'{field_name}__lt': _bound(stop)}).exists()
+
+
+def _edge(queryset, field_name, newest):
+    moment = queryset.order_by(f'-{field_name}' if newest else field_name).values_list(field_name, flat=True).first()
+    if moment is not None and timezone.is_aware(moment):
+        moment = timezone.localtime(moment)
+    return moment
+
+
+def date_range(queryset, field_name):
+    # (oldest, newest) in the list, in the current time zone, or None if it's empty; one index seek
+    # each, where MIN() and MAX() in one query would scan
+    first = _edge(queryset, field_name, newest=False)
+    return None if first is None else (first, _edge(queryset, field_name, newest=True))
+
+
+def years(queryset, field_name, first, last):
+    # Years from `first` to `last` with rows in the list
+    return [
+        year for year in range(first.year, last.year + 1)
+        if year in (first.year, last.year) or _has_rows(queryset, field_name, date(year, 1, 1), date(year + 1, 1, 1))
+    ]
+
+
+def months(queryset, field_name, year):
+    starts = [date(year, month, 1) for month in range(1, 13)]
+    return [start for start in starts if _has_rows(queryset, field_name, start, _next_month(start))]
+
+
+def days(queryset, field_name, year, month):
+    first = date(year, month, 1)
+    starts = [first + timedelta(days=offset) for offset in range((_next_month(first) - first).days)]
+    return [start for start in starts if _has_rows(queryset, field_name, start, start + timedelta(days=1))]
@@ -0,0 +1,105 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from . import dashboard
+from .models import IncidentAssignment, IncidentCounter, IncidentReport
+
+# Counters are keyed (user_id or None for global, dimension, key) and adjusted with deltas
+DIMENSIONS = ('category', 'status')
+
+
+def incident_deltas(category, status, sign, user_ids=(None,)):
+    deltas = Counter()
+    for user_id in user_ids:
+        deltas[(user_id, 'category', category or '')] += sign
+        deltas[(user_id, 'status', status or '')] += sign
+    return deltas
+
+
+def apply(deltas):
+    # Make sure every row exists, then adjust them with one UPDATE per (dimension, key, delta)
+    deltas = {counter: delta for counter, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    IncidentCounter.objects.bulk_create(
+        [IncidentCounter(user_id=user_id, dimension=dimension, key=key) for user_id, dimension, key in deltas],
+        ignore_conflicts=True,
+    )
+    groups = defaultdict(list)
+    for (user_id, dimension, key), delta in deltas.items():
+        groups[(dimension, key, delta)].append(user_id)
+    for (dimension, key, delta), user_ids in groups.items():
+        owners = Q(user_id__in=[user_id for user_id in user_ids if user_id is not None])
+        if None in user_ids:
+            owners |= Q(user__isnull=True)
+        IncidentCounter.objects.filter(owners, dimension=dimension, key=key).update(count=F('count') + delta)
+
+    dashboard.invalidate_after_commit({user_id for user_id, _, _ in deltas})
+
+
+def record_incident_change(incident_id, old, new):
+    # old/new are (category, status) tuples; None for a created or deleted incident
+    if old == new:
+        return
+    deltas = Counter()
+    if old is not None:
+        deltas.update(incident_deltas(*old, -1))
+    if new is not None:
+        deltas.update(incident_deltas(*new, +1))
+    if old is not None and new is not None:
+        # Assigned users see the incident move between their own buckets too
+        user_ids = list(IncidentAssignment.objects.filter(incident_report_id=incident_id).values_list('user_id', flat=True))
+        if user_ids:
+            deltas.update(incident_deltas(*old, -1, user_ids))
+            deltas.update(incident_deltas(*new, +1, user_ids))
+    apply(deltas)
+
+
+def record_assignments(pairs, sign=+1):
+    # pairs are (user_id, incident_id) that were just assigned (sign=+1) or unassigned (sign=-1)
+    pairs = list(pairs)
+    if not pairs:
+        return
+    incidents = dict(
+        (pk, (category, status)) for pk, category, status in
+        IncidentReport.objects.filter(pk__in={incident_id for _, incident_id in pairs}).values_list('pk', 'category', 'status')
+    )
+    deltas = Counter()
+    for user_id, incident_id in pairs:
+        if incident_id in incidents:
+            deltas.update(incident_deltas(*incidents[incident_id], sign, [user_id]))
+    apply(deltas)
+
+
+def rebuild():
+    # Recompute every counter from scratch
+    rows = []
+    for dimension in DIMENSIONS:
+        for row in IncidentReport.objects.values(dimension).annotate(total=Count('pk')).order_by():
+            rows.append(IncidentCounter(dimension=dimension, key=row[dimension] or '', count=row['total']))
+        field = f'incident_report__{dimension}'
+        for row in IncidentAssignment.objects.values('user_id', field).annotate(total=Count('pk')).order_by():
+            rows.append(IncidentCounter(user_id=row['user_id'], dimension=dimension, key=row[field] or '', count=row['total']))
+    with transaction.atomic():
+        IncidentCounter.objects.all().delete()
+        IncidentCounter.objects.bulk_create(rows, batch_size=1000)
+        dashboard.invalidate_after_commit(everyone=True)
+    return len(rows)
+
+
+def global_series():
+    return _series(IncidentCounter.objects.filter(user__isnull=True), 'incidents_by_{}', '{}')
+
+
+def user_series(user):
+    return _series(IncidentCounter.objects.filter(user=user), 'user_incidents_by_{}', 'incident_report__{}')
+
+
+def _series(counters, series_name, item_key):
+    # Dashboard series in the shape the charts expect, from a single small query
+    series = {series_name.format(dimension): [] for dimension in DIMENSIONS}
+    for dimension, key, count in counters.filter(count__gt=0).order_by('-count', 'key').values_list('dimension', 'key', 'count'):
+        series[series_name.format(dimension)].append({item_key.format(dimension): key, 'count': count})
+    return series
@@ -0,0 +1,78 @@
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import counters, replicas
+
+# Cached dashboard series. Each scope (global, or one user) has a version stamp that is bumped
+# whenever its counters change; cached series and ETags are keyed on those stamps.
+
+GLOBAL_VERSION_KEY = 'dashboard:version:global'
+EPOCH_KEY = 'dashboard:version:epoch'
+
+
+def _timeout():
+    # Bounds how stale a process can be when the cache is not shared between workers
+    return getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 60)
+
+
+def _user_version_key(user_id):
+    return f'dashboard:version:user:{user_id}'
+
+
+def versions(user_id):
+    # (global, user) version stamps as epoch seconds, initialised on first use
+    epoch = cache.get(EPOCH_KEY) or 0
+    keys = [GLOBAL_VERSION_KEY, _user_version_key(user_id)]
+    stamps = cache.get_many(keys)
+    now = time.time()
+    for key in keys:
+        if key not in stamps:
+            cache.add(key, now, _timeout())
+            stamps[key] = cache.get(key, now)
+    return max(stamps[keys[0]], epoch), max(stamps[keys[1]], epoch)
+
+
+def invalidate(user_ids=(), everyone=False):
+    now = time.time()
+    if everyone:
+        cache.set(EPOCH_KEY, now, None)
+    updates = {_user_version_key(user_id): now for user_id in user_ids if user_id is not None}
+    if everyone or None in user_ids:
+        updates[GLOBAL_VERSION_KEY] = now
+    cache.set_many(updates, _timeout())
+
+
+def invalidate_after_commit(user_ids=(), everyone=False):
+    user_ids = set(user_ids)
+    transaction.on_commit(lambda: invalidate(user_ids, everyone))
+
+
+def etag(user_id):
+    global_version, user_version = versions(user_id)
+    return f'"{global_version:.6f}-{user_version:.6f}"'
+
+
+def last_modified(user_id):
+    return datetime.fromtimestamp(max(versions(user_id)), tz=timezone.utc)
+
+
+def series(user):
+    # The four chart series for `user`, served from the cache until a relevant counter changes
+    global_version, user_version = versions(user.pk)
+    global_key = f'dashboard:series:global:{global_version}'
+    user_key = f'dashboard:series:user:{user.pk}:{user_version}'
+    cached = cache.get_many([global_key, user_key])
+
+    # Cached under versions bumped by primary commits, so computed from the primary
+    with replicas.use_primary():
+        if global_key not in cached:
+            cached[global_key] = counters.global_series()
+            cache.set(global_key, cached[global_key], _timeout())
+        if user_key not in cached:
+            cached[user_key] = counters.user_series(user)
+            cache.set(user_key, cached[user_key], _timeout())
+    return {**cached[global_key], **cached[user_key]}
@@ -0,0 +1,31 @@
+import re
+
+# Per-connection database setup. A DATABASES entry may carry 'PRAGMAS' ({name: value}), set on every
+# new SQLite connection from signals.py (see SQLITE_PRODUCTION in settings); other backends ignore it.
+
+_PRAGMA_NAME = re.compile(r'^[a-z_]+$')
+_PRAGMA_VALUE = re.compile(r'^-?\w+$')
+
+
+def apply_pragmas(connection):
+    pragmas = connection.settings_dict.get('PRAGMAS')
+    if connection.vendor != 'sqlite' or not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            # PRAGMA takes no parameters; only let plain names and values through
+            if not _PRAGMA_NAME.match(name) or not _PRAGMA_VALUE.match(str(value)):
+                raise ValueError(f'Invalid SQLite pragma {name} = {value!r}')
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def pragma_values(connection, names):
+    # Current values, e.g. to check that a profile took effect
+    with connection.cursor() as cursor:
+        values = {}
+        for name in names:
+            if not _PRAGMA_NAME.match(name):
+                raise ValueError(f'Invalid SQLite pragma {name}')
+            cursor.execute(f'PRAGMA {name}')
+            values[name] = cursor.fetchone()[0]
+        return values
@@ -0,0 +1,152 @@
+import heapq
+import math
+import threading
+import time
+
+from django.core.cache import cache
+from django.db.models import Count, Exists, OuterRef, Q
+
+from . import replicas, routing
+from .geohash import EARTH_RADIUS_KM, haversine_km
+from .models import Establishment, IncidentAssignment, User
+
+try:
+    import numpy
+except ImportError:  # the pure-Python ranking is used instead
+    numpy = None
+
+# Nearest-responder suggestions. Establishment coordinates live in an in-memory index per process,
+# rebuilt when the version stamp in the cache moves (any establishment save or delete bumps it).
+
+VERSION_KEY = 'dispatch:establishments:version'
+SUGGESTION_LIMIT = 5
+RESPONDERS_PER_ESTABLISHMENT = 3
+CLOSED_STATUSES = ['resolved', 'closed']
+
+
+class EstablishmentIndex:
+    # Rows are (establishment_id, department_id, latitude, longitude)
+
+    def __init__(self, rows, use_numpy=None):
+        rows = [row for row in rows if row[2] is not None and row[3] is not None]
+        self.use_numpy = numpy is not None if use_numpy is None else use_numpy
+        self.ids = [row[0] for row in rows]
+        self.department_ids = [row[1] for row in rows]
+        if self.use_numpy:
+            self._ids = numpy.array(self.ids, dtype=numpy.int64)
+            self._departments = numpy.array(self.department_ids, dtype=numpy.int64)
+            self._lat = numpy.radians(numpy.array([row[2] for row in rows], dtype=numpy.float64))
+            self._lon = numpy.radians(numpy.array([row[3] for row in rows], dtype=numpy.float64))
+            self._cos_lat = numpy.cos(self._lat)
+        else:
+            self._points = [(row[0], row[1], row[2], row[3]) for row in rows]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def rank(self, lat, lon, department_ids=None, limit=SUGGESTION_LIMIT):
+        # [(establishment_id, distance_km)] nearest first, optionally only for the given departments
+        if self.use_numpy:
+            return self._rank_numpy(lat, lon, department_ids, limit)
+        return self._rank_python(lat, lon, department_ids, limit)
+
+    def _rank_numpy(self, lat, lon, department_ids, limit):
+        if department_ids is None:
+            candidates = numpy.arange(len(self.ids))
+        else:
+            candidates = numpy.flatnonzero(numpy.isin(self._departments, list(department_ids)))
+        if not len(candidates) or limit <= 0:
+            return []
+        phi, lam = math.radians(lat), math.radians(lon)
+        a = (
+            numpy.sin((self._lat[candidates] - phi) / 2) ** 2
+            + math.cos(phi) * self._cos_lat[candidates] * numpy.sin((self._lon[candidates] - lam) / 2) ** 2
+        )
+        distances = 2 * EARTH_RADIUS_KM * numpy.arcsin(numpy.sqrt(numpy.minimum(a, 1.0)))
+        if limit < len(candidates):
+            nearest = numpy.argpartition(distances, limit - 1)[:limit]
+        else:
+            nearest = numpy.arange(len(candidates))
+        nearest = nearest[numpy.argsort(distances[nearest], kind='stable')]
+        return [(int(self._ids[candidates[i]]), float(distances[i])) for i in nearest]
+
+    def _rank_python(self, lat, lon, department_ids, limit):
+        departments = None if department_ids is None else set(department_ids)
+        return heapq.nsmallest(limit, (
+            (establishment_id, haversine_km(lat, lon, establishment_lat, establishment_lon))
+            for establishment_id, department_id, establishment_lat, establishment_lon in self._points
+            if departments is None or department_id in departments
+        ), key=lambda result: result[1])
+
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+
+def _current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def establishment_index():
+    global _index, _index_version
+    version = _current_version()
+    if _index is None or _index_version != version:
+        with _index_lock:
+            if _index is None or _index_version != version:
+                # From the primary: a replica behind the version bump would leave the index stale until the next one
+                with replicas.use_primary():
+                    rows = Establishment.objects.filter(latitude__isnull=False, longitude__isnull=False).values_list(
+                        'id', 'department_id', 'latitude', 'longitude'
+                    )
+                    _index, _index_version = EstablishmentIndex(rows), version
+    return _index
+
+
+def invalidate():
+    cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def departments_for_category(category):
+    return [department_id for department_id, categories in routing.department_index().items() if category in categories]
+
+
+def suggest(incident, limit=SUGGESTION_LIMIT, responders_per_establishment=RESPONDERS_PER_ESTABLISHMENT):
+    # Nearest establishments whose department responds to the incident's category, each with its
+    # least busy active responders. Returns [{'establishment', 'distance_km', 'responders'}].
+    if incident.latitude is None or incident.longitude is None:
+        return []
+    ranked = establishment_index().rank(
+        incident.latitude, incident.longitude, departments_for_category(incident.category), limit
+    )
+    if not ranked:
+        return []
+
+    establishment_ids = [establishment_id for establishment_id, _ in ranked]
+    establishments = Establishment.objects.select_related('department').in_bulk(establishment_ids)
+    responders = (
+        User.objects.filter(establishment_id__in=establishment_ids, is_active=True)
+        .only('id', 'username', 'first_name', 'last_name', 'establishment_id')
+        .annotate(
+            open_assignments=Count('assignments', filter=~Q(assignments__incident_report__status__in=CLOSED_STATUSES)),
+            assigned_here=Exists(IncidentAssignment.objects.filter(user=OuterRef('pk'), incident_report_id=incident.pk)),
+        )
+        .order_by('open_assignments', 'username')
+    )
+    by_establishment = {}
+    for responder in responders:
+        by_establishment.setdefault(responder.establishment_id, []).append(responder)
+
+    return [
+        {
+            'establishment': establishments[establishment_id],
+            'distance_km': distance,
+            'responders': by_establishment.get(establishment_id, [])[:responders_per_establishment],
+        }
+        for establishment_id, distance in ranked
+        if establishment_id in establishments
+    ]
@@ -0,0 +1,170 @@
+import asyncio
+import json
+import threading
+import uuid
+from collections import deque
+
+from django.db import transaction
+
+# In-process pub/sub for the live incident feed. Write paths publish after commit from any thread;
+# each SSE connection is an asyncio queue on the server's event loop, so idle clients cost no thread.
+# Events only reach clients connected to the same process: run the feed on a single ASGI worker
+# or put a shared broker in front of this one before scaling out.
+
+HISTORY_SIZE = 500  # recent events kept for clients reconnecting with Last-Event-ID
+QUEUE_SIZE = 100  # events buffered per client before it is told to reload
+HEARTBEAT_SECONDS = 15
+RETRY_MILLISECONDS = 5000
+POLL_MILLISECONDS = 5000  # how often browsers poll a WSGI server (sse_catch_up)
+
+# Event ids are "<process token>:<sequence>", so ids from another process or an earlier run are detected
+BOOT_TOKEN = uuid.uuid4().hex[:8]
+
+
+class Subscription:
+    def __init__(self, broker, accept):
+        self.broker = broker
+        self.accept = accept
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+
+    def deliver(self, event):
+        # Called from whichever thread published; hop onto the subscriber's loop
+        if self.accept(event):
+            self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        if self.queue.full():
+            # Too far behind to catch up: drop the backlog and tell the client to reload
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            event = {'id': event['id'], 'type': 'reset', 'data': {}}
+        self.queue.put_nowait(event)
+
+    async def get(self):
+        return await self.queue.get()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    def __init__(self, history_size=HISTORY_SIZE):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._history = deque(maxlen=history_size)
+        self._sequence = 0
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def publish(self, event_type, data):
+        with self._lock:
+            self._sequence += 1
+            event = {'id': f'{BOOT_TOKEN}:{self._sequence}', 'type': event_type, 'data': data}
+            self._history.append((self._sequence, event))
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.deliver(event)
+            except RuntimeError:
+                # Its event loop has shut down
+                self.unsubscribe(subscriber)
+        return event
+
+    def subscribe(self, accept=lambda event: True, last_event_id=None):
+        # Must be called on the subscriber's event loop. Replays what a reconnecting client missed.
+        subscription = Subscription(self, accept)
+        with self._lock:
+            self._subscribers.add(subscription)
+            if last_event_id:
+                missed = self._missed_since(last_event_id)
+                if missed is None:
+                    subscription._put({'id': f'{BOOT_TOKEN}:{self._sequence}', 'type': 'reset', 'data': {}})
+                else:
+                    for event in missed:
+                        if accept(event):
+                            subscription._put(event)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def catch_up(self, last_event_id):
+        # (events after last_event_id or None as in _missed_since, id of the newest event)
+        with self._lock:
+            missed = self._missed_since(last_event_id) if last_event_id else []
+            return missed, f'{BOOT_TOKEN}:{self._sequence}'
+
+    def _missed_since(self, last_event_id):
+        # Events after last_event_id, or None when they are no longer (or never were) in this process's history
+        token, _, sequence = last_event_id.partition(':')
+        if token != BOOT_TOKEN or not sequence.isdigit():
+            return None
+        sequence = int(sequence)
+        oldest = self._history[0][0] if self._history else self._sequence + 1
+        if sequence < oldest - 1:
+            return None
+        return [event for event_sequence, event in self._history if event_sequence > sequence]
+
+
+broker = Broker()
+
+
+def publish_on_commit(event_type, data):
+    transaction.on_commit(lambda: broker.publish(event_type, data))
+
+
+def incident_data(incident, **extra):
+    return {'id': incident.reportid, 'category': incident.category, 'status': incident.status, **extra}
+
+
+def feed_filter(user_id, categories):
+    # What one responder's feed shows: incidents in (or leaving) their categories and their own assignments
+    categories = set(categories)
+
+    def accept(event):
+        data = event['data']
+        if event['type'] == 'assigned':
+            return data['user_id'] == user_id
+        return data['category'] in categories or data.get('previous_category') in categories
+    return accept
+
+
+def format_sse(event):
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+def sse_catch_up(accept, last_event_id=None):
+    # A complete text/event-stream body, for WSGI servers where a stream would hold a worker thread:
+    # the events the client missed and the newest id, then the response ends. EventSource reconnects
+    # after `retry` with that id, so the browser polls instead of holding a connection open.
+    missed, newest = broker.catch_up(last_event_id)
+    body = [f'retry: {POLL_MILLISECONDS}\n\n']
+    if missed is None and last_event_id.partition(':')[0] == BOOT_TOKEN:
+        # Fell out of this process's history: reload. An id from another process (or before a restart)
+        # just starts over from now, so clients of a multi-process server don't reload on every poll.
+        body.append(format_sse({'id': newest, 'type': 'reset', 'data': {}}))
+    else:
+        body.extend(format_sse(event) for event in missed or [] if accept(event))
+        # An id with no data moves the client's Last-Event-ID without dispatching an event
+        body.append(f'id: {newest}\n\n')
+    return ''.join(body)
+
+
+async def sse_stream(accept, last_event_id=None):
+    # The text/event-stream body for one client, until the client goes away
+    yield f'retry: {RETRY_MILLISECONDS}\n\n'
+    async with broker.subscribe(accept, last_event_id) as subscription:
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                # Comment line: keeps proxies from closing the idle connection
+                yield ': keep-alive\n\n'
+                continue
+            yield format_sse(event)
@@ -0,0 +1,149 @@
+import csv
+import zlib
+from datetime import datetime, time, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import importing, routing
+from .models import IncidentAssignment, IncidentReport
+
+# Streaming exports of incidents and assignments (export_view and `manage.py export`). Rows come
+# from values_list(...).iterator(), so only CHUNK_SIZE rows are held at a time, and are written out
+# in ~64 KB pieces, optionally gzipped on the fly. The incident CSV can be fed back to import_incidents.
+
+CHUNK_SIZE = 2000
+FLUSH_BYTES = 64 * 1024
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+EXPORTS = {
+    'incidents': {
+        'columns': ['reportid', *importing.FIELDS, 'timestamp', 'resolved_address'],
+        'fields': ['reportid', *importing.FIELDS, 'timestamp', 'resolved_address'],
+        'date_field': 'timestamp',
+    },
+    'assignments': {
+        'columns': [
+            'id', 'incident_id', 'category', 'status', 'username', 'department',
+            'assigned_at', 'notification_sent', 'notified_at',
+        ],
+        'fields': [
+            'id', 'incident_report_id', 'incident_report__category', 'incident_report__status', 'user__username',
+            'user__department__name', 'assigned_at', 'notification_sent', 'notified_at',
+        ],
+        'date_field': 'assigned_at',
+    },
+}
+
+
+def _parse_moment(value, end=False):
+    # A date or datetime; a bare date as `until` covers that whole day. Dates are tried first because
+    # parse_datetime also takes a bare date (as its midnight) on Python 3.11+.
+    day = parse_date(value)
+    if day is not None:
+        moment = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+    else:
+        moment = parse_datetime(value)
+        if moment is None:
+            raise ValueError(f'"{value}" is not a date (YYYY-MM-DD) or ISO date/time.')
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def parse_filters(since=None, until=None, categories=(), department=None):
+    # Validated filters from request/command-line strings; raises ValueError
+    valid_categories = {value for value, _ in IncidentReport.CATEGORY_CHOICES}
+    unknown = [category for category in categories if category not in valid_categories]
+    if unknown:
+        raise ValueError(f"Unknown category: {', '.join(unknown)}")
+    if department not in (None, '') and not str(department).isdigit():
+        raise ValueError('department must be a department id.')
+    return {
+        'since': _parse_moment(since) if since else None,
+        'until': _parse_moment(until, end=True) if until else None,
+        'categories': list(categories),
+        'department': int(department) if department not in (None, '') else None,
+    }
+
+
+def queryset(kind, filters):
+    export = EXPORTS[kind]
+    date_field = export['date_field']
+    if kind == 'incidents':
+        rows = IncidentReport.objects.all()
+        category_field = 'category'
+        if filters['department'] is not None:
+            rows = rows.filter(category__in=routing.categories_for_department(filters['department']))
+    else:
+        rows = IncidentAssignment.objects.all()
+        category_field = 'incident_report__category'
+        if filters['department'] is not None:
+            rows = rows.filter(user__department_id=filters['department'])
+    if filters['since']:
+        rows = rows.filter(**{f'{date_field}__gte': filters['since']})
+    if filters['until']:
+        rows = rows.filter(**{f'{date_field}__lt': filters['until']})
+    if filters['categories']:
+        rows = rows.filter(**{f'{category_field}__in': filters['categories']})
+    return rows.order_by('pk').values_list(*export['fields'])
+
+
+class _Buffer:
+    # csv.writer target that just collects what it is given
+    def __init__(self):
+        self.parts = []
+
+    def write(self, text):
+        self.parts.append(text)
+
+    def take(self):
+        text = ''.join(self.parts)
+        self.parts = []
+        return text
+
+
+def _csv_lines(columns, rows):
+    buffer = _Buffer()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.take()
+    for row in rows:
+        writer.writerow(['' if value is None else value.isoformat() if isinstance(value, datetime) else value for value in row])
+        yield buffer.take()
+
+
+def _ndjson_lines(columns, rows):
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(dict(zip(columns, row))) + '\n'
+
+
+def stream(kind, fmt, rows, compress=False, chunk_size=CHUNK_SIZE):
+    # Bytes of the export, produced lazily; rows is a queryset from queryset()
+    lines = (_csv_lines if fmt == 'csv' else _ndjson_lines)(EXPORTS[kind]['columns'], rows.iterator(chunk_size=chunk_size))
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None  # wbits=31: gzip container
+
+    pending, size, started = [], 0, False
+    for line in lines:
+        pending.append(line)
+        size += len(line)
+        # The first line goes out at once so the download starts before the first chunk is read
+        if size >= FLUSH_BYTES or not started:
+            data = ''.join(pending).encode()
+            pending, size = [], 0
+            if compressor:
+                data = compressor.compress(data) + (b'' if started else compressor.flush(zlib.Z_SYNC_FLUSH))
+            started = True
+            if data:
+                yield data
+    data = ''.join(pending).encode()
+    if compressor:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
+
+
+def filename(kind, fmt, compress=False):
+    return f"luwas-{kind}-{timezone.localdate().isoformat()}.{fmt}{'.gz' if compress else ''}"
@@ -14,7 +14,7 @@ class LoginForm(AuthenticationForm):
 class IncidentReportForm(forms.ModelForm):
     class Meta:
         model = IncidentReport
-        fields = ['incident_type', 'severity', 'category', 'location', 'latitude', 'longitude', 'status']
+        fields = ['incident_type', 'description', 'severity', 'category', 'location', 'latitude', 'longitude', 'status']
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -22,3 +22,4 @@ class IncidentReportForm(forms.ModelForm):
         self.fields['location'].widget.attrs['readonly'] = True
         self.fields['latitude'].widget.attrs['readonly'] = True
         self.fields['longitude'].widget.attrs['readonly'] = True
+        self.fields['description'].widget.attrs['rows'] = 4
@@ -0,0 +1,66 @@
+import threading
+
+from django.core.cache import cache
+
+# Rendered HTML fragments of incidents (board and assignment cards, the detail page body), cached
+# under the incident's updated_at. A change to an incident changes its key, so nothing is ever
+# invalidated: an unchanged incident is rendered once and old versions expire. Lists prefetch their
+# fragments with one get_many; the {% fragment %} tag (templatetags/incidents.py) does the rest.
+
+TIMEOUT = 24 * 60 * 60
+
+_stats_lock = threading.Lock()
+_stats = {}  # fragment name -> {'hits': n, 'misses': n}
+
+
+def version(obj):
+    return int(obj.updated_at.timestamp() * 1_000_000)
+
+
+def make_key(name, obj, vary_on=()):
+    parts = [str(part) for part in vary_on]
+    return ':'.join(['fragment', name, str(obj.pk), str(version(obj)), *parts])
+
+
+def _count(name, hits=0, misses=0):
+    with _stats_lock:
+        counts = _stats.setdefault(name, {'hits': 0, 'misses': 0})
+        counts['hits'] += hits
+        counts['misses'] += misses
+
+
+def prefetch(name, objects, vary_on=()):
+    # One cache round trip for a whole list; the tag then finds the fragments on the objects
+    objects = list(objects)
+    keys = {make_key(name, obj, vary_on): obj for obj in objects}
+    for key, html in cache.get_many(list(keys)).items():
+        prefetched = keys[key].__dict__.setdefault('_prefetched_fragments', {})
+        prefetched[key] = html
+    return objects
+
+
+def get(name, obj, vary_on=()):
+    key = make_key(name, obj, vary_on)
+    html = getattr(obj, '_prefetched_fragments', {}).get(key)
+    if html is None:
+        html = cache.get(key)
+    _count(name, hits=html is not None, misses=html is None)
+    return key, html
+
+
+def store(key, html):
+    cache.set(key, html, TIMEOUT)
+
+
+def stats():
+    with _stats_lock:
+        data = {name: dict(counts) for name, counts in _stats.items()}
+    for counts in data.values():
+        total = counts['hits'] + counts['misses']
+        counts['hit_ratio'] = round(counts['hits'] / total, 4) if total else None
+    return data
+
+
+def reset():
+    with _stats_lock:
+        _stats.clear()
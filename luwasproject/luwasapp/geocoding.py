@@ -0,0 +1,406 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import metrics
+from .models import GeocodeCache, IncidentReport
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'PRECISION': 4,                         # ~11m, plenty for a street address
+    'TTL': timedelta(days=30),              # how long a found address is fresh
+    'STALE_TTL': timedelta(days=7),         # served past TTL while refreshing in the background
+    'NEGATIVE_TTL': timedelta(hours=1),     # how long "not found" / provider errors are remembered
+    'LRU_SIZE': 2048,
+    'TIMEOUT': 5,
+    'USER_AGENT': 'luwas/1.0',
+    'NOMINATIM_URL': 'https://nominatim.openstreetmap.org/reverse',
+    'OPENCAGE_URL': 'https://api.opencagedata.com/geocode/v1/json',
+    'OPENCAGE_KEY': '',
+    'RATE_LIMIT': 1.0,                      # outbound requests per second (Nominatim's usage policy)
+    'WORKER': 'thread',                     # 'thread' resolves in-process, 'command' leaves it to geocode_worker
+    'WORKER_THREADS': 2,
+    'LEASE': timedelta(minutes=15),         # how long a claim lasts before another worker may take the incident
+}
+
+# Per-process overrides, e.g. from geocode_worker's command line
+_overrides = {}
+
+
+def get_setting(name):
+    if name in _overrides:
+        return _overrides[name]
+    return getattr(settings, 'GEOCODING', {}).get(name, DEFAULTS[name])
+
+
+class GeocodeEntry:
+    __slots__ = ('address', 'details', 'found', 'fetched_at')
+
+    def __init__(self, address, details, found, fetched_at):
+        self.address = address
+        self.details = details
+        self.found = found
+        self.fetched_at = fetched_at
+
+    def age(self):
+        return timezone.now() - self.fetched_at
+
+    def ttl(self):
+        return get_setting('TTL') if self.found else get_setting('NEGATIVE_TTL')
+
+    def is_fresh(self):
+        return self.age() < self.ttl()
+
+    def is_servable(self):
+        # Negative entries are never served stale, they are simply retried
+        return self.is_fresh() or (self.found and self.age() < self.ttl() + get_setting('STALE_TTL'))
+
+
+class LRUCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_memory = LRUCache(get_setting('LRU_SIZE'))
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats = {
+    'memory_hits': 0,
+    'db_hits': 0,
+    'stale_hits': 0,
+    'negative_hits': 0,
+    'misses': 0,
+    'fetches': 0,
+    'fetch_errors': 0,
+}
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def stats():
+    with _stats_lock:
+        data = dict(_stats)
+    data['memory_entries'] = len(_memory)
+    return data
+
+
+def reset():
+    _memory.clear()
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0
+
+
+def make_key(provider, lat, lon):
+    scale = 10 ** get_setting('PRECISION')
+    return (provider, round(float(lat) * scale), round(float(lon) * scale))
+
+
+class RateLimiter:
+    # Spaces calls at least 1/rate seconds apart across all threads of the process
+    def __init__(self, rate):
+        self.rate = rate
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + 1.0 / self.rate
+        if delay > 0:
+            time.sleep(delay)
+
+
+_limiter = RateLimiter(get_setting('RATE_LIMIT'))
+
+
+def configure(**overrides):
+    _overrides.update(overrides)
+    _limiter.rate = get_setting('RATE_LIMIT')
+
+
+#======================================================PROVIDERS======================================================#
+
+def _http_get(url, params, provider):
+    _limiter.wait()
+    # Timed after the rate limiter, so this is the provider's own latency
+    with metrics.outbound(f'geocoding:{provider}'):
+        response = requests.get(
+            url,
+            params=params,
+            timeout=get_setting('TIMEOUT'),
+            headers={'User-Agent': get_setting('USER_AGENT')},
+        )
+        response.raise_for_status()
+        return response.json()
+
+
+def _fetch_nominatim(lat, lon):
+    data = _http_get(get_setting('NOMINATIM_URL'), {'lat': lat, 'lon': lon, 'format': 'json'}, 'nominatim')
+    if 'error' in data:
+        return None, {}
+    return data.get('display_name', ''), data
+
+
+def _fetch_opencage(lat, lon):
+    data = _http_get(get_setting('OPENCAGE_URL'), {'q': f'{lat},{lon}', 'key': get_setting('OPENCAGE_KEY')}, 'opencage')
+    if data.get('status', {}).get('code') != 200 or not data.get('results'):
+        return None, {}
+    result = data['results'][0]
+    return result['formatted'], result
+
+
+PROVIDERS = {
+    'nominatim': _fetch_nominatim,
+    'opencage': _fetch_opencage,
+}
+
+
+#======================================================CACHE======================================================#
+
+def _load(key):
+    provider, lat_key, lon_key = key
+    row = GeocodeCache.objects.filter(
+        provider=provider, precision=get_setting('PRECISION'), lat_key=lat_key, lon_key=lon_key
+    ).first()
+    if row is None:
+        return None
+    return GeocodeEntry(row.address, row.details, row.found, row.fetched_at)
+
+
+def _store(key, entry):
+    provider, lat_key, lon_key = key
+    GeocodeCache.objects.update_or_create(
+        provider=provider, precision=get_setting('PRECISION'), lat_key=lat_key, lon_key=lon_key,
+        defaults={
+            'address': entry.address,
+            'details': entry.details,
+            'found': entry.found,
+            'fetched_at': entry.fetched_at,
+        },
+    )
+    _memory.set(key, entry)
+
+
+def _fetch(key, lat, lon, previous=None):
+    provider = key[0]
+    _count('fetches')
+    try:
+        address, details = PROVIDERS[provider](lat, lon)
+    except (requests.RequestException, ValueError) as e:
+        logger.warning('Reverse geocoding via %s failed for %s,%s: %s', provider, lat, lon, e)
+        _count('fetch_errors')
+        if previous is not None and previous.found:
+            # Keep serving the old address rather than replacing it with a failure
+            return previous
+        address, details = None, {}
+    entry = GeocodeEntry(address or '', details, address is not None, timezone.now())
+    _store(key, entry)
+    return entry
+
+
+def _refresh_in_background(key, lat, lon, previous):
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def run():
+        try:
+            _fetch(key, lat, lon, previous)
+        except Exception:
+            logger.exception('Background geocode refresh failed for %s', key)
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(key)
+            connections.close_all()
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def lookup(lat, lon, provider='nominatim', allow_network=True):
+    # Returns a GeocodeEntry, or None when nothing is cached and the network may not be used
+    if lat is None or lon is None:
+        return None
+    key = make_key(provider, lat, lon)
+
+    entry = _memory.get(key)
+    source = 'memory_hits'
+    if entry is None:
+        entry = _load(key)
+        source = 'db_hits'
+        if entry is not None:
+            _memory.set(key, entry)
+
+    if entry is not None and entry.is_fresh():
+        _count(source if entry.found else 'negative_hits')
+        return entry
+
+    if entry is not None and entry.is_servable():
+        _count('stale_hits')
+        if allow_network:
+            _refresh_in_background(key, lat, lon, entry)
+        return entry
+
+    _count('misses')
+    if not allow_network:
+        return None
+    return _fetch(key, lat, lon, entry)
+
+
+def reverse_geocode(lat, lon, provider='nominatim', allow_network=True):
+    # Raw provider payload for the coordinates, or {} when unknown
+    entry = lookup(lat, lon, provider=provider, allow_network=allow_network)
+    if entry is None or not entry.found:
+        return {}
+    return entry.details
+
+
+#======================================================INCIDENT PIPELINE======================================================#
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=get_setting('WORKER_THREADS'), thread_name_prefix='geocode')
+        return _executor
+
+
+def claimable(now=None):
+    # Incidents waiting for a worker: queued, or claimed by one whose lease has run out
+    now = now or timezone.now()
+    return IncidentReport.objects.filter(
+        Q(geocode_status='pending') | Q(geocode_status='claimed', geocode_claimed_until__lt=now)
+    )
+
+
+def claim(batch_size, pk=None, now=None):
+    # Lease up to batch_size queued incidents (or just incident `pk`) to this worker; returns the claim
+    # token and the ids it holds
+    now = now or timezone.now()
+    queued = claimable(now)
+    if pk is not None:
+        queued = queued.filter(pk=pk)
+    candidates = list(queued.order_by('reportid').values_list('reportid', flat=True)[:batch_size])
+    if not candidates:
+        return None, []
+
+    token = uuid.uuid4().hex
+    # Re-checking in the UPDATE means an incident raced for by two workers goes to only one of them
+    claimable(now).filter(pk__in=candidates).update(
+        geocode_status='claimed', geocode_claim=token, geocode_claimed_until=now + get_setting('LEASE'),
+    )
+    return token, list(
+        IncidentReport.objects.filter(pk__in=candidates, geocode_claim=token).order_by('reportid').values_list('reportid', flat=True)
+    )
+
+
+def resolve_incident(pk, token):
+    # Resolve one incident claimed under `token` and persist its address; returns the new geocode_status,
+    # or None if the incident is gone or no longer ours (re-queued by an edit, or the lease ran out and
+    # another worker took it), in which case nothing is written
+    claimed = IncidentReport.objects.filter(pk=pk, geocode_status='claimed', geocode_claim=token)
+    incident = claimed.only('latitude', 'longitude', 'geocode_attempts').first()
+    if incident is None:
+        return None
+    released = {'geocode_claim': None, 'geocode_claimed_until': None}
+    if incident.latitude is None or incident.longitude is None:
+        return 'skipped' if claimed.update(geocode_status='skipped', **released) else None
+
+    entry = lookup(incident.latitude, incident.longitude)
+    now = timezone.now()
+    if entry is not None and entry.found:
+        written = claimed.update(
+            resolved_address=entry.address,
+            location_details=entry.details,
+            geocode_status='resolved',
+            geocode_attempts=incident.geocode_attempts + 1,
+            geocoded_at=now,
+            updated_at=now,  # the detail page shows the address
+            **released,
+        )
+        return 'resolved' if written else None
+
+    # Not found, or the geocoder is down; `geocode_worker --retry-failed` picks these up again
+    written = claimed.update(
+        geocode_status='failed', geocode_attempts=incident.geocode_attempts + 1, geocoded_at=now, **released,
+    )
+    return 'failed' if written else None
+
+
+def _resolve_in_worker(pk):
+    try:
+        # geocode_worker may have taken it already
+        token, claimed = claim(1, pk=pk)
+        if claimed:
+            resolve_incident(pk, token)
+    except Exception:
+        logger.exception('Geocoding incident %s failed', pk)
+    finally:
+        connections.close_all()
+
+
+def enqueue(incident):
+    # Mark the incident for geocoding; with the thread worker it is resolved once the write commits.
+    # Dropping any claim means a worker still resolving the old coordinates doesn't write them.
+    IncidentReport.objects.filter(pk=incident.pk).update(
+        geocode_status='pending', geocode_claim=None, geocode_claimed_until=None,
+    )
+    incident.geocode_status = 'pending'
+    if get_setting('WORKER') == 'thread':
+        pk = incident.pk
+        transaction.on_commit(lambda: _get_executor().submit(_resolve_in_worker, pk))
+
+
+def queue_backfill():
+    # Queue every incident with coordinates that still has no resolved address
+    return IncidentReport.objects.filter(
+        resolved_address='', latitude__isnull=False, longitude__isnull=False,
+    ).exclude(geocode_status__in=['pending', 'claimed']).update(geocode_status='pending')
+
@@ -0,0 +1,96 @@
+import math
+
+# Geohash encoding and cell covering, plus great-circle distance. Pure functions, no Django.
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+EARTH_RADIUS_KM = 6371.0088
+PRECISION = 9  # ~4.8m x 4.8m cells
+
+
+def encode(lat, lon, precision=PRECISION):
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        # Even bits split longitude, odd bits split latitude
+        interval, coordinate = (lon_range, lon) if even else (lat_range, lat)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    # (lat degrees, lon degrees) covered by one cell at `precision`
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = math.floor(precision * 5 / 2)
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def next_prefix(prefix):
+    # Smallest geohash string greater than every hash starting with `prefix`, or None
+    while prefix:
+        index = BASE32.index(prefix[-1])
+        if index < len(BASE32) - 1:
+            return prefix[:-1] + BASE32[index + 1]
+        prefix = prefix[:-1]
+    return None
+
+
+def cover(min_lat, min_lon, max_lat, max_lon, max_cells=32):
+    # Geohash prefixes whose cells together cover the bounding box, as fine as max_cells allows
+    min_lat, max_lat = max(min_lat, -90.0), min(max_lat, 90.0)
+    for precision in range(PRECISION, 0, -1):
+        lat_step, lon_step = cell_size(precision)
+        rows = math.floor(max_lat / lat_step) - math.floor(min_lat / lat_step) + 1
+        columns = math.floor(max_lon / lon_step) - math.floor(min_lon / lon_step) + 1
+        if rows * columns <= max_cells:
+            break
+    else:
+        return ['']
+
+    cells = set()
+    lat = math.floor(min_lat / lat_step) * lat_step
+    while lat <= max_lat:
+        lon = math.floor(min_lon / lon_step) * lon_step
+        while lon <= max_lon:
+            cells.add(encode(min(lat + lat_step / 2, 90.0), ((lon + lon_step / 2 + 180.0) % 360.0) - 180.0, precision))
+            lon += lon_step
+        lat += lat_step
+    return sorted(cells)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bbox_around(lat, lon, radius_km):
+    # (min_lat, min_lon, max_lat, max_lon) enclosing a circle; longitudes may run past +/-180. The
+    # circle is widest poleward of its centre, where its meridians touch it: asin(sin r / cos lat).
+    angle = radius_km / EARTH_RADIUS_KM
+    d_lat = math.degrees(angle)
+    if lat + d_lat >= 90 or lat - d_lat <= -90:
+        # Contains a pole: every longitude
+        return max(lat - d_lat, -90.0), -180.0, min(lat + d_lat, 90.0), 180.0
+    sin_angle, cos_lat = math.sin(angle), math.cos(math.radians(lat))
+    if sin_angle >= cos_lat:
+        return lat - d_lat, -180.0, lat + d_lat, 180.0
+    d_lon = math.degrees(math.asin(sin_angle / cos_lat))
+    return lat - d_lat, lon - d_lon, lat + d_lat, lon + d_lon
@@ -0,0 +1,76 @@
+import hashlib
+import io
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+# Image checks and thumbnails shared by profile images (avatars.py) and incident attachments
+# (attachments.py). Stored files and thumbnails are named by content hash, so a name never points at
+# different bytes and can be cached by browsers for good.
+
+UPLOAD_FORMATS = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp', 'GIF': '.gif'}
+CONTENT_TYPES = {'.jpg': 'image/jpeg', '.png': 'image/png', '.webp': 'image/webp', '.gif': 'image/gif'}
+
+
+def content_hash(chunks):
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def identify(f, max_pixels):
+    # File extension for the picture in `f` (read from its header only); ValueError if it isn't a
+    # usable JPEG, PNG, WebP or GIF
+    try:
+        with Image.open(f) as image:
+            image_format, (width, height) = image.format, image.size
+    except (OSError, Image.DecompressionBombError):
+        raise ValueError('The file is not a picture that can be read.')
+    if image_format not in UPLOAD_FORMATS:
+        raise ValueError(f'Upload a JPEG, PNG, WebP or GIF picture, not {image_format}.')
+    if width * height > max_pixels:
+        raise ValueError('The picture has too many pixels.')
+    return UPLOAD_FORMATS[image_format]
+
+
+def output_format(preferred):
+    # (Pillow format, file extension) of thumbnails: WebP unless JPEG is preferred or Pillow lacks it
+    if preferred == 'webp' and features.check('webp'):
+        return 'WEBP', '.webp'
+    return 'JPEG', '.jpg'
+
+
+def _render(image, size, crop, image_format, quality):
+    # `size` is (width, height): cropped to fill it, or scaled down to fit inside it
+    if crop:
+        thumbnail = ImageOps.fit(image, size, Image.Resampling.LANCZOS)
+    else:
+        thumbnail = ImageOps.contain(image, size, Image.Resampling.LANCZOS) if image.width > size[0] or image.height > size[1] else image
+    if image_format == 'JPEG' and thumbnail.mode == 'RGBA':
+        background = Image.new('RGB', thumbnail.size, 'white')
+        background.paste(thumbnail, mask=thumbnail.getchannel('A'))
+        thumbnail = background
+    buffer = io.BytesIO()
+    thumbnail.save(buffer, image_format, quality=quality)
+    return buffer.getvalue()
+
+
+def make_thumbnails(storage, source, directory, sizes, preferred_format='webp', quality=82):
+    # Thumbnails of the stored picture `source`, for {label: (width, height, crop)}, saved under
+    # `directory`; returns {label: storage name}
+    image_format, extension = output_format(preferred_format)
+    largest = (max(width for width, _, _ in sizes.values()), max(height for _, height, _ in sizes.values()))
+    names = {}
+    with storage.open(source) as f, Image.open(f) as image:
+        # Lets JPEG decode at a fraction of full size
+        image.draft('RGB', largest)
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        for label, (width, height, crop) in sizes.items():
+            data = _render(image, (width, height), crop, image_format, quality)
+            name = f'{directory}/{content_hash([data])}-{width}x{height}{extension}'
+            if not storage.exists(name):
+                storage.save(name, ContentFile(data))
+            names[label] = name
+    return names
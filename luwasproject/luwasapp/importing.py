@@ -0,0 +1,188 @@
+import csv
+import hashlib
+import json
+import os
+from collections import Counter
+
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import counters, notifications
+from .models import IncidentAssignment, IncidentReport, User
+
+# Streaming import of historical incidents from CSV or JSON Lines (used by `manage.py import_incidents`).
+# Readers yield (row number, byte offset after the row, row dict), so a committed chunk can be
+# checkpointed by offset and a rerun can seek straight past it. Row numbers count data rows
+# (blank lines included) from 1, or from `start` when resuming.
+
+FIELDS = ['incident_type', 'description', 'severity', 'category', 'status', 'location', 'latitude', 'longitude']
+ASSIGNEES_COLUMN = 'assignees'  # usernames separated by ';'
+FINGERPRINT_BYTES = 64 * 1024
+
+
+def fingerprint(path, length=None):
+    # Identifies a source by its first `length` bytes ("<length>:<sha256>"), so a file that has only
+    # been appended to still matches its checkpoint but a different one does not
+    if length is None:
+        length = min(os.path.getsize(path), FINGERPRINT_BYTES)
+    with open(path, 'rb') as f:
+        return f'{length}:{hashlib.sha256(f.read(length)).hexdigest()}'
+
+
+def matches(path, stored_fingerprint):
+    length = int(stored_fingerprint.partition(':')[0])
+    return os.path.getsize(path) >= length and fingerprint(path, length) == stored_fingerprint
+
+
+def detect_format(path):
+    return 'jsonl' if str(path).lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+class _Lines:
+    # Decoded lines of a binary file, keeping count of the bytes handed out
+    def __init__(self, f, offset):
+        self.f = f
+        self.offset = offset
+
+    def __iter__(self):
+        for line in self.f:
+            self.offset += len(line)
+            yield line.decode('utf-8-sig' if self.offset == len(line) else 'utf-8')
+
+
+def read_csv(f, offset=0, start=1):
+    header_lines = _Lines(f, 0)
+    header = next(csv.reader(header_lines), None)
+    if header is None:
+        return
+    header = [column.strip() for column in header]
+    if offset > header_lines.offset:
+        f.seek(offset)
+    else:
+        offset = header_lines.offset
+    lines = _Lines(f, offset)
+    for number, values in enumerate(csv.reader(lines), start=start):
+        # csv.reader pulls lines only as it needs them, so the count is exactly the end of this row
+        if values:
+            yield number, lines.offset, dict(zip(header, values))
+
+
+def read_jsonl(f, offset=0, start=1):
+    f.seek(offset)
+    lines = _Lines(f, offset)
+    for number, line in enumerate(lines, start=start):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            row = {'__error__': f'Invalid JSON: {error}', 'line': line.rstrip('\r\n')}
+        if not isinstance(row, dict):
+            row = {'__error__': 'Expected a JSON object.'}
+        yield number, lines.offset, row
+
+
+READERS = {'csv': read_csv, 'jsonl': read_jsonl}
+
+
+def _clean_timestamp(value):
+    if value in (None, ''):
+        return None
+    parsed = parse_datetime(str(value).strip())
+    if parsed is None:
+        raise ValidationError('Enter a valid ISO 8601 date/time.')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def validate(row):
+    # Returns (IncidentReport, [assignee usernames]) or raises ValidationError with per-column messages
+    if '__error__' in row:
+        raise ValidationError(row['__error__'])
+    values, errors = {}, {}
+    for name in FIELDS:
+        field = IncidentReport._meta.get_field(name)
+        raw = row.get(name)
+        if isinstance(raw, str):
+            raw = raw.strip()
+        if raw in (None, ''):
+            raw = field.get_default() if field.has_default() else (None if field.null else '')
+        try:
+            # to_python, choices, max_length and blank checks straight from the model field
+            values[name] = field.clean(raw, None)
+        except ValidationError as error:
+            errors[name] = error.messages
+    try:
+        timestamp = _clean_timestamp(row.get('timestamp'))
+    except ValidationError as error:
+        errors['timestamp'] = error.messages
+    for name, low, high in (('latitude', -90, 90), ('longitude', -180, 180)):
+        if values.get(name) is not None and not low <= values[name] <= high:
+            errors[name] = [f'Must be between {low} and {high}.']
+    if (values.get('latitude') is None) != (values.get('longitude') is None):
+        errors.setdefault('latitude', []).append('Give both latitude and longitude, or neither.')
+    if errors:
+        raise ValidationError(errors)
+
+    incident = IncidentReport(**values)
+    incident.refresh_geohash()
+    incident._imported_timestamp = timestamp
+    assignees = row.get(ASSIGNEES_COLUMN) or []
+    if isinstance(assignees, str):
+        assignees = assignees.split(';')
+    return incident, [username.strip() for username in assignees if username and username.strip()]
+
+
+def error_messages(error):
+    if hasattr(error, 'error_dict'):
+        return {name: messages for name, messages in error.message_dict.items()}
+    return {'__all__': error.messages}
+
+
+class UsernameCache:
+    # username -> user id for assignees, looked up once per chunk for the names not seen yet
+    def __init__(self):
+        self.ids = {}
+
+    def resolve(self, usernames):
+        missing = set(usernames) - self.ids.keys()
+        if missing:
+            found = dict(User.objects.filter(username__in=missing).values_list('username', 'pk'))
+            for username in missing:
+                self.ids[username] = found.get(username)
+        return {username: self.ids[username] for username in usernames}
+
+
+def write_chunk(chunk, notify=False):
+    # Insert one chunk of validated (incident, assignee ids) pairs; call inside a transaction.
+    # bulk_create skips save() and signals, so geohashes, timestamps and counters are handled here.
+    incidents = [incident for incident, _ in chunk]
+    IncidentReport.objects.bulk_create(incidents)
+
+    # auto_now_add overwrote the historical timestamps; put them back in one statement
+    dated = [incident for incident in incidents if incident._imported_timestamp is not None]
+    for incident in dated:
+        incident.timestamp = incident._imported_timestamp
+    if dated:
+        IncidentReport.objects.bulk_update(dated, ['timestamp'])
+
+    deltas = Counter()
+    for incident in incidents:
+        deltas.update(counters.incident_deltas(incident.category, incident.status, +1))
+    counters.apply(deltas)
+
+    assignments = [
+        IncidentAssignment(user_id=user_id, incident_report_id=incident.pk)
+        for incident, user_ids in chunk
+        for user_id in user_ids
+    ]
+    if assignments and not notify:
+        # History: nobody needs telling about these now
+        for assignment in assignments:
+            assignment.notification_attempts = notifications.get_setting('MAX_ATTEMPTS')
+            assignment.notification_error = 'Imported; not notified.'
+    IncidentAssignment.objects.bulk_create(assignments, ignore_conflicts=True)
+    counters.record_assignments((assignment.user_id, assignment.incident_report_id) for assignment in assignments)
+    return len(incidents), len(assignments)
@@ -0,0 +1,87 @@
+import asyncio
+from http.cookies import SimpleCookie
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import aget_user
+from django.urls import reverse
+
+from . import events, routing
+
+# ASGI wrapper that serves the live incident feed itself and hands every other request to Django.
+# Django's ASGI handler gives each request its own thread for sync code (middleware, sessions) and
+# keeps it until the response ends, which for an SSE stream is hours. Served here, a connected
+# client is one coroutine; the session and routing lookups share asgiref's single sync thread.
+
+
+class LiveFeedApplication:
+    def __init__(self, application):
+        self.application = application
+        self._path = None
+
+    @property
+    def path(self):
+        if self._path is None:
+            self._path = reverse('incident_events')
+        return self._path
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == self.path:
+            return await self.serve(scope, receive, send)
+        return await self.application(scope, receive, send)
+
+    async def serve(self, scope, receive, send):
+        headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        user = await self.authenticate(headers.get('cookie', ''))
+        if not user.is_authenticated:
+            return await self.respond(send, 401, 'Log in to follow the live feed.')
+        if not user.department_id:
+            return await self.respond(send, 403, 'You are not assigned to a department.')
+
+        categories = await sync_to_async(routing.categories_for_department)(user.department_id)
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        last_event_id = headers.get('last-event-id') or query.get('last_event_id', [None])[0]
+
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        stream = asyncio.ensure_future(self.stream(send, events.feed_filter(user.pk, categories), last_event_id))
+        disconnected = asyncio.ensure_future(self.wait_for_disconnect(receive))
+        try:
+            await asyncio.wait([stream, disconnected], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (stream, disconnected):
+                task.cancel()
+            await asyncio.gather(stream, disconnected, return_exceptions=True)
+
+    async def authenticate(self, cookie_header):
+        cookies = SimpleCookie()
+        cookies.load(cookie_header)
+        session_key = cookies[settings.SESSION_COOKIE_NAME].value if settings.SESSION_COOKIE_NAME in cookies else None
+        session = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+        return await aget_user(SimpleNamespace(session=session))
+
+    async def stream(self, send, accept, last_event_id):
+        body = events.sse_stream(accept, last_event_id)
+        try:
+            async for chunk in body:
+                await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+        finally:
+            await body.aclose()
+
+    async def wait_for_disconnect(self, receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    async def respond(self, send, status, message):
+        await send({'type': 'http.response.start', 'status': status, 'headers': [(b'content-type', b'text/plain; charset=utf-8')]})
+        await send({'type': 'http.response.body', 'body': message.encode()})
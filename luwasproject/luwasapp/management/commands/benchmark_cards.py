@@ -0,0 +1,89 @@
+import json
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.template import Context, engines
+from django.template.engine import Engine
+from django.utils import timezone
+
+from luwasapp.benchmarking import time_call
+from luwasapp.models import IncidentReport
+
+# The card as it was before the placeholder_image tag: one {% if %}/{% elif %} branch per category,
+# after a lookup of a non-existent incident.image
+LEGACY_CARD = (
+    '{% load static %}<li data-incident="{{ incident.reportid }}">{% if incident.image %}'
+    '<img src="{{ incident.image.url }}" alt="Incident Image">{% else %}'
+    + ''.join(
+        f"{{% {'if' if i == 0 else 'elif'} incident.category == '{value}' %}}"
+        f"<img src=\"{{% static 'placeholder/placeholder_{value}.jpg' %}}\" alt=\"{label} Placeholder\">"
+        for i, (value, label) in enumerate(IncidentReport.CATEGORY_CHOICES)
+    )
+    + '{% endif %}{% endif %}<a href="{% url \'incident_detail\' incident.pk %}" class="card-link"><div class="incident-info">'
+    '<h3>{{ incident.incident_type }}</h3><p><span>Category:</span> {{ incident.category }}</p>'
+    '<p><span>Location:</span> {{ incident.location }}</p></div></a></li>'
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Time loading and rendering a column of incident board cards (incident/_cards.html): with every card '
+        'in the fragment cache, with none, without the cached template loader, and with the old if/elif card.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cards', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+
+    def handle(self, *args, **options):
+        categories = [value for value, _ in IncidentReport.CATEGORY_CHOICES]
+        now = timezone.now()
+        incidents = [
+            IncidentReport(
+                reportid=i, incident_type='Benchmark incident', category=categories[i % len(categories)],
+                status='reported', location='Cebu City', updated_at=now,
+            )
+            for i in range(1, options['cards'] + 1)
+        ]
+        context = {'status': 'reported', 'column': {'incidents': incidents, 'next_cursor': None}}
+
+        configured = engines['django'].engine
+        file_loaders = ['django.template.loaders.filesystem.Loader', 'django.template.loaders.app_directories.Loader']
+        # Same directories and libraries, but every get_template() reads and parses the files again
+        uncached = Engine(dirs=configured.dirs, libraries=configured.libraries, loaders=file_loaders)
+        legacy = Engine(dirs=configured.dirs, libraries=configured.libraries, loaders=[
+            ('django.template.loaders.cached.Loader', [
+                ('django.template.loaders.locmem.Loader', {'incident/_card.html': LEGACY_CARD}),
+                *file_loaders,
+            ]),
+        ])
+
+        variants = [
+            ('cached fragments', configured, False),
+            ('no fragments', configured, True),
+            ('no cached loader', uncached, True),
+            ('if/elif card', legacy, True),
+        ]
+        results = []
+        for name, engine, cold in variants:
+            def render():
+                # As in a request: look the template up, then render it
+                if cold:
+                    cache.clear()
+                return engine.get_template('incident/_cards.html').render(Context(context))
+
+            ms = time_call(render, options['repeat'])
+            results.append({
+                'variant': name,
+                'cards': options['cards'],
+                'ms': round(ms, 3),
+                'ms_per_1000_cards': round(ms * 1000 / options['cards'], 3),
+            })
+
+        self.stdout.write(f"{'variant':<18} {'cards':>7} {'ms':>9} {'ms/1000 cards':>14}")
+        for row in results:
+            self.stdout.write(f"{row['variant']:<18} {row['cards']:>7} {row['ms']:>9.2f} {row['ms_per_1000_cards']:>14.2f}")
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
@@ -0,0 +1,77 @@
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from luwasapp import dispatch
+from luwasapp.benchmarking import time_call
+
+
+class Command(BaseCommand):
+    help = 'Time building the in-memory establishment index and ranking nearest establishments, with NumPy and in pure Python.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--establishments', type=int, nargs='+', default=[1_000, 5_000, 50_000])
+        parser.add_argument('--departments', type=int, default=40)
+        parser.add_argument('--queries', type=int, default=200, help='Incident locations ranked per timing run.')
+        parser.add_argument('--limit', type=int, default=dispatch.SUGGESTION_LIMIT)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+
+    def handle(self, *args, **options):
+        backends = [False] + ([True] if dispatch.numpy is not None else [])
+        if dispatch.numpy is None:
+            self.stderr.write('NumPy is not installed; timing the pure-Python ranking only.')
+
+        rng = random.Random(42)
+        # Incidents around Cebu; the same points for every size and backend
+        incidents = [(10.2 + rng.random() / 2, 123.7 + rng.random() / 2) for _ in range(options['queries'])]
+        # Roughly what one category routes to
+        departments = set(range(1, options['departments'] // 10 + 2))
+
+        results = []
+        for size in options['establishments']:
+            rows = [
+                (i, rng.randint(1, options['departments']), 9.5 + rng.random() * 2, 123.0 + rng.random() * 2)
+                for i in range(1, size + 1)
+            ]
+            rankings = {}
+            for use_numpy in backends:
+                started = time.perf_counter()
+                index = dispatch.EstablishmentIndex(rows, use_numpy=use_numpy)
+                build_ms = (time.perf_counter() - started) * 1000
+
+                def rank_all():
+                    return [index.rank(lat, lon, departments, options['limit']) for lat, lon in incidents]
+
+                total_ms = time_call(rank_all, options['repeat'])
+                rankings[use_numpy] = rank_all()
+                results.append({
+                    'establishments': size,
+                    'backend': 'numpy' if use_numpy else 'python',
+                    'build_ms': round(build_ms, 3),
+                    'rank_ms': round(total_ms / len(incidents), 4),
+                })
+
+            if len(rankings) == 2 and not self.same_ranking(rankings[False], rankings[True]):
+                raise CommandError(f'NumPy and pure-Python rankings disagree for {size} establishments.')
+
+        self.report(results, options)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+
+    def same_ranking(self, expected, actual):
+        for expected_row, actual_row in zip(expected, actual):
+            if [pk for pk, _ in expected_row] != [pk for pk, _ in actual_row]:
+                return False
+            if any(abs(a - b) > 1e-6 for (_, a), (_, b) in zip(expected_row, actual_row)):
+                return False
+        return len(expected) == len(actual)
+
+    def report(self, results, options):
+        self.stdout.write(f"\nTop {options['limit']} of the establishments in the category's departments, per incident\n")
+        self.stdout.write(f"{'establishments':>15} {'backend':>8} {'build ms':>10} {'rank ms':>10}")
+        for row in results:
+            self.stdout.write(f"{row['establishments']:>15} {row['backend']:>8} {row['build_ms']:>10.3f} {row['rank_ms']:>10.4f}")
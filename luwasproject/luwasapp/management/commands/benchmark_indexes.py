@@ -0,0 +1,153 @@
+import json
+import random
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from luwasapp.benchmarking import insert_rows, scratch_database, time_call
+from luwasapp.models import Department, Establishment, IncidentAssignment, IncidentReport, User
+
+ALIAS = 'benchmark'
+CATEGORIES = [value for value, label in IncidentReport.CATEGORY_CHOICES]
+STATUSES = [value for value, label in IncidentReport.STATUS_CHOICES]
+SEVERITIES = [value for value, label in IncidentReport.SEVERITY_CHOICES]
+
+
+def hot_path_queries(user_id, incident_id):
+    # The queries behind incident_list_view, dashboard_view and assignment de-duplication
+    incidents = IncidentReport.objects.using(ALIAS)
+    assignments = IncidentAssignment.objects.using(ALIAS)
+    board_categories = CATEGORIES[:4]
+    return {
+        'board (category__in + status, newest 50)': lambda: list(
+            incidents.filter(category__in=board_categories, status='reported').order_by('-timestamp')
+            .values_list('reportid', flat=True)[:50]
+        ),
+        'dashboard by category': lambda: list(
+            incidents.values('category').annotate(count=Count('category')).order_by('-count')
+        ),
+        'dashboard by status': lambda: list(
+            incidents.values('status').annotate(count=Count('status')).order_by('-count')
+        ),
+        'user assignments by status': lambda: list(
+            assignments.filter(user_id=user_id).values('incident_report__status')
+            .annotate(count=Count('incident_report__status')).order_by('-count')
+        ),
+        'assignment duplicate check': lambda: assignments.filter(user_id=user_id, incident_report_id=incident_id).exists(),
+    }
+
+
+def explain(func):
+    # Capture the query's SQL and run it again under EXPLAIN QUERY PLAN
+    connection = connections[ALIAS]
+    captured = []
+
+    def capture(execute, sql, params, many, context):
+        captured.append((sql, params))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(capture):
+        func()
+    sql, params = captured[-1]
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+class Command(BaseCommand):
+    help = 'Seed a scratch SQLite database and compare hot-path query plans and timings without and with the incident indexes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Incidents to seed.')
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--assignments', type=int, default=200_000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--db', help='Path of the scratch database (default: a temporary file).')
+        parser.add_argument('--keep', action='store_true', help='Keep the scratch database afterwards.')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+
+    def handle(self, *args, **options):
+        indexes = list(IncidentReport._meta.indexes)
+        constraints = list(IncidentAssignment._meta.constraints)
+        with scratch_database(ALIAS, path=options['db'], keep=options['keep']) as connection:
+            # Create the "before" schema: what the tables looked like prior to migration 0019
+            try:
+                IncidentReport._meta.indexes = []
+                IncidentAssignment._meta.constraints = []
+                with connection.schema_editor() as editor:
+                    for model in [Department, Establishment, User, IncidentReport, IncidentAssignment]:
+                        editor.create_model(model)
+            finally:
+                IncidentReport._meta.indexes = indexes
+                IncidentAssignment._meta.constraints = constraints
+
+            self.seed(connection, options)
+            user_id, incident_id = 1, options['rows'] // 2
+
+            results = {'rows': options['rows'], 'before': self.measure(user_id, incident_id, options['repeat'])}
+
+            self.stdout.write('Adding indexes and constraints...')
+            with connection.schema_editor() as editor:
+                for index in indexes:
+                    editor.add_index(IncidentReport, index)
+                for constraint in constraints:
+                    editor.add_constraint(IncidentAssignment, constraint)
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+            results['after'] = self.measure(user_id, incident_id, options['repeat'])
+
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+
+    def seed(self, connection, options):
+        rng = random.Random(42)
+        now = timezone.now()
+        self.stdout.write(f"Seeding {options['rows']} incidents, {options['users']} users, {options['assignments']} assignments...")
+        with transaction.atomic(using=ALIAS):
+            insert_rows(connection, Department, [{'name': 'Benchmark Department'}])
+            insert_rows(connection, User, (
+                {'username': f'responder{i}', 'email': f'responder{i}@example.com', 'password': '!', 'department_id': 1, 'date_joined': now}
+                for i in range(options['users'])
+            ))
+            insert_rows(connection, IncidentReport, (
+                {
+                    'incident_type': 'Benchmark',
+                    'severity': rng.choice(SEVERITIES),
+                    'category': rng.choice(CATEGORIES),
+                    'status': rng.choices(STATUSES, weights=[2, 3, 5])[0],
+                    'location': 'Cebu City',
+                    'latitude': 10.3 + rng.random() / 10,
+                    'longitude': 123.9 + rng.random() / 10,
+                    'timestamp': now - timedelta(seconds=rng.randrange(3 * 365 * 86400)),
+                }
+                for _ in range(options['rows'])
+            ))
+            pairs = set()
+            while len(pairs) < min(options['assignments'], options['rows'] * options['users']):
+                pairs.add((rng.randrange(1, options['users'] + 1), rng.randrange(1, options['rows'] + 1)))
+            insert_rows(connection, IncidentAssignment, (
+                {'user_id': user_id, 'incident_report_id': incident_id, 'assigned_at': now}
+                for user_id, incident_id in sorted(pairs)
+            ))
+
+    def measure(self, user_id, incident_id, repeat):
+        measured = {}
+        for name, func in hot_path_queries(user_id, incident_id).items():
+            measured[name] = {'ms': round(time_call(func, repeat), 3), 'plan': explain(func)}
+        return measured
+
+    def report(self, results):
+        self.stdout.write(f"\n{results['rows']} incidents\n")
+        for name, before in results['before'].items():
+            after = results['after'][name]
+            speedup = before['ms'] / after['ms'] if after['ms'] else float('inf')
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(f"  before {before['ms']:10.3f} ms   {' | '.join(before['plan'])}")
+            self.stdout.write(f"  after  {after['ms']:10.3f} ms   {' | '.join(after['plan'])}")
+            self.stdout.write(f'  speedup x{speedup:.1f}')
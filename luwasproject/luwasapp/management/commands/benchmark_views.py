@@ -0,0 +1,159 @@
+import json
+import platform
+
+import django
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from luwasapp import routing
+from luwasapp.benchmarking import time_call
+from luwasapp.models import IncidentAssignment, IncidentReport, User
+
+# Most queries a view may make, cold (empty caches) and warm. Raise one only together with the change
+# that needs it; the counts must not grow with the number of rows. Warm requests load the session and
+# the user from the cache.
+QUERY_BUDGETS = {
+    'dashboard': {'cold': 4, 'warm': 0},
+    'dashboard_api': {'cold': 4, 'warm': 0},
+    'incident_list': {'cold': 4, 'warm': 1},
+    'incident_search': {'cold': 4, 'warm': 1},
+    'incident_detail': {'cold': 10, 'warm': 5},
+    'assign_user': {'cold': 6, 'warm': 3},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the main views against the current database (see seed_data), check their query counts against '
+        'QUERY_BUDGETS and optionally write the results as JSON to compare between releases.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', default='seed-staff', help='Staff user with a department to log in as.')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--view', action='append', choices=sorted(QUERY_BUDGETS), help='Only these views (repeatable).')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+        parser.add_argument('--compare', help='Results file of an earlier run to print the differences against.')
+
+    def handle(self, *args, **options):
+        user = User.objects.select_related('department').filter(username=options['username']).first()
+        if user is None or not user.is_staff or user.department is None:
+            raise CommandError(f"{options['username']} must be an existing staff user with a department; run seed_data first.")
+        baseline = self.load(options['compare']) if options['compare'] else None
+
+        setup_test_environment()
+        client = Client()
+        client.force_login(user)
+
+        results = []
+        for name, url in self.urls(user):
+            if options['view'] and name not in options['view']:
+                continue
+            results.append(self.measure(client, name, url, options['repeat']))
+
+        report = {
+            'created': timezone.now().isoformat(),
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'rows': {
+                'incidents': IncidentReport.objects.count(),
+                'assignments': IncidentAssignment.objects.count(),
+                'users': User.objects.count(),
+            },
+            'views': results,
+        }
+        self.report(report, baseline)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+
+        over = [
+            f"{row['view']} ({state}: {row[state]['queries']} queries, budget {QUERY_BUDGETS[row['view']][state]})"
+            for row in results for state in ('cold', 'warm')
+            if row[state]['queries'] > QUERY_BUDGETS[row['view']][state]
+        ]
+        if over:
+            raise CommandError(f"Over the query budget: {'; '.join(over)}")
+
+    def urls(self, user):
+        categories = routing.categories_for_department(user.department)
+        # A recent incident the staff user can see, with coordinates so dispatch suggestions are computed
+        incident = (
+            IncidentReport.objects.filter(category__in=categories, latitude__isnull=False)
+            .order_by('-reportid').values_list('pk', flat=True).first()
+        )
+        responder = (
+            User.objects.filter(department=user.department).exclude(pk=user.pk)
+            .order_by('pk').values_list('pk', flat=True).first()
+        )
+        yield 'dashboard', reverse('dashboard')
+        yield 'dashboard_api', reverse('dashboard_api')
+        yield 'incident_list', reverse('incident_list')
+        # A typeahead query: the last word is a prefix
+        yield 'incident_search', reverse('incident_search') + '?q=cebu%20ci'
+        if incident is not None:
+            yield 'incident_detail', reverse('incident_detail', args=[incident])
+        else:
+            self.stderr.write("Skipping incident_detail: no incident in the user's categories.")
+        if responder is not None:
+            yield 'assign_user', reverse('assign_user', args=[responder])
+        else:
+            self.stderr.write("Skipping assign_user: nobody else in the user's department.")
+
+    def measure(self, client, name, url, repeat):
+        def get():
+            response = client.get(url)
+            if response.status_code != 200:
+                raise CommandError(f'{name}: {url} answered {response.status_code}')
+            return response
+
+        def get_cold():
+            # Sessions and the cached user too
+            for cache in caches.all():
+                cache.clear()
+            return get()
+
+        row = {'view': name, 'url': url}
+        for state, call in (('cold', get_cold), ('warm', get)):
+            call()
+            with CaptureQueriesContext(connection) as queries:
+                response = call()
+            row[state] = {'queries': len(queries), 'bytes': len(response.content)}
+            row[state]['ms'] = round(time_call(call, repeat), 3)
+        return row
+
+    def load(self, path):
+        try:
+            with open(path) as f:
+                return {row['view']: row for row in json.load(f)['views']}
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError(f'Cannot read {path}: {error}')
+
+    def report(self, report, baseline):
+        rows = report['rows']
+        self.stdout.write(
+            f"\n{rows['incidents']} incidents, {rows['assignments']} assignments, {rows['users']} users "
+            f"(Django {report['django']}, {report['database']})\n"
+        )
+        self.stdout.write(f"{'view':<16} {'cold ms':>9} {'queries':>8} {'warm ms':>9} {'queries':>8}" + ('   vs baseline' if baseline else ''))
+        for row in report['views']:
+            line = (
+                f"{row['view']:<16} {row['cold']['ms']:>9.2f} {row['cold']['queries']:>8} "
+                f"{row['warm']['ms']:>9.2f} {row['warm']['queries']:>8}"
+            )
+            previous = baseline.get(row['view']) if baseline else None
+            if previous:
+                line += '   ' + '  '.join(self.difference(state, previous[state], row[state]) for state in ('cold', 'warm'))
+            self.stdout.write(line)
+
+    def difference(self, state, before, after):
+        change = f"{(after['ms'] - before['ms']) / before['ms'] * 100:+.0f}%" if before['ms'] else 'n/a'
+        if before['queries'] != after['queries']:
+            change += f" ({before['queries']}->{after['queries']} queries)"
+        return f'{state} {change}'
@@ -0,0 +1,51 @@
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from luwasapp import exporting
+
+
+class Command(BaseCommand):
+    help = 'Stream incidents or assignments to CSV or NDJSON (optionally gzipped) without loading them all into memory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(exporting.EXPORTS))
+        parser.add_argument('--format', choices=sorted(exporting.FORMATS), default='csv')
+        parser.add_argument('--since', help='Start date or date/time (inclusive).')
+        parser.add_argument('--until', help='End date (inclusive) or date/time (exclusive).')
+        parser.add_argument('--category', action='append', default=[], help='Repeat for several categories.')
+        parser.add_argument('--department', help='Department id: incidents routed to it, or assignments of its members.')
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--chunk-size', type=int, default=exporting.CHUNK_SIZE, help='Rows fetched from the database at a time.')
+        parser.add_argument('--output', '-o', default='-', help='File to write (default: stdout).')
+
+    def handle(self, *args, **options):
+        try:
+            filters = exporting.parse_filters(options['since'], options['until'], options['category'], options['department'])
+        except ValueError as error:
+            raise CommandError(error)
+
+        rows = exporting.queryset(options['kind'], filters)
+        pieces = exporting.stream(options['kind'], options['format'], rows, options['gzip'], options['chunk_size'])
+        started = time.monotonic()
+        written = 0
+        output = sys.stdout.buffer if options['output'] == '-' else open(options['output'], 'wb')
+        try:
+            for piece in pieces:
+                output.write(piece)
+                written += len(piece)
+        except BrokenPipeError:
+            # Reader went away (e.g. `| head`); stop quietly
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            return
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+            else:
+                output.flush()
+
+        if options['output'] != '-':
+            elapsed = time.monotonic() - started
+            self.stdout.write(self.style.SUCCESS(f"Wrote {written} bytes to {options['output']} in {elapsed:.1f}s."))
@@ -0,0 +1,64 @@
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from django.core.management.base import BaseCommand
+
+
+class StubGeocoderHandler(BaseHTTPRequestHandler):
+    # Answers Nominatim-style /reverse requests with a made-up address
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        lat = params.get('lat', [None])[0]
+        lon = params.get('lon', [None])[0]
+        self.server.requests_served += 1
+
+        if url.path.rstrip('/') != '/reverse' or lat is None or lon is None:
+            body, status = {'error': 'Unable to geocode'}, 400
+        elif self.server.fail_every and self.server.requests_served % self.server.fail_every == 0:
+            body, status = {'error': 'Unable to geocode'}, 200
+        else:
+            body = {
+                'lat': lat,
+                'lon': lon,
+                'display_name': f'Stub Street {lat}, {lon}, Stub City',
+                'address': {'road': 'Stub Street', 'city': 'Stub City', 'country': 'Philippines'},
+            }
+            status = 200
+
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class Command(BaseCommand):
+    help = 'Run a local stand-in for Nominatim so the geocoding pipeline can be exercised offline.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--fail-every', type=int, default=0, help='Answer every Nth request with "not found".')
+
+    def handle(self, *args, **options):
+        server = ThreadingHTTPServer((options['host'], options['port']), StubGeocoderHandler)
+        server.requests_served = 0
+        server.fail_every = options['fail_every']
+        server.verbose = options['verbosity'] > 1
+        url = f"http://{options['host']}:{options['port']}/reverse"
+        self.stdout.write(f'Stub geocoder listening on {url}')
+        self.stdout.write(f'Point the worker at it with: manage.py geocode_worker --nominatim-url {url}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
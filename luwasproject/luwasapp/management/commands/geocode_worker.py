@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from luwasapp import geocoding
+from luwasapp.models import IncidentReport
+
+
+class Command(BaseCommand):
+    help = 'Resolve addresses for incidents queued for geocoding and store them on the incident.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty instead of polling.')
+        parser.add_argument('--backfill', action='store_true', help='First queue existing incidents that have no resolved address.')
+        parser.add_argument('--retry-failed', action='store_true', help='Also queue incidents whose geocoding failed before.')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--poll-interval', type=float, default=5.0, help='Seconds to sleep when the queue is empty.')
+        parser.add_argument('--rate', type=float, help='Outbound requests per second (defaults to GEOCODING["RATE_LIMIT"]).')
+        parser.add_argument('--nominatim-url', help='Geocoder to query, e.g. a local geocode_stub_server.')
+
+    def handle(self, *args, **options):
+        overrides = {}
+        if options['nominatim_url']:
+            overrides['NOMINATIM_URL'] = options['nominatim_url']
+        if options['rate'] is not None:
+            overrides['RATE_LIMIT'] = options['rate']
+        geocoding.configure(**overrides)
+
+        if options['backfill']:
+            self.stdout.write(f'Queued {geocoding.queue_backfill()} incidents for backfill.')
+        if options['retry_failed']:
+            queued = IncidentReport.objects.filter(geocode_status='failed').update(geocode_status='pending')
+            self.stdout.write(f'Re-queued {queued} failed incidents.')
+
+        totals = {'resolved': 0, 'failed': 0, 'skipped': 0}
+        started = time.monotonic()
+        while True:
+            token, batch = geocoding.claim(options['batch_size'])
+            if not batch:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            for pk in batch:
+                status = geocoding.resolve_incident(pk, token)
+                if status:
+                    totals[status] += 1
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"resolved={totals['resolved']} failed={totals['failed']} skipped={totals['skipped']} ({elapsed:.1f}s)"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'Done: {totals}'))
+        self.stdout.write(f'Geocode cache: {geocoding.stats()}')
@@ -0,0 +1,149 @@
+import json
+import os
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from luwasapp import importing
+from luwasapp.models import ImportCheckpoint
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream historical incidents (and optionally their assignments) from CSV or JSON Lines into the database, '
+        'in chunks that each commit with a checkpoint so an interrupted import can be resumed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (with a header row) or .jsonl file.')
+        parser.add_argument('--format', choices=sorted(importing.READERS), help='Defaults to the file extension.')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows per bulk insert and transaction.')
+        parser.add_argument('--name', help='Checkpoint name (defaults to the absolute path of the file).')
+        parser.add_argument('--resume', action='store_true', help='Continue an interrupted import of this file.')
+        parser.add_argument('--restart', action='store_true', help='Forget the checkpoint and read the file from the start.')
+        parser.add_argument('--assignments', action='store_true', help='Also import the "assignees" column (usernames separated by ";").')
+        parser.add_argument('--notify', action='store_true', help='Queue notifications for imported assignments (off by default: they are history).')
+        parser.add_argument('--rejects', help='Where to write rejected rows as JSON Lines (default: <path>.rejects.jsonl).')
+
+    def handle(self, *args, **options):
+        path = os.path.abspath(options['path'])
+        if not os.path.isfile(path):
+            raise CommandError(f'No such file: {path}')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1.')
+        read = importing.READERS[options['format'] or importing.detect_format(path)]
+        checkpoint = self.checkpoint(options['name'] or path, path, options)
+
+        rejects_path = options['rejects'] or f'{path}.rejects.jsonl'
+        usernames = importing.UsernameCache()
+        totals = {'read': 0, 'imported': 0, 'rejected': 0, 'assignments': 0}
+        started = time.monotonic()
+
+        if checkpoint.offset:
+            self.stdout.write(f'Resuming after row {checkpoint.rows_read} (byte {checkpoint.offset}).')
+        with open(path, 'rb') as source, open(rejects_path, 'a' if checkpoint.offset else 'w') as rejects:
+            rows = read(source, checkpoint.offset, checkpoint.rows_read + 1)
+            while True:
+                batch = self.next_batch(rows, options['chunk_size'])
+                if not batch:
+                    break
+                last_number, last_offset = batch[-1][0], batch[-1][1]
+                chunk, rejected = self.validate(batch, usernames, options['assignments'])
+                # Written before the commit: a chunk retried after a crash may repeat rejects, never lose them
+                for number, row, errors in rejected:
+                    rejects.write(json.dumps({'row': number, 'errors': errors, 'data': row}, default=str) + '\n')
+                rejects.flush()
+
+                with transaction.atomic():
+                    imported, assignments = importing.write_chunk(chunk, notify=options['notify']) if chunk else (0, 0)
+                    checkpoint.offset = last_offset
+                    checkpoint.rows_read = last_number
+                    checkpoint.rows_imported += imported
+                    checkpoint.rows_rejected += len(rejected)
+                    checkpoint.assignments_imported += assignments
+                    checkpoint.save()
+
+                totals['read'] += len(batch)
+                totals['imported'] += imported
+                totals['rejected'] += len(rejected)
+                totals['assignments'] += assignments
+                self.progress(totals, started)
+
+        checkpoint.finished_at = timezone.now()
+        checkpoint.save(update_fields=['finished_at', 'updated_at'])
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {totals['imported']} incidents and {totals['assignments']} assignments imported, "
+            f"{totals['rejected']} rows rejected, {totals['read'] / elapsed if elapsed else 0:.0f} rows/s."
+        ))
+        self.stdout.write(
+            f'Whole file: {checkpoint.rows_imported} imported, {checkpoint.rows_rejected} rejected over all runs.'
+        )
+        if checkpoint.rows_rejected:
+            self.stdout.write(f'Rejected rows are in {rejects_path}')
+        if totals['imported']:
+            self.stdout.write('Run `manage.py geocode_worker --backfill --once` to resolve addresses for the new incidents.')
+
+    def checkpoint(self, name, path, options):
+        checkpoint = ImportCheckpoint.objects.filter(name=name).first()
+        if checkpoint is not None and options['restart']:
+            checkpoint.delete()
+            checkpoint = None
+        if checkpoint is None:
+            return ImportCheckpoint.objects.create(name=name, fingerprint=importing.fingerprint(path))
+
+        if not importing.matches(path, checkpoint.fingerprint):
+            raise CommandError(f'"{name}" was checkpointed for a different file. Use --restart or another --name.')
+        if checkpoint.finished_at is not None and not options['resume']:
+            raise CommandError(
+                f'"{name}" was already imported ({checkpoint.rows_imported} rows). '
+                'Use --resume to import rows appended since, or --restart to import it all again.'
+            )
+        if checkpoint.finished_at is None and not options['resume']:
+            raise CommandError(
+                f'An import of "{name}" stopped after row {checkpoint.rows_read}. Use --resume to continue it, '
+                'or --restart to start over (rows already imported stay in the database).'
+            )
+        checkpoint.finished_at = None
+        return checkpoint
+
+    def next_batch(self, rows, size):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= size:
+                break
+        return batch
+
+    def validate(self, batch, usernames, with_assignments):
+        # Returns ([(incident, assignee ids)], [(row number, row, errors)])
+        validated, rejected = [], []
+        for number, _, row in batch:
+            try:
+                incident, assignees = importing.validate(row)
+                validated.append((number, row, incident, assignees if with_assignments else []))
+            except ValidationError as error:
+                rejected.append((number, row, importing.error_messages(error)))
+
+        user_ids = usernames.resolve({username for *_, assignees in validated for username in assignees})
+        chunk = []
+        for number, row, incident, assignees in validated:
+            unknown = [username for username in assignees if user_ids[username] is None]
+            if unknown:
+                rejected.append((number, row, {importing.ASSIGNEES_COLUMN: [f"Unknown user: {', '.join(unknown)}"]}))
+                continue
+            chunk.append((incident, list(dict.fromkeys(user_ids[username] for username in assignees))))
+        rejected.sort(key=lambda rejection: rejection[0])
+        return chunk, rejected
+
+    def progress(self, totals, started):
+        elapsed = time.monotonic() - started
+        rate = totals['read'] / elapsed if elapsed else 0
+        self.stdout.write(
+            f"read={totals['read']} imported={totals['imported']} rejected={totals['rejected']} "
+            f"assignments={totals['assignments']} ({rate:.0f} rows/s)"
+        )
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from luwasapp import notifications
+
+
+class Command(BaseCommand):
+    help = 'Send pending assignment notifications, one digest per responder per batch, and mark them sent.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit once nothing is due instead of polling.')
+        parser.add_argument('--batch-size', type=int, help='Assignments claimed per batch (defaults to NOTIFICATIONS["BATCH_SIZE"]).')
+        parser.add_argument('--concurrency', type=int, help='Digests sent in parallel (defaults to NOTIFICATIONS["CONCURRENCY"]).')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to sleep when nothing is due.')
+        parser.add_argument('--backend', help='Dotted path of the notification backend class.')
+
+    def handle(self, *args, **options):
+        overrides = {}
+        if options['batch_size']:
+            overrides['BATCH_SIZE'] = options['batch_size']
+        if options['concurrency']:
+            overrides['CONCURRENCY'] = options['concurrency']
+        if options['backend']:
+            overrides['BACKEND'] = options['backend']
+        notifications.configure(**overrides)
+
+        totals = {'sent': 0, 'failed': 0, 'digests': 0, 'expired': 0}
+        started = time.monotonic()
+        while True:
+            totals['expired'] += notifications.expire_stale()
+            sent, failed, digests = notifications.process_batch()
+            if not sent and not failed:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            totals['sent'] += sent
+            totals['failed'] += failed
+            totals['digests'] += digests
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"sent={totals['sent']} in {totals['digests']} digests, failed={totals['failed']} ({elapsed:.1f}s)"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'Done: {totals}'))
@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from luwasapp import attachments
+from luwasapp.models import IncidentAttachment
+
+
+class Command(BaseCommand):
+    help = (
+        'Make thumbnails for uploaded incident photos that have none yet (the worker when ATTACHMENTS["WORKER"] '
+        'is "command", or a backfill), and delete uploads abandoned before they finished.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retry-failed', action='store_true', help='Also retry photos whose thumbnails failed.')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--poll-interval', type=float, help='Keep running, checking for new photos this often (seconds).')
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            queued = IncidentAttachment.objects.filter(status='failed').exclude(file='').update(status='processing', error='')
+            self.stdout.write(f'Re-queued {queued} failed photos.')
+
+        abandoned = 0
+        for attachment in attachments.abandoned().iterator():
+            # One by one, so post_delete removes the partial files
+            attachment.delete()
+            abandoned += 1
+        if abandoned:
+            self.stdout.write(f'Deleted {abandoned} abandoned uploads.')
+
+        totals = {'ready': 0, 'failed': 0}
+        started = time.monotonic()
+        while True:
+            batch = list(
+                IncidentAttachment.objects.filter(status='processing').order_by('pk')
+                .values_list('pk', flat=True)[:options['batch_size']]
+            )
+            if not batch:
+                if options['poll_interval'] is None:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            for pk in batch:
+                try:
+                    attachments.make_thumbnails(pk)
+                    totals['ready'] += 1
+                except Exception as error:
+                    # Marked failed; the rest of the batch still gets its thumbnails
+                    self.stderr.write(f'Attachment {pk}: {error}')
+                    totals['failed'] += 1
+            self.stdout.write(f"ready={totals['ready']} failed={totals['failed']} ({time.monotonic() - started:.1f}s)")
+
+        self.stdout.write(self.style.SUCCESS(f'Done: {totals}'))
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from luwasapp import avatars
+
+
+class Command(BaseCommand):
+    help = (
+        'Make profile image thumbnails that are missing or were made from an earlier image: a backfill for '
+        'existing images, and the worker when PROFILE_IMAGES["WORKER"] is "command".'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', help='Only these user ids (repeatable); always remade.')
+        parser.add_argument('--poll-interval', type=float, help='Keep running, checking for new images this often (seconds).')
+
+    def handle(self, *args, **options):
+        while True:
+            user_ids = options['user'] or avatars.stale_users()
+            totals = {'made': 0, 'failed': 0}
+            started = time.monotonic()
+            for user_id in user_ids:
+                try:
+                    made = avatars.make_thumbnails(user_id)
+                except Exception as error:
+                    # A missing or unreadable original; the others still get theirs
+                    self.stderr.write(f'User {user_id}: {error}')
+                    totals['failed'] += 1
+                    continue
+                if made is not None:
+                    totals['made'] += 1
+            if user_ids:
+                self.stdout.write(
+                    f"Thumbnails for {totals['made']} users, {totals['failed']} failed ({time.monotonic() - started:.1f}s)"
+                )
+            if options['poll_interval'] is None or options['user']:
+                break
+            time.sleep(options['poll_interval'])
+        self.stdout.write(self.style.SUCCESS('Done.'))
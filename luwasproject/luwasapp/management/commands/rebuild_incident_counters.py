@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from luwasapp import counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute the dashboard counters (global and per user, by category and by status) from scratch.'
+
+    def handle(self, *args, **options):
+        rows = counters.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} incident counters.'))
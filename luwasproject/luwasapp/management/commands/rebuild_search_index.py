@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from luwasapp import search
+from luwasapp.models import IncidentReport
+
+
+class Command(BaseCommand):
+    help = (
+        'Create the incident search index if it is missing (with its triggers on SQLite) and reindex every incident. '
+        'Run after restoring a database from a copy made without the index, or to compact it after a large import.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--no-optimize', action='store_true', help='Skip merging the SQLite index into one segment.')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if not search.install(connection):
+            raise CommandError(f'{connection.vendor} has no full-text index here; search falls back to substring matching.')
+        if search.backend(connection) == 'tsvector':
+            self.stdout.write(self.style.SUCCESS('The PostgreSQL search column is generated and always current.'))
+            return
+        search.rebuild(connection, optimize=not options['no_optimize'])
+        count = IncidentReport.objects.using(options['database']).count()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the search index over {count} incidents.'))
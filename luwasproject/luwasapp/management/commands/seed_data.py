@@ -0,0 +1,206 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from luwasapp import counters, dispatch, geohash, notifications, routing, search
+from luwasapp.benchmarking import insert_rows
+from luwasapp.models import Department, Establishment, IncidentAssignment, IncidentReport, User
+
+# Where incidents cluster: (city, latitude, longitude, share of incidents)
+CITIES = [
+    ('Cebu City', 10.3157, 123.8854, 0.35),
+    ('Manila', 14.5995, 120.9842, 0.30),
+    ('Davao City', 7.1907, 125.4553, 0.20),
+    ('Iloilo City', 10.7202, 122.5621, 0.15),
+]
+# Relative frequency of each category; anything not listed is rare
+CATEGORY_WEIGHTS = {
+    'road_accident': 20, 'medical_emergency': 18, 'fire_incident': 10, 'crime_related': 12,
+    'public_disturbance': 8, 'flooding': 6, 'domestic_violence': 4, 'electrical_hazard': 3, 'typhoon': 2,
+}
+STATUS_WEIGHTS = {'reported': 2, 'resolved': 3, 'closed': 5}
+SEVERITY_WEIGHTS = {'low': 4, 'medium': 3, 'high': 2, 'critical': 1}
+INSERT_BATCH = 50_000
+
+
+def weighted(weights):
+    values = list(weights)
+    return values, list(weights.values())
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill the database with realistic synthetic data for load tests and benchmark_views: departments, '
+        'establishments, responders, incidents spread over categories, places and time, and assignments. '
+        'Point LUWAS_SQLITE_PATH at a scratch file first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--incidents', type=int, default=1_000_000)
+        parser.add_argument('--establishments', type=int, default=300)
+        parser.add_argument('--responders', type=int, default=2_000)
+        parser.add_argument('--assignment-rate', type=float, default=0.3, help='Share of incidents with assigned responders.')
+        parser.add_argument('--days', type=int, default=3 * 365, help='Incidents are spread over this many past days.')
+        parser.add_argument('--prefix', default='seed', help='Prefix of generated usernames.')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        started = time.monotonic()
+
+        departments = self.seed_departments()
+        establishments = self.seed_establishments(rng, departments, options['establishments'])
+        responders = self.seed_responders(rng, establishments, options)
+        first_new, total = self.seed_incidents(rng, options)
+        assignments = self.seed_assignments(rng, responders, first_new, options['assignment_rate'])
+
+        self.stdout.write('Rebuilding dashboard counters...')
+        counters.rebuild()
+        dispatch.invalidate()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {len(departments)} departments, {len(establishments)} establishments, {len(responders)} responders, '
+            f'{total} incidents and {assignments} assignments in {time.monotonic() - started:.0f}s.'
+        ))
+
+    def seed_departments(self):
+        # One department per name in the default routing table, so every category has responders
+        names = sorted({name for departments in routing.DEFAULT_CATEGORY_ROUTES.values() for name in departments})
+        departments = []
+        for name in names:
+            department, created = Department.objects.get_or_create(name=name)
+            if not created:
+                routing.seed_default_routes(department)
+            departments.append(department)
+        return departments
+
+    def seed_establishments(self, rng, departments, count):
+        establishments = []
+        for i in range(count):
+            department = departments[i % len(departments)]
+            city, lat, lon, _ = CITIES[i % len(CITIES)]
+            establishments.append(Establishment(
+                name=f'{department.name} - {city} #{i // len(departments) + 1}',
+                location=city,
+                department=department,
+                latitude=lat + rng.gauss(0, 0.05),
+                longitude=lon + rng.gauss(0, 0.05),
+            ))
+        Establishment.objects.bulk_create(establishments, batch_size=1000)
+        self.stdout.write(f'{len(establishments)} establishments')
+        return establishments
+
+    def seed_responders(self, rng, establishments, options):
+        # Returns [(user id, department id)]
+        prefix = options['prefix']
+        start = User.objects.filter(username__startswith=f'{prefix}-responder-').count()
+        now = timezone.now()
+        rows = []
+        for i in range(start, start + options['responders']):
+            establishment = establishments[rng.randrange(len(establishments))]
+            rows.append({
+                'username': f'{prefix}-responder-{i}',
+                'email': f'{prefix}-responder-{i}@example.com',
+                'password': '!',  # unusable
+                'first_name': f'Responder {i}',
+                'department_id': establishment.department_id,
+                'establishment_id': establishment.pk,
+                'is_active': True,
+                'date_joined': now,
+            })
+        with transaction.atomic():
+            insert_rows(connection, User, rows)
+        if not User.objects.filter(username=f'{prefix}-staff').exists():
+            # Staff member of the department with the most routed categories; benchmark_views logs in as this user
+            department = max({establishment.department for establishment in establishments}, key=lambda department: (
+                len(routing.default_categories_for(department.name)), -department.pk,
+            ))
+            User.objects.create_superuser(
+                f'{prefix}-staff', f'{prefix}-staff@example.com', None,
+                department=department, establishment=department.establishments.first(),
+            )
+        self.stdout.write(f'{len(rows)} responders')
+        return list(
+            User.objects.filter(username__startswith=f'{prefix}-responder-', department__isnull=False)
+            .values_list('pk', 'department_id')
+        )
+
+    def seed_incidents(self, rng, options):
+        categories = [value for value, _ in IncidentReport.CATEGORY_CHOICES]
+        category_weights = [CATEGORY_WEIGHTS.get(category, 1) for category in categories]
+        statuses, status_weights = weighted(STATUS_WEIGHTS)
+        severities, severity_weights = weighted(SEVERITY_WEIGHTS)
+        city_weights = [share for *_, share in CITIES]
+        now = timezone.now()
+        span = options['days'] * 86400
+
+        def rows(count):
+            for _ in range(count):
+                city, lat, lon, _ = rng.choices(CITIES, city_weights)[0]
+                lat, lon = lat + rng.gauss(0, 0.08), lon + rng.gauss(0, 0.08)
+                # Skewed towards recent dates, like a growing user base
+                age = span * (1 - rng.random() ** 0.5)
+                yield {
+                    'incident_type': 'Seeded incident',
+                    'severity': rng.choices(severities, severity_weights)[0],
+                    'category': rng.choices(categories, category_weights)[0],
+                    'status': rng.choices(statuses, status_weights)[0],
+                    'location': city,
+                    'latitude': lat,
+                    'longitude': lon,
+                    'geohash': geohash.encode(lat, lon),
+                    'timestamp': now - timedelta(seconds=age),
+                }
+
+        first_new = (IncidentReport.objects.order_by('-pk').values_list('pk', flat=True).first() or 0) + 1
+        remaining = options['incidents']
+        started = time.monotonic()
+        # Indexed for search in one pass once they're all in
+        with search.triggers_paused(connection):
+            while remaining > 0:
+                batch = min(remaining, INSERT_BATCH)
+                with transaction.atomic():
+                    insert_rows(connection, IncidentReport, rows(batch))
+                remaining -= batch
+                done = options['incidents'] - remaining
+                self.stdout.write(f'{done} incidents ({done / (time.monotonic() - started):.0f} rows/s)')
+        return first_new, options['incidents']
+
+    def seed_assignments(self, rng, responders, first_new, rate):
+        # Assign one or two responders from a department routed to each incident's category
+        by_department = {}
+        for user_id, department_id in responders:
+            by_department.setdefault(department_id, []).append(user_id)
+        by_category = {}
+        for department_id, categories in routing.department_index().items():
+            for category in categories:
+                by_category.setdefault(category, []).extend(by_department.get(department_id, []))
+
+        now = timezone.now()
+        seeded = {
+            'notification_attempts': notifications.get_setting('MAX_ATTEMPTS'),
+            'notification_error': 'Seeded; not notified.',
+        }
+
+        def rows():
+            incidents = IncidentReport.objects.filter(pk__gte=first_new).order_by('pk').values_list('pk', 'category', 'timestamp')
+            for incident_id, category, timestamp in incidents.iterator(chunk_size=10_000):
+                candidates = by_category.get(category)
+                if not candidates or rng.random() >= rate:
+                    continue
+                for user_id in set(rng.sample(candidates, min(len(candidates), rng.choice((1, 1, 2))))):
+                    yield {
+                        'user_id': user_id, 'incident_report_id': incident_id,
+                        'assigned_at': min(timestamp + timedelta(minutes=rng.randrange(5, 120)), now), **seeded,
+                    }
+
+        with transaction.atomic():
+            count = insert_rows(connection, IncidentAssignment, rows())
+        self.stdout.write(f'{count} assignments')
+        return count
@@ -0,0 +1,98 @@
+import socketserver
+
+from django.core.management.base import BaseCommand
+
+
+class StubSMTPHandler(socketserver.StreamRequestHandler):
+    # Just enough SMTP for Django's mail backend: accepts every message and prints a summary
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.reply('220 luwas stub SMTP ready')
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command[:4].upper()
+            if verb in ('HELO', 'EHLO'):
+                self.reply('250 luwas')
+            elif verb == 'MAIL':
+                sender, recipients = command[10:], []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command[8:])
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                message = self.read_message()
+                self.server.messages_received += 1
+                if self.server.fail_every and self.server.messages_received % self.server.fail_every == 0:
+                    self.reply('451 Temporary failure, try again later')
+                else:
+                    self.server.deliver(sender, recipients, message)
+                    self.reply('250 Message accepted')
+            elif verb == 'RSET':
+                sender, recipients = None, []
+                self.reply('250 OK')
+            elif verb == 'NOOP':
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+    def read_message(self):
+        lines = []
+        while True:
+            line = self.rfile.readline()
+            if not line or line in (b'.\r\n', b'.\n'):
+                return b''.join(lines).decode('utf-8', 'replace')
+            lines.append(line[1:] if line.startswith(b'..') else line)
+
+
+class StubSMTPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, stdout, fail_every=0, verbose=False):
+        super().__init__(address, StubSMTPHandler)
+        self.stdout = stdout
+        self.fail_every = fail_every
+        self.verbose = verbose
+        self.messages_received = 0
+        self.messages_delivered = 0
+
+    def deliver(self, sender, recipients, message):
+        self.messages_delivered += 1
+        subject = next((line[9:] for line in message.splitlines() if line.startswith('Subject: ')), '')
+        self.stdout.write(f"#{self.messages_delivered} {sender} -> {', '.join(recipients)}: {subject}")
+        if self.verbose:
+            self.stdout.write(message)
+
+
+class Command(BaseCommand):
+    help = 'Run a local SMTP stand-in that prints what it receives, for exercising notification_worker offline.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8025)
+        parser.add_argument('--fail-every', type=int, default=0, help='Reject every Nth message with a temporary failure.')
+
+    def handle(self, *args, **options):
+        server = StubSMTPServer(
+            (options['host'], options['port']), self.stdout,
+            fail_every=options['fail_every'], verbose=options['verbosity'] > 1,
+        )
+        self.stdout.write(f"Stub SMTP server listening on {options['host']}:{options['port']}")
+        self.stdout.write(f"Point Django at it with: EMAIL_HOST={options['host']} EMAIL_PORT={options['port']}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
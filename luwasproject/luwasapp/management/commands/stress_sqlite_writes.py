@@ -0,0 +1,158 @@
+import json
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from luwasapp import database
+from luwasapp.benchmarking import insert_rows, scratch_database
+from luwasapp.models import Department, Establishment, IncidentCounter, IncidentReport, User
+
+ALIAS = 'stress'
+# IncidentCounter and what its foreign key needs
+MODELS = [Department, Establishment, User, IncidentReport, IncidentCounter]
+# (name, OPTIONS, PRAGMAS): Django's SQLite defaults, and the sqlite-production profile
+PROFILES = [
+    ('stock', {}, {}),
+    ('production', settings.SQLITE_PRODUCTION['OPTIONS'], settings.SQLITE_PRODUCTION['PRAGMAS']),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Run concurrent writers (report an incident and bump its counter, like the report view) and board readers '
+        'against a scratch SQLite file, once with stock settings and once with the sqlite-production profile, '
+        'and compare write throughput, "database is locked" errors and latency.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8)
+        parser.add_argument('--readers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--rows', type=int, default=20_000, help='Incidents in the database before the run.')
+        parser.add_argument('--profile', action='append', choices=[name for name, *_ in PROFILES], help='Only these profiles (repeatable).')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+
+    def handle(self, *args, **options):
+        if options['writers'] < 1:
+            raise CommandError('--writers must be at least 1.')
+        results = []
+        for name, db_options, pragmas in PROFILES:
+            if options['profile'] and name not in options['profile']:
+                continue
+            with scratch_database(ALIAS, models=MODELS, options=db_options, pragmas=pragmas) as connection:
+                journal = database.pragma_values(connection, ['journal_mode'])['journal_mode']
+                counter = self.prepare(connection, options['rows'])
+                connection.close()
+                row = {'profile': name, 'journal_mode': journal, **self.run(counter, options)}
+                stored = IncidentCounter.objects.using(ALIAS).get(pk=counter).count
+                if stored != row['commits']:
+                    raise CommandError(f'{name}: {row["commits"]} commits but the counter says {stored}.')
+                results.append(row)
+
+        self.report(results, options)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+
+    def prepare(self, connection, rows):
+        now = timezone.now()
+        with transaction.atomic(using=ALIAS):
+            insert_rows(connection, IncidentReport, (
+                {'incident_type': 'Stress incident', 'severity': 'low', 'category': 'road_accident',
+                 'status': 'reported', 'location': 'Cebu City', 'timestamp': now}
+                for _ in range(rows)
+            ))
+        return IncidentCounter.objects.using(ALIAS).create(dimension='status', key='reported', count=0).pk
+
+    def run(self, counter, options):
+        stop = time.monotonic() + options['seconds']
+        start = threading.Barrier(options['writers'] + options['readers'])
+        lock = threading.Lock()
+        totals = {'latencies': [], 'locked': 0, 'reads': 0}
+
+        def write():
+            # Read, then write, as the views do: a deferred transaction that must upgrade its read lock
+            with transaction.atomic(using=ALIAS):
+                IncidentCounter.objects.using(ALIAS).filter(pk=counter).values_list('count', flat=True).get()
+                IncidentReport.objects.using(ALIAS).bulk_create([IncidentReport(
+                    incident_type='Stress incident', severity='high', category='fire_incident', location='Cebu City',
+                )])
+                IncidentCounter.objects.using(ALIAS).filter(pk=counter).update(count=F('count') + 1)
+
+        def writer():
+            latencies, locked = [], 0
+            start.wait()
+            try:
+                while time.monotonic() < stop:
+                    started = time.perf_counter()
+                    try:
+                        write()
+                    except OperationalError as error:
+                        if 'locked' not in str(error):
+                            raise
+                        locked += 1
+                    else:
+                        latencies.append((time.perf_counter() - started) * 1000)
+            finally:
+                connections[ALIAS].close()
+            with lock:
+                totals['latencies'].extend(latencies)
+                totals['locked'] += locked
+
+        def reader():
+            reads = 0
+            start.wait()
+            try:
+                while time.monotonic() < stop:
+                    try:
+                        # A board column: the newest reported incidents
+                        list(IncidentReport.objects.using(ALIAS).filter(status='reported').order_by('-reportid')[:50])
+                        reads += 1
+                    except OperationalError as error:
+                        if 'locked' not in str(error):
+                            raise
+            finally:
+                connections[ALIAS].close()
+            with lock:
+                totals['reads'] += reads
+
+        threads = (
+            [threading.Thread(target=writer) for _ in range(options['writers'])]
+            + [threading.Thread(target=reader) for _ in range(options['readers'])]
+        )
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        latencies = sorted(totals['latencies'])
+        return {
+            'commits': len(latencies),
+            'commits_per_s': round(len(latencies) / elapsed, 1),
+            'locked_errors': totals['locked'],
+            'reads_per_s': round(totals['reads'] / elapsed, 1),
+            'p50_ms': round(statistics.median(latencies), 2) if latencies else None,
+            'p99_ms': round(latencies[int(len(latencies) * 0.99)], 2) if latencies else None,
+        }
+
+    def report(self, results, options):
+        self.stdout.write(
+            f"\n{options['writers']} writers and {options['readers']} readers for {options['seconds']:g}s "
+            f"on {options['rows']} incidents\n"
+        )
+        self.stdout.write(f"{'profile':<12} {'journal':>8} {'commits/s':>10} {'locked':>8} {'p50 ms':>8} {'p99 ms':>8} {'reads/s':>9}")
+        for row in results:
+            self.stdout.write(
+                f"{row['profile']:<12} {row['journal_mode']:>8} {row['commits_per_s']:>10.1f} {row['locked_errors']:>8} "
+                f"{row['p50_ms'] or 0:>8.2f} {row['p99_ms'] or 0:>8.2f} {row['reads_per_s']:>9.1f}"
+            )
+        if len(results) == 2 and results[0]['commits_per_s']:
+            self.stdout.write(f"\nWrite throughput: {results[1]['commits_per_s'] / results[0]['commits_per_s']:.1f}x")
@@ -0,0 +1,42 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from luwasapp.replicas import REPLICA
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the primary SQLite database over the replica file (LUWAS_DB_PROFILE=sqlite-replica), once or '
+        'every --interval seconds, to try replica reads and replication lag locally.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, help='Keep copying, this many seconds apart (simulated lag).')
+
+    def handle(self, *args, **options):
+        primary, replica = settings.DATABASES['default'], settings.DATABASES.get(REPLICA)
+        if replica is None:
+            raise CommandError(f'No "{REPLICA}" database configured; set LUWAS_DB_PROFILE=sqlite-replica.')
+        if 'sqlite3' not in primary['ENGINE'] or 'sqlite3' not in replica['ENGINE']:
+            raise CommandError('sync_replica only copies SQLite files; use real replication for other databases.')
+
+        while True:
+            started = time.monotonic()
+            self.copy(str(primary['NAME']), str(replica['NAME']))
+            self.stdout.write(f"Copied {primary['NAME']} to {replica['NAME']} in {(time.monotonic() - started) * 1000:.0f} ms.")
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+
+    def copy(self, source_path, target_path):
+        # SQLite's online backup: a consistent snapshot, even while the primary is being written
+        source, target = sqlite3.connect(source_path), sqlite3.connect(target_path)
+        try:
+            with target:
+                source.backup(target)
+        finally:
+            source.close()
+            target.close()
@@ -0,0 +1,267 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+# In-process metrics in the Prometheus text format, served at /metrics. MetricsMiddleware times each
+# request by URL name; a database execute wrapper (installed on every new connection from
+# signals.py) adds the queries run while handling it, and outbound() times calls to other services.
+# Recording is a few dict updates under one lock, cheap enough to leave on. Each process keeps its
+# own numbers: scrape every worker, or let Prometheus sum them.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+OUTBOUND_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10)
+
+# [query count, query seconds] of the request being handled in this thread or task, if any
+_request_queries = ContextVar('luwas_request_queries', default=None)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.values = {}
+
+    def inc(self, label_values=(), amount=1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self):
+        for label_values, value in self.values.items():
+            yield self.name, dict(zip(self.labels, label_values)), value
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, label_values=()):
+        self.values[label_values] = value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}  # label values -> [count per bucket (+Inf last), sum]
+
+    def observe(self, label_values, value):
+        counts = self.values.get(label_values)
+        if counts is None:
+            counts = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0]
+        counts[0][bisect_left(self.buckets, value)] += 1
+        counts[1] += value
+
+    def samples(self):
+        for label_values, (counts, total) in self.values.items():
+            labels = dict(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                yield f'{self.name}_bucket', {**labels, 'le': str(bound)}, cumulative
+            yield f'{self.name}_sum', labels, total
+            yield f'{self.name}_count', labels, cumulative
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = []
+        self.collectors = []  # callables returning extra metrics, read at scrape time
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, func):
+        self.collectors.append(func)
+        return func
+
+    def reset(self):
+        with self.lock:
+            for metric in self.metrics:
+                metric.values.clear()
+
+    def render(self):
+        with self.lock:
+            metrics = [(metric, list(metric.samples())) for metric in self.metrics]
+        for collect in self.collectors:
+            metrics.extend((metric, list(metric.samples())) for metric in collect())
+
+        lines = []
+        for metric, samples in metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in samples:
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+registry = Registry()
+
+requests_total = registry.add(Counter(
+    'luwas_http_requests_total', 'HTTP requests by URL name, method and status class.', ('view', 'method', 'status'),
+))
+request_duration = registry.add(Histogram(
+    'luwas_http_request_duration_seconds', 'Time to produce the response, by URL name.', ('view', 'method'),
+))
+request_queries = registry.add(Histogram(
+    'luwas_http_request_queries', 'SQL queries per request, by URL name.', ('view',), QUERY_COUNT_BUCKETS,
+))
+query_seconds = registry.add(Counter(
+    'luwas_db_query_seconds_total', 'Time spent in SQL queries while handling requests, by URL name.', ('view',),
+))
+outbound_duration = registry.add(Histogram(
+    'luwas_outbound_request_duration_seconds', 'Calls to other services, by service and outcome.',
+    ('service', 'outcome'), OUTBOUND_BUCKETS,
+))
+
+
+#======================================================RECORDING======================================================#
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unmatched>'
+    return match.view_name or match._func_path
+
+
+def record_request(request, status_code, elapsed, queries):
+    view = view_name(request)
+    count, seconds = queries
+    with registry.lock:
+        requests_total.inc((view, request.method, f'{status_code // 100}xx'))
+        request_duration.observe((view, request.method), elapsed)
+        request_queries.observe((view,), count)
+        query_seconds.inc((view,), seconds)
+
+
+def query_wrapper(execute, sql, params, many, context):
+    queries = _request_queries.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        queries[0] += 1
+        queries[1] += time.perf_counter() - started
+
+
+def install(connection):
+    if query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_wrapper)
+
+
+@contextmanager
+def outbound(service):
+    # Times one call to another service; outcome is "ok" unless the block raises
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        elapsed = time.perf_counter() - started
+        with registry.lock:
+            outbound_duration.observe((service, outcome), elapsed)
+
+
+class MetricsMiddleware:
+    # Put first in MIDDLEWARE so the time and queries of the other middleware are counted too.
+    # For streaming responses this is the time until the response starts.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        queries = [0, 0.0]
+        token = _request_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        record_request(request, response.status_code, time.perf_counter() - started, queries)
+        return response
+
+    async def __acall__(self, request):
+        queries = [0, 0.0]
+        token = _request_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        record_request(request, response.status_code, time.perf_counter() - started, queries)
+        return response
+
+
+#======================================================COLLECTORS======================================================#
+
+@registry.collector
+def geocoding_metrics():
+    from . import geocoding
+
+    data = geocoding.stats()
+    lookups = Counter('luwas_geocode_lookups_total', 'Reverse geocode lookups by how they were answered.', ('result',))
+    for name in ('memory_hits', 'db_hits', 'stale_hits', 'negative_hits', 'misses'):
+        lookups.inc((name,), data[name])
+    fetches = Counter('luwas_geocode_fetches_total', 'Requests made to the geocoding provider, by outcome.', ('outcome',))
+    fetches.inc(('ok',), data['fetches'] - data['fetch_errors'])
+    fetches.inc(('error',), data['fetch_errors'])
+    entries = Gauge('luwas_geocode_memory_entries', 'Entries in the in-process geocode cache.')
+    entries.set(data['memory_entries'])
+    return [lookups, fetches, entries]
+
+
+@registry.collector
+def live_feed_metrics():
+    from . import events
+
+    subscribers = Gauge('luwas_live_feed_clients', 'Clients connected to the live incident feed in this process.')
+    subscribers.set(len(events.broker))
+    return [subscribers]
+
+
+@registry.collector
+def fragment_metrics():
+    from . import fragments
+
+    requests = Counter('luwas_fragment_cache_requests_total', 'Cached incident fragment lookups by fragment and result.', ('fragment', 'result'))
+    ratio = Gauge('luwas_fragment_cache_hit_ratio', 'Share of fragment lookups answered from the cache.', ('fragment',))
+    for name, counts in fragments.stats().items():
+        requests.inc((name, 'hit'), counts['hits'])
+        requests.inc((name, 'miss'), counts['misses'])
+        if counts['hit_ratio'] is not None:
+            ratio.set(counts['hit_ratio'], (name,))
+    return [requests, ratio]
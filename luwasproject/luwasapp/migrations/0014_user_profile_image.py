@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2024-12-06 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('luwasapp', '0013_alter_incidentreport_status_alter_user_is_staff'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='profile_image',
+            field=models.ImageField(blank=True, null=True, upload_to='profile_images/'),
+        ),
+    ]
@@ -0,0 +1,14 @@
+# Generated by Django 5.1.3 on 2026-10-18 10:08
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('luwasapp', '0014_alter_incidentreport_status'),
+        ('luwasapp', '0014_user_profile_image'),
+    ]
+
+    operations = [
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.3 on 2026-10-18 10:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('luwasapp', '0015_merge_20241206'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodeCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(max_length=20)),
+                ('precision', models.PositiveSmallIntegerField()),
+                ('lat_key', models.IntegerField()),
+                ('lon_key', models.IntegerField()),
+                ('address', models.CharField(blank=True, max_length=512)),
+                ('details', models.JSONField(blank=True, default=dict)),
+                ('found', models.BooleanField(default=True)),
+                ('fetched_at', models.DateTimeField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('provider', 'precision', 'lat_key', 'lon_key'), name='unique_geocode_cache_key')],
+            },
+        ),
+    ]
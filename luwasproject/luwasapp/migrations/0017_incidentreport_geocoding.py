@@ -0,0 +1,38 @@
+# Generated by Django 5.1.3 on 2026-10-18 10:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('luwasapp', '0016_geocodecache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='incidentreport',
+            name='geocode_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='incidentreport',
+            name='geocode_status',
+            field=models.CharField(blank=True, choices=[('', 'Not queued'), ('pending', 'Pending'), ('resolved', 'Resolved'), ('failed', 'Failed'), ('skipped', 'Skipped')], db_index=True, default='', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='incidentreport',
+            name='geocoded_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='incidentreport',
+            name='location_details',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='incidentreport',
+            name='resolved_address',
+            field=models.CharField(blank=True, max_length=512),
+        ),
+    ]
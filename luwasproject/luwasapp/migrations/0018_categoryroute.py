@@ -0,0 +1,67 @@
+# Generated by Django 5.1.3 on 2026-10-18 10:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# The default routing table as of this migration (luwasapp.routing.DEFAULT_CATEGORY_ROUTES), copied so
+# later edits there don't change what this migration does
+CATEGORY_ROUTES = {
+    'fire_incident': ['Fire Department', 'Medical Department', 'Emergency Response'],
+    'medical_emergency': ['Medical Department', 'Emergency Response'],
+    'road_accident': ['Transportation Department', 'Medical Department'],
+    'natural_disaster': ['Disaster Response', 'Emergency Management Department'],
+    'crime_related': ['Police Department', 'Law Enforcement'],
+    'domestic_violence': ['Social Services', 'Domestic Violence Response Team'],
+    'psychological_crisis': ['Mental Health Services', 'Crisis Intervention Team'],
+    'missing_person': ['Police Department', 'Missing Persons Unit'],
+    'poisoning': ['Poison Control Center', 'Health Department'],
+    'gas_leak': ['Fire Department', 'Hazardous Materials (HazMat) Team'],
+    'electrical_hazard': ['Electrical Utility Company', 'Fire Department'],
+    'hazardous_materials': ['Hazardous Materials (HazMat) Response', 'Environmental Protection Agency'],
+    'flooding': ['Emergency Management', 'Flood Control Department'],
+    'earthquake': ['Emergency Management', 'Geological Survey Department'],
+    'typhoon': ['National Disaster Risk Reduction and Management Council (NDRRMC)', 'Emergency Management'],
+    'animal_attack': ['Animal Control', 'Emergency Medical Services (EMS)'],
+    'terrorist_threat': ['Counter-Terrorism Unit', 'National Security Agency'],
+    'building_collapse': ['Fire Department', 'Rescue and Emergency Response'],
+    'public_disturbance': ['Public Safety', 'Police Department'],
+    'child_abuse': ['Child Protective Services', 'Social Services'],
+    'elderly_abuse': ['Adult Protective Services', 'Social Services'],
+}
+
+
+def seed_routes(apps, schema_editor):
+    # Route existing departments using the mapping that used to live in views.py
+    Department = apps.get_model('luwasapp', 'Department')
+    CategoryRoute = apps.get_model('luwasapp', 'CategoryRoute')
+    departments = {department.name.lower(): department for department in Department.objects.all()}
+    routes = []
+    for category, names in CATEGORY_ROUTES.items():
+        for name in names:
+            department = departments.get(name.lower())
+            if department is not None:
+                routes.append(CategoryRoute(category=category, department=department))
+    CategoryRoute.objects.bulk_create(routes, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('luwasapp', '0017_incidentreport_geocoding'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryRoute',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(choices=[('medical_emergency', 'Medical Emergency'), ('fire_incident', 'Fire Incident'), ('road_accident', 'Road Accident'), ('natural_disaster', 'Natural Disaster'), ('crime_related', 'Crime Related'), ('domestic_violence', 'Domestic Violence'), ('psychological_crisis', 'Psychological Crisis'), ('missing_person', 'Missing Person'), ('poisoning', 'Poisoning'), ('gas_leak', 'Gas Leak'), ('electrical_hazard', 'Electrical Hazard'), ('hazardous_materials', 'Hazardous Materials Spill'), ('flooding', 'Flooding'), ('earthquake', 'Earthquake'), ('typhoon', 'Typhoon'), ('animal_attack', 'Animal Attack'), ('terrorist_threat', 'Terrorist Threat/Attack'), ('building_collapse', 'Building Collapse'), ('public_disturbance', 'Public Disturbance'), ('child_abuse', 'Child Abuse'), ('elderly_abuse', 'Elderly Abuse')], max_length=255)),
+                ('department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='category_routes', to='luwasapp.department')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['category'], name='categoryroute_category_idx')],
+                'constraints': [models.UniqueConstraint(fields=('department', 'category'), name='unique_category_route')],
+            },
+        ),
+        migrations.RunPython(seed_routes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.3 on 2026-10-18 10:12
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicate_assignments(apps, schema_editor):
+    # Keep the earliest assignment of each (user, incident) pair so the unique constraint can be added
+    IncidentAssignment = apps.get_model('luwasapp', 'IncidentAssignment')
+    keep = (
+        IncidentAssignment.objects.values('user_id', 'incident_report_id')
+        .annotate(first_id=Min('id'))
+        .values_list('first_id', flat=True)
+    )
+    IncidentAssignment.objects.exclude(id__in=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('luwasapp', '0018_categoryroute'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_assignments, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='incidentreport',
+            index=models.Index(fields=['category', 'status', '-timestamp'], name='incident_cat_status_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='incidentreport',
+            index=models.Index(fields=['status', 'category'], name='incident_status_cat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='incidentreport',
+            index=models.Index(fields=['-timestamp'], name='incident_timestamp_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='incidentassignment',
+            constraint=models.UniqueConstraint(fields=('user', 'incident_report'), name='unique_incident_assignment'),
+        ),
+    ]
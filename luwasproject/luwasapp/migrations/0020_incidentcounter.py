@@ -0,0 +1,45 @@
+# Generated by Django 5.1.3 on 2026-10-18 10:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def build_counters(apps, schema_editor):
+    # Same as counters.rebuild(), against the historical models
+    IncidentReport = apps.get_model('luwasapp', 'IncidentReport')
+    IncidentAssignment = apps.get_model('luwasapp', 'IncidentAssignment')
+    IncidentCounter = apps.get_model('luwasapp', 'IncidentCounter')
+    rows = []
+    for dimension in ('category', 'status'):
+        for row in IncidentReport.objects.values(dimension).annotate(total=Count('pk')).order_by():
+            rows.append(IncidentCounter(dimension=dimension, key=row[dimension] or '', count=row['total']))
+        field = f'incident_report__{dimension}'
+        for row in IncidentAssignment.objects.values('user_id', field).annotate(total=Count('pk')).order_by():
+            rows.append(IncidentCounter(user_id=row['user_id'], dimension=dimension, key=row[field] or '', count=row['total']))
+    IncidentCounter.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('luwasapp', '0019_incident_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IncidentCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('category', 'Category'), ('status', 'Status')], max_length=10)),
+                ('key', models.CharField(blank=True, max_length=255)),
+                ('count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='incident_counters', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('user__isnull', True)), fields=('dimension', 'key'), name='unique_global_incident_counter'), models.UniqueConstraint(condition=models.Q(('user__isnull', False)), fields=('user', 'dimension', 'key'), name='unique_user_incident_counter')],
+            },
+        ),
+        migrations.RunPython(build_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.3 on 2026-10-18 10:17
+
+from django.db import migrations, models
+
+from luwasapp import geohash
+
+
+def fill_geohashes(apps, schema_editor):
+    IncidentReport = apps.get_model('luwasapp', 'IncidentReport')
+    batch = []
+    incidents = IncidentReport.objects.filter(latitude__isnull=False, longitude__isnull=False).only('latitude', 'longitude')
+    for incident in incidents.iterator(chunk_size=2000):
+        incident.geohash = geohash.encode(incident.latitude, incident.longitude)
+        batch.append(incident)
+        if len(batch) >= 2000:
+            IncidentReport.objects.bulk_update(batch, ['geohash'])
+            batch = []
+    IncidentReport.objects.bulk_update(batch, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('luwasapp', '0020_incidentcounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='incidentreport',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, max_length=12),
+        ),
+        migrations.RunPython(fill_geohashes, migrations.RunPython.noop),
+    ]
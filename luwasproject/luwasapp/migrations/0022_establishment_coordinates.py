@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-18 10:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('luwasapp', '0021_incidentreport_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='establishment',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='establishment',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.3 on 2026-10-18 10:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('luwasapp', '0022_establishment_coordinates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='incidentassignment',
+            name='notification_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='incidentassignment',
+            name='notification_claim',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='incidentassignment',
+            name='notification_claimed_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='incidentassignment',
+            name='notification_due_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='incidentassignment',
+            name='notification_error',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='incidentassignment',
+            name='notified_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='incidentassignment',
+            index=models.Index(condition=models.Q(('notification_sent', False)), fields=['notification_due_at', 'assigned_at'], name='assignment_outbox_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.3 on 2026-10-18 10:36
+
+from django.db import migrations, models
+
+
+def copy_timestamps(apps, schema_editor):
+    # Existing incidents: last known change is when they were reported
+    IncidentReport = apps.get_model('luwasapp', 'IncidentReport')
+    IncidentReport.objects.update(updated_at=models.F('timestamp'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('luwasapp', '0024_importcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='incidentreport',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(copy_timestamps, migrations.RunPython.noop),
+        # SQLite adds the column by rebuilding the table, which drops its planner statistics
+        migrations.RunSQL('ANALYZE', migrations.RunSQL.noop),
+    ]
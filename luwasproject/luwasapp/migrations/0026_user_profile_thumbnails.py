@@ -0,0 +1,20 @@
+# Generated by Django 5.1.3 on 2026-10-18 10:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('luwasapp', '0025_incidentreport_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='profile_thumbnails',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        # SQLite adds the column by rebuilding the table, which drops its planner statistics
+        migrations.RunSQL('ANALYZE', migrations.RunSQL.noop),
+    ]
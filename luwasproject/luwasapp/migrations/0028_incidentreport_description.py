@@ -0,0 +1,105 @@
+# Generated by Django 5.1.3 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+# The search index as of this migration (luwasapp.search), written out so later changes there don't
+# change what this migration creates: an FTS5 table kept in step by triggers on SQLite, a generated
+# tsvector column with a GIN index on PostgreSQL
+
+SQLITE_CREATE = [
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS luwasapp_incident_search USING fts5(
+        incident_type, description, location, resolved_address,
+        content='luwasapp_incidentreport', content_rowid='reportid',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS luwasapp_incident_search_insert AFTER INSERT ON luwasapp_incidentreport BEGIN
+        INSERT INTO luwasapp_incident_search(rowid, incident_type, description, location, resolved_address)
+        VALUES (new.reportid, new.incident_type, new.description, new.location, new.resolved_address);
+    END''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS luwasapp_incident_search_delete AFTER DELETE ON luwasapp_incidentreport BEGIN
+        INSERT INTO luwasapp_incident_search(luwasapp_incident_search, rowid, incident_type, description, location, resolved_address)
+        VALUES ('delete', old.reportid, old.incident_type, old.description, old.location, old.resolved_address);
+    END''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS luwasapp_incident_search_update
+    AFTER UPDATE OF incident_type, description, location, resolved_address ON luwasapp_incidentreport
+    WHEN old.incident_type IS NOT new.incident_type OR old.description IS NOT new.description
+        OR old.location IS NOT new.location OR old.resolved_address IS NOT new.resolved_address BEGIN
+        INSERT INTO luwasapp_incident_search(luwasapp_incident_search, rowid, incident_type, description, location, resolved_address)
+        VALUES ('delete', old.reportid, old.incident_type, old.description, old.location, old.resolved_address);
+        INSERT INTO luwasapp_incident_search(rowid, incident_type, description, location, resolved_address)
+        VALUES (new.reportid, new.incident_type, new.description, new.location, new.resolved_address);
+    END''',
+    "INSERT INTO luwasapp_incident_search(luwasapp_incident_search) VALUES ('rebuild')",
+]
+
+SQLITE_DROP = [
+    'DROP TRIGGER IF EXISTS luwasapp_incident_search_insert',
+    'DROP TRIGGER IF EXISTS luwasapp_incident_search_delete',
+    'DROP TRIGGER IF EXISTS luwasapp_incident_search_update',
+    'DROP TABLE IF EXISTS luwasapp_incident_search',
+]
+
+POSTGRES_CREATE = [
+    '''
+    ALTER TABLE luwasapp_incidentreport ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(incident_type, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(description, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(location, '')), 'C') ||
+        setweight(to_tsvector('simple', coalesce(resolved_address, '')), 'D')
+    ) STORED''',
+    'CREATE INDEX IF NOT EXISTS incident_search_idx ON luwasapp_incidentreport USING GIN (search_vector)',
+]
+
+POSTGRES_DROP = [
+    'DROP INDEX IF EXISTS incident_search_idx',
+    'ALTER TABLE luwasapp_incidentreport DROP COLUMN IF EXISTS search_vector',
+]
+
+
+def _fts5_available(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return any(option == 'ENABLE_FTS5' for option, in cursor.fetchall())
+
+
+def _run(schema_editor, statements):
+    with schema_editor.connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def create_search_index(apps, schema_editor):
+    # Other backends, and SQLite built without FTS5, search by substring instead
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite' and _fts5_available(connection):
+        _run(schema_editor, SQLITE_CREATE)
+    elif connection.vendor == 'postgresql':
+        _run(schema_editor, POSTGRES_CREATE)
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        _run(schema_editor, SQLITE_DROP)
+    elif connection.vendor == 'postgresql':
+        _run(schema_editor, POSTGRES_DROP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('luwasapp', '0027_incidentattachment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='incidentreport',
+            name='description',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.3 on 2026-10-18 10:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('luwasapp', '0028_incidentreport_description'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='incidentassignment',
+            index=models.Index(fields=['assigned_at'], name='assignment_assigned_at_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.3 on 2026-10-18 11:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('luwasapp', '0029_incidentassignment_assigned_at_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='incidentreport',
+            name='geocode_claim',
+            field=models.CharField(blank=True, max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='incidentreport',
+            name='geocode_claimed_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='incidentreport',
+            name='geocode_status',
+            field=models.CharField(blank=True, choices=[('', 'Not queued'), ('pending', 'Pending'), ('claimed', 'In progress'), ('resolved', 'Resolved'), ('failed', 'Failed'), ('skipped', 'Skipped')], db_index=True, default='', max_length=10),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import UserManager, AbstractBaseUser, PermissionsMixin
-import requests
+
+from . import geohash
 
 class CustomUserManager(UserManager):
     def _create_user(self, username, email, password, **extra_fields):
@@ -43,6 +44,8 @@ class User(AbstractBaseUser, PermissionsMixin):
     is_staff = models.BooleanField(default=False)  
     date_joined = models.DateTimeField(auto_now_add=True)
     profile_image= models.ImageField(upload_to='profile_images/', null=True, blank=True)
+    # Thumbnail storage names by size, and the image they were made from ('source'); see avatars.py
+    profile_thumbnails = models.JSONField(default=dict, blank=True, editable=False)
 
     objects = CustomUserManager()
 
@@ -62,6 +65,8 @@ class Establishment(models.Model):
     name = models.CharField(max_length=100)
     location = models.CharField(max_length=255)
     department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name='establishments')
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
 
     def __str__(self):
         return self.name
@@ -104,10 +109,21 @@ class IncidentReport(models.Model):
         ('elderly_abuse', 'Elderly Abuse'),
     ]
 
+    GEOCODE_STATUS_CHOICES = [
+        ('', 'Not queued'),
+        ('pending', 'Pending'),
+        ('claimed', 'In progress'),
+        ('resolved', 'Resolved'),
+        ('failed', 'Failed'),
+        ('skipped', 'Skipped'),
+    ]
 
     reportid = models.AutoField(primary_key=True)
 
     incident_type = models.CharField(max_length=100)
+    # Free-text account of what happened; nullable so the column is added without rebuilding the table.
+    # Searchable with incident_type, location and resolved_address (search.py).
+    description = models.TextField(null=True, blank=True)
     severity = models.CharField(max_length=25, choices=SEVERITY_CHOICES)
     category = models.CharField(max_length=255, choices=CATEGORY_CHOICES, blank=True)
     status = models.CharField(max_length=255, choices=STATUS_CHOICES, default= "reported", blank=True)
@@ -115,19 +131,188 @@ class IncidentReport(models.Model):
     location = models.CharField(max_length=255)    
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
+    # Geohash cell of (latitude, longitude), kept in step on save; prunes spatial queries
+    geohash = models.CharField(max_length=12, blank=True, db_index=True)
     timestamp = models.DateTimeField(auto_now_add=True)
+    # Bumped on every save and on the queryset updates that change what is displayed; versions cached fragments
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Filled in by the geocoding worker so reads never have to call out to a geocoder
+    resolved_address = models.CharField(max_length=512, blank=True)
+    location_details = models.JSONField(default=dict, blank=True)
+    geocode_status = models.CharField(max_length=10, choices=GEOCODE_STATUS_CHOICES, default='', blank=True, db_index=True)
+    geocode_attempts = models.PositiveSmallIntegerField(default=0)
+    geocoded_at = models.DateTimeField(null=True, blank=True)
+    # Lease of a 'claimed' incident to one geocoding worker (geocoding.claim). Nullable so the columns
+    # are added without rebuilding the table.
+    geocode_claim = models.CharField(max_length=32, null=True, blank=True)
+    geocode_claimed_until = models.DateTimeField(null=True, blank=True)
+
+    # Card-size thumbnail of the first photo attached (attachments.py), so cards never load attachments.
+    # Nullable so the column is added without rebuilding the table.
+    cover_thumbnail = models.CharField(max_length=255, null=True, blank=True)
 
     # department = models.ForeignKey('Department', on_delete=models.CASCADE, related_name='incidents', null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Incident board: category__in + status, newest first
+            models.Index(fields=['category', 'status', '-timestamp'], name='incident_cat_status_ts_idx'),
+            # Dashboard: GROUP BY status (GROUP BY category uses the index above)
+            models.Index(fields=['status', 'category'], name='incident_status_cat_idx'),
+            models.Index(fields=['-timestamp'], name='incident_timestamp_idx'),
+        ]
+
     def __str__(self):
         return f'Incident {self.reportid} - {self.status}'
+
+    def refresh_geohash(self):
+        if self.latitude is None or self.longitude is None:
+            self.geohash = ''
+        else:
+            self.geohash = geohash.encode(self.latitude, self.longitude)
+
+    def save(self, *args, **kwargs):
+        self.refresh_geohash()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and ('latitude' in update_fields or 'longitude' in update_fields):
+            kwargs['update_fields'] = {*update_fields, 'geohash'}
+        super().save(*args, **kwargs)
     
+class IncidentAttachment(models.Model):
+    # A photo attached to an incident, uploaded in chunks so an interrupted upload resumes (attachments.py)
+    STATUS_CHOICES = [
+        ('uploading', 'Uploading'),
+        ('processing', 'Processing'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+
+    incident_report = models.ForeignKey(IncidentReport, on_delete=models.CASCADE, related_name='attachments')
+    uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='attachments', null=True, blank=True)
+    filename = models.CharField(max_length=255)  # as uploaded
+    size = models.BigIntegerField()  # declared when the upload started
+    received = models.BigIntegerField(default=0)  # bytes stored so far; where the upload continues
+    # Set once the upload is complete; named by content hash
+    file = models.FileField(upload_to='attachments/', blank=True)
+    content_type = models.CharField(max_length=50, blank=True)
+    thumbnails = models.JSONField(default=dict, blank=True)  # storage names by size
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='uploading')
+    error = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The thumbnail backlog and abandoned uploads
+            models.Index(fields=['status', 'created_at'], name='attachment_status_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.filename} on Incident {self.incident_report_id}'
+
+class CategoryRoute(models.Model):
+    # Which departments respond to which incident category
+    category = models.CharField(max_length=255, choices=IncidentReport.CATEGORY_CHOICES)
+    department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name='category_routes')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['department', 'category'], name='unique_category_route'),
+        ]
+        indexes = [
+            models.Index(fields=['category'], name='categoryroute_category_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.category} -> {self.department.name}'
+
 class IncidentAssignment(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='assignments')
     incident_report = models.ForeignKey(IncidentReport, on_delete=models.CASCADE, related_name='assignments')
     notification_sent = models.BooleanField(default=False)
     assigned_at = models.DateTimeField(auto_now_add=True)
+    # Notification outbox state, managed by luwasapp.notifications
+    notified_at = models.DateTimeField(null=True, blank=True)
+    notification_attempts = models.PositiveSmallIntegerField(default=0)
+    notification_due_at = models.DateTimeField(null=True, blank=True)  # next retry; null means as soon as possible
+    notification_claim = models.CharField(max_length=32, blank=True)
+    notification_claimed_until = models.DateTimeField(null=True, blank=True)
+    notification_error = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        constraints = [
+            # Also serves filter(user=...) lookups
+            models.UniqueConstraint(fields=['user', 'incident_report'], name='unique_incident_assignment'),
+        ]
+        indexes = [
+            # The outbox: only unsent assignments are indexed
+            models.Index(
+                fields=['notification_due_at', 'assigned_at'],
+                condition=models.Q(notification_sent=False),
+                name='assignment_outbox_idx',
+            ),
+            # The admin's date hierarchy
+            models.Index(fields=['assigned_at'], name='assignment_assigned_at_idx'),
+        ]
 
     def __str__(self):
         return f'{self.user.username} assigned to Incident {self.incident_report.reportid}'
 
+
+class IncidentCounter(models.Model):
+    # Incident totals by category and by status, globally (user is null) and per assigned user
+    DIMENSION_CHOICES = [
+        ('category', 'Category'),
+        ('status', 'Status'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='incident_counters', null=True, blank=True)
+    dimension = models.CharField(max_length=10, choices=DIMENSION_CHOICES)
+    key = models.CharField(max_length=255, blank=True)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dimension', 'key'], condition=models.Q(user__isnull=True), name='unique_global_incident_counter'),
+            models.UniqueConstraint(fields=['user', 'dimension', 'key'], condition=models.Q(user__isnull=False), name='unique_user_incident_counter'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id or "global"} {self.dimension}={self.key}: {self.count}'
+
+class GeocodeCache(models.Model):
+    # Reverse-geocode results keyed on coordinates rounded to `precision` decimals
+    provider = models.CharField(max_length=20)
+    precision = models.PositiveSmallIntegerField()
+    lat_key = models.IntegerField()
+    lon_key = models.IntegerField()
+    address = models.CharField(max_length=512, blank=True)
+    details = models.JSONField(default=dict, blank=True)
+    found = models.BooleanField(default=True)
+    fetched_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['provider', 'precision', 'lat_key', 'lon_key'], name='unique_geocode_cache_key'),
+        ]
+
+    def __str__(self):
+        return f'{self.provider} {self.lat_key},{self.lon_key}'
+
+
+class ImportCheckpoint(models.Model):
+    # Progress of one `manage.py import_incidents` source, committed together with each chunk so a rerun resumes exactly
+    name = models.CharField(max_length=255, unique=True)
+    fingerprint = models.CharField(max_length=80)  # "<bytes>:<sha256>" of the start of the file
+    offset = models.BigIntegerField(default=0)  # bytes of the source consumed by committed chunks
+    rows_read = models.PositiveIntegerField(default=0)
+    rows_imported = models.PositiveIntegerField(default=0)
+    rows_rejected = models.PositiveIntegerField(default=0)
+    assignments_imported = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.name} ({self.rows_imported} imported)'
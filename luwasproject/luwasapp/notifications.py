@@ -0,0 +1,247 @@
+import logging
+import random
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import mail
+from django.db import transaction
+from django.db.models import F, Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import IncidentAssignment
+
+logger = logging.getLogger(__name__)
+
+# Assignment notifications go through an outbox: IncidentAssignment rows with notification_sent=False.
+# notification_worker claims due rows in batches (a lease, so several workers can run), folds each
+# responder's assignments into one digest, sends the digests concurrently through the backend and
+# records the outcome with a handful of bulk UPDATEs per batch.
+
+DEFAULTS = {
+    'BACKEND': 'luwasapp.notifications.EmailBackend',
+    'BATCH_SIZE': 200,
+    'CONCURRENCY': 4,                       # digests sent in parallel, one backend connection each
+    'LEASE': timedelta(minutes=5),          # how long a claim lasts before another worker may take the rows
+    'MAX_ATTEMPTS': 5,
+    'RETRY_BASE': timedelta(seconds=30),    # backoff: RETRY_BASE * 2 ** (attempts - 1), with jitter
+    'RETRY_MAX': timedelta(hours=1),
+    'MAX_AGE': timedelta(days=1),           # older unsent assignments are dropped rather than notified late
+}
+
+# Per-process overrides, e.g. from notification_worker's command line
+_overrides = {}
+
+
+def get_setting(name):
+    if name in _overrides:
+        return _overrides[name]
+    return getattr(settings, 'NOTIFICATIONS', {}).get(name, DEFAULTS[name])
+
+
+def configure(**overrides):
+    _overrides.update(overrides)
+
+
+#======================================================BACKENDS======================================================#
+
+class PermanentFailure(Exception):
+    # Raised by a backend when retrying cannot help, e.g. the responder has no email address
+    pass
+
+
+class Digest:
+    # Everything one responder is told in one message
+    def __init__(self, user, assignments):
+        self.user = user
+        self.assignments = assignments
+
+    @property
+    def assignment_ids(self):
+        return [assignment.pk for assignment in self.assignments]
+
+    @property
+    def incidents(self):
+        return [assignment.incident_report for assignment in self.assignments]
+
+
+class BaseBackend:
+    # One instance per sending thread; open() and close() bracket a run of send() calls
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send(self, digest):
+        raise NotImplementedError
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class EmailBackend(BaseBackend):
+    # Sends through Django's EMAIL_BACKEND, reusing one connection for all of a thread's digests
+
+    def open(self):
+        self.connection = mail.get_connection()
+        self.connection.open()
+
+    def close(self):
+        self.connection.close()
+
+    def send(self, digest):
+        if not digest.user.email:
+            raise PermanentFailure('Responder has no email address.')
+        context = {'user': digest.user, 'incidents': digest.incidents}
+        subject = render_to_string('notifications/assignment_subject.txt', context).strip()
+        body = render_to_string('notifications/assignment_body.txt', context)
+        message = mail.EmailMessage(subject, body, to=[digest.user.email], connection=self.connection)
+        message.send()
+
+
+def get_backend_class(path=None):
+    return import_string(path or get_setting('BACKEND'))
+
+
+#======================================================OUTBOX======================================================#
+
+def pending():
+    return IncidentAssignment.objects.filter(notification_sent=False, notification_attempts__lt=get_setting('MAX_ATTEMPTS'))
+
+
+def expire_stale(now=None):
+    # Give up on assignments too old to be worth notifying about (e.g. after a long outage)
+    now = now or timezone.now()
+    return pending().filter(assigned_at__lt=now - get_setting('MAX_AGE')).update(
+        notification_attempts=get_setting('MAX_ATTEMPTS'), notification_error='Expired before it could be sent.',
+        notification_claim='', notification_claimed_until=None,
+    )
+
+
+def claim(batch_size=None, now=None):
+    # Lease up to batch_size due assignments to this worker; returns them with user and incident loaded
+    now = now or timezone.now()
+    batch_size = batch_size or get_setting('BATCH_SIZE')
+    unclaimed = Q(notification_claimed_until__isnull=True) | Q(notification_claimed_until__lt=now)
+    due = Q(notification_due_at__isnull=True) | Q(notification_due_at__lte=now)
+    candidates = list(
+        pending().filter(due, unclaimed)
+        .order_by('notification_due_at', 'assigned_at')
+        .values_list('pk', flat=True)[:batch_size]
+    )
+    if not candidates:
+        return []
+
+    token = uuid.uuid4().hex
+    # Re-checking the lease in the UPDATE means a row raced for by two workers goes to only one of them
+    pending().filter(unclaimed, pk__in=candidates).update(
+        notification_claim=token, notification_claimed_until=now + get_setting('LEASE'),
+    )
+    return list(
+        IncidentAssignment.objects.filter(notification_claim=token)
+        .select_related('user', 'incident_report')
+        .only(
+            'user', 'incident_report', 'user__username', 'user__first_name', 'user__email', 'notification_attempts', 'notification_claim',
+            'incident_report__reportid', 'incident_report__incident_type', 'incident_report__category',
+            'incident_report__severity', 'incident_report__location', 'incident_report__timestamp',
+        )
+        .order_by('user_id', 'assigned_at')
+    )
+
+
+def build_digests(assignments):
+    by_user = defaultdict(list)
+    for assignment in assignments:
+        by_user[assignment.user_id].append(assignment)
+    return [Digest(user_assignments[0].user, user_assignments) for user_assignments in by_user.values()]
+
+
+def _send_all(backend_class, digests):
+    # Runs in one worker thread; returns [(digest, error, permanent)]
+    results = []
+    try:
+        with backend_class() as backend:
+            for digest in digests:
+                try:
+                    backend.send(digest)
+                    results.append((digest, None, False))
+                except PermanentFailure as error:
+                    results.append((digest, str(error), True))
+                except Exception as error:
+                    logger.warning('Notifying %s failed: %s', digest.user.username, error)
+                    results.append((digest, str(error) or error.__class__.__name__, False))
+    except Exception as error:
+        # Could not even connect: every digest not yet attempted fails with that error
+        logger.warning('Notification backend unavailable: %s', error)
+        attempted = {id(digest) for digest, _, _ in results}
+        results.extend((digest, str(error) or error.__class__.__name__, False) for digest in digests if id(digest) not in attempted)
+    return results
+
+
+def send(digests, concurrency=None, backend_class=None):
+    backend_class = backend_class or get_backend_class()
+    concurrency = max(1, min(concurrency or get_setting('CONCURRENCY'), len(digests)))
+    chunks = [digests[i::concurrency] for i in range(concurrency)]
+    if concurrency == 1:
+        return _send_all(backend_class, chunks[0])
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='notifications') as executor:
+        return [result for chunk_results in executor.map(lambda chunk: _send_all(backend_class, chunk), chunks) for result in chunk_results]
+
+
+def retry_delay(attempts):
+    delay = min(get_setting('RETRY_BASE') * 2 ** max(attempts - 1, 0), get_setting('RETRY_MAX'))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def record(results, now=None):
+    # Write back a batch's outcome: one UPDATE for everything sent, one per retry tier for failures.
+    # Each UPDATE matches the claim token too: if this worker's lease ran out and another worker has
+    # re-claimed a row, that row is the other worker's to record and is left alone here.
+    now = now or timezone.now()
+    sent = defaultdict(list)  # claim token -> assignment ids
+    failures = defaultdict(list)  # (claim token, attempts after this one, error) -> assignment ids
+    for digest, error, permanent in results:
+        for assignment in digest.assignments:
+            if error is None:
+                sent[assignment.notification_claim].append(assignment.pk)
+                continue
+            attempts = get_setting('MAX_ATTEMPTS') if permanent else assignment.notification_attempts + 1
+            failures[(assignment.notification_claim, attempts, error[:255])].append(assignment.pk)
+
+    released = {'notification_claim': '', 'notification_claimed_until': None}
+    sent_count = failed_count = 0
+    with transaction.atomic():
+        for token, assignment_ids in sent.items():
+            sent_count += IncidentAssignment.objects.filter(pk__in=assignment_ids, notification_claim=token).update(
+                notification_sent=True, notified_at=now, notification_attempts=F('notification_attempts') + 1,
+                notification_error='', notification_due_at=None, **released,
+            )
+        for (token, attempts, error), assignment_ids in failures.items():
+            failed_count += IncidentAssignment.objects.filter(pk__in=assignment_ids, notification_claim=token).update(
+                notification_attempts=attempts, notification_error=error,
+                notification_due_at=now + retry_delay(attempts), **released,
+            )
+    lost = sum(map(len, sent.values())) + sum(map(len, failures.values())) - sent_count - failed_count
+    if lost:
+        logger.warning('%d notification leases expired before their results were recorded.', lost)
+    return sent_count, failed_count
+
+
+def process_batch(batch_size=None, concurrency=None, backend_class=None):
+    # Claim, digest, send and record one batch; returns (assignments sent, assignments failed, digests sent)
+    assignments = claim(batch_size)
+    if not assignments:
+        return 0, 0, 0
+    results = send(build_digests(assignments), concurrency, backend_class)
+    sent, failed = record(results)
+    return sent, failed, sum(1 for _, error, _ in results if error is None)
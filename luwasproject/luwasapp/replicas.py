@@ -0,0 +1,120 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+# Read replica routing. Writes always go to the primary ('default'). Reads go to the 'replica' alias
+# only inside views marked @replica_reads, and only while the request has not written anything and
+# the browser has not written in the last REPLICA_STICKY_SECONDS (read-your-writes). Everything else
+# (other views, workers, management commands) reads from the primary. Without a 'replica' alias in
+# DATABASES the router changes nothing.
+
+REPLICA = 'replica'
+STICKY_COOKIE = 'luwas_primary_until'
+
+# Of the current request: {'replica': the view may read from the replica, 'sticky': the browser wrote
+# recently, 'wrote': this request wrote, 'primary': depth of use_primary() blocks}
+_request = ContextVar('luwas_replica_request', default=None)
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+def _reads_from_replica():
+    state = _request.get()
+    if state is None or not state['replica'] or state['sticky'] or state['wrote'] or state['primary']:
+        return False
+    # Reads inside a transaction on the primary must see that transaction
+    return replica_configured() and not connections['default'].in_atomic_block
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return REPLICA if _reads_from_replica() else 'default'
+
+    def db_for_write(self, model, **hints):
+        state = _request.get()
+        if state is not None:
+            # From here on this request, and the browser for a while, read their own writes
+            state['wrote'] = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary (replication, or sync_replica for SQLite)
+        return db != REPLICA
+
+
+def read_alias():
+    # Alias for reads made now; pin querysets that are evaluated after the view returns (streaming)
+    return REPLICA if _reads_from_replica() else 'default'
+
+
+@contextmanager
+def use_primary():
+    # Reads in the block go to the primary. For results cached under versions that primary commits
+    # bump: computed from a lagging replica they would pin old data to the new version.
+    state = _request.get()
+    if state is not None:
+        state['primary'] += 1
+    try:
+        yield
+    finally:
+        if state is not None:
+            state['primary'] -= 1
+
+
+def replica_reads(view):
+    # For read-only views: their queries may be answered by the replica
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            _allow_replica()
+            return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        _allow_replica()
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def _allow_replica():
+    state = _request.get()
+    if state is not None:
+        state['replica'] = True
+
+
+class ReplicaMiddleware:
+    # Tracks writes per request and keeps a browser on the primary for a short while after one.
+    # Goes near the top of MIDDLEWARE so session and auth writes count.
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            sticky = float(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time()
+        except ValueError:
+            sticky = False
+        # Unsafe methods always read from the primary
+        sticky = sticky or request.method not in ('GET', 'HEAD', 'OPTIONS')
+        state = {'replica': False, 'sticky': sticky, 'wrote': False, 'primary': 0}
+        token = _request.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request.reset(token)
+
+        if (state['wrote'] or request.method not in ('GET', 'HEAD', 'OPTIONS')) and replica_configured():
+            seconds = settings.REPLICA_STICKY_SECONDS
+            response.set_cookie(STICKY_COOKIE, f'{time.time() + seconds:.3f}', max_age=seconds, httponly=True, samesite='Lax')
+        return response
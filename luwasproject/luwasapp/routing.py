@@ -0,0 +1,86 @@
+from django.core.cache import cache
+
+from . import replicas
+from .models import CategoryRoute, Department, IncidentReport
+
+# Departments that respond to each category; new departments with one of these names get routed automatically
+DEFAULT_CATEGORY_ROUTES = {
+    'fire_incident': ['Fire Department', 'Medical Department', 'Emergency Response'],
+    'medical_emergency': ['Medical Department', 'Emergency Response'],
+    'road_accident': ['Transportation Department', 'Medical Department'],
+    'natural_disaster': ['Disaster Response', 'Emergency Management Department'],
+    'crime_related': ['Police Department', 'Law Enforcement'],
+    'domestic_violence': ['Social Services', 'Domestic Violence Response Team'],
+    'psychological_crisis': ['Mental Health Services', 'Crisis Intervention Team'],
+    'missing_person': ['Police Department', 'Missing Persons Unit'],
+    'poisoning': ['Poison Control Center', 'Health Department'],
+    'gas_leak': ['Fire Department', 'Hazardous Materials (HazMat) Team'],
+    'electrical_hazard': ['Electrical Utility Company', 'Fire Department'],
+    'hazardous_materials': ['Hazardous Materials (HazMat) Response', 'Environmental Protection Agency'],
+    'flooding': ['Emergency Management', 'Flood Control Department'],
+    'earthquake': ['Emergency Management', 'Geological Survey Department'],
+    'typhoon': ['National Disaster Risk Reduction and Management Council (NDRRMC)', 'Emergency Management'],
+    'animal_attack': ['Animal Control', 'Emergency Medical Services (EMS)'],
+    'terrorist_threat': ['Counter-Terrorism Unit', 'National Security Agency'],
+    'building_collapse': ['Fire Department', 'Rescue and Emergency Response'],
+    'public_disturbance': ['Public Safety', 'Police Department'],
+    'child_abuse': ['Child Protective Services', 'Social Services'],
+    'elderly_abuse': ['Adult Protective Services', 'Social Services'],
+}
+
+INDEX_CACHE_KEY = 'routing:department-categories'
+# Invalidation is explicit; the timeout only bounds staleness when the cache isn't shared between workers
+INDEX_CACHE_TIMEOUT = 300
+
+
+def default_categories_for(department_name):
+    name = department_name.lower()
+    return [
+        category for category, departments in DEFAULT_CATEGORY_ROUTES.items()
+        if name in (department.lower() for department in departments)
+    ]
+
+
+def seed_default_routes(department):
+    CategoryRoute.objects.bulk_create(
+        [CategoryRoute(department=department, category=category) for category in default_categories_for(department.name)],
+        ignore_conflicts=True,
+    )
+    invalidate()
+
+
+def _build_index():
+    index = {}
+    # From the primary, so a route change is never cached from a replica that hasn't seen it
+    with replicas.use_primary():
+        for department_id, category in CategoryRoute.objects.values_list('department_id', 'category'):
+            index.setdefault(department_id, []).append(category)
+    return index
+
+
+def department_index():
+    # Inverted index department id -> categories, rebuilt lazily after any route change
+    index = cache.get(INDEX_CACHE_KEY)
+    if index is None:
+        index = _build_index()
+        cache.set(INDEX_CACHE_KEY, index, INDEX_CACHE_TIMEOUT)
+    return index
+
+
+def invalidate():
+    cache.delete(INDEX_CACHE_KEY)
+
+
+def categories_for_department(department):
+    if department is None:
+        return []
+    department_id = department if isinstance(department, int) else department.pk
+    return department_index().get(department_id, [])
+
+
+def departments_for_category(category):
+    return Department.objects.filter(category_routes__category=category)
+
+
+def incidents_for_department(department):
+    return IncidentReport.objects.filter(category__in=categories_for_department(department))
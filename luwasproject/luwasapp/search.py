@@ -0,0 +1,270 @@
+import re
+from contextlib import contextmanager
+
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from . import replicas
+from .models import IncidentReport
+
+# Full-text search over incidents: their type, description, location and resolved address. The
+# index lives in the database and is kept in step by the database itself, so queryset updates, bulk
+# inserts and the geocoding worker's writes are indexed as well as saves:
+#   SQLite: an FTS5 table over luwasapp_incidentreport (external content, so the text isn't stored
+#           twice), maintained by triggers, with prefix indexes for typeahead.
+#   PostgreSQL: a generated tsvector column with a GIN index.
+# Matches are ranked with type above description above location above address. The last word of a
+# query is matched as a prefix, so results follow the user as they type. Without an index (a backend
+# with neither, or SQLite built without FTS5) search falls back to unranked substring matching.
+
+TABLE = 'luwasapp_incident_search'
+COLUMNS = ['incident_type', 'description', 'location', 'resolved_address']
+WEIGHTS = [8.0, 4.0, 2.0, 1.0]  # in COLUMNS order; bm25() weights on SQLite
+MAX_TERMS = 8
+MIN_QUERY_LENGTH = 2
+MAX_RESULTS = 50
+# Letters and digits; everything else separates words, as both tokenizers do
+TERM = re.compile(r'[^\W_]+')
+RESULT_FIELDS = ['reportid', 'incident_type', 'category', 'status', 'location', 'timestamp']
+
+_SQLITE_TRIGGERS = {
+    f'{TABLE}_insert': f'''
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_insert AFTER INSERT ON luwasapp_incidentreport BEGIN
+            INSERT INTO {TABLE}(rowid, {', '.join(COLUMNS)})
+            VALUES (new.reportid, {', '.join(f'new.{column}' for column in COLUMNS)});
+        END''',
+    f'{TABLE}_delete': f'''
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_delete AFTER DELETE ON luwasapp_incidentreport BEGIN
+            INSERT INTO {TABLE}({TABLE}, rowid, {', '.join(COLUMNS)})
+            VALUES ('delete', old.reportid, {', '.join(f'old.{column}' for column in COLUMNS)});
+        END''',
+    # Only when indexed text changes: status moves and counter-style updates don't touch the index
+    f'{TABLE}_update': f'''
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_update AFTER UPDATE OF {', '.join(COLUMNS)} ON luwasapp_incidentreport
+        WHEN {' OR '.join(f'old.{column} IS NOT new.{column}' for column in COLUMNS)} BEGIN
+            INSERT INTO {TABLE}({TABLE}, rowid, {', '.join(COLUMNS)})
+            VALUES ('delete', old.reportid, {', '.join(f'old.{column}' for column in COLUMNS)});
+            INSERT INTO {TABLE}(rowid, {', '.join(COLUMNS)})
+            VALUES (new.reportid, {', '.join(f'new.{column}' for column in COLUMNS)});
+        END''',
+}
+
+
+def _postgres_vector():
+    weighted = [
+        f"setweight(to_tsvector('simple', coalesce({column}, '')), '{weight}')"
+        for column, weight in zip(COLUMNS, 'ABCD')
+    ]
+    return ' || '.join(weighted)
+
+
+#======================================================INDEX======================================================#
+
+# {(alias, database name): backend()}, so a search doesn't look the index up every time
+_backends = {}
+
+
+def backend(connection):
+    # 'fts5', 'tsvector' or None, for the database behind `connection`
+    key = (connection.alias, connection.settings_dict['NAME'])
+    if key not in _backends:
+        _backends[key] = _find_backend(connection)
+    return _backends[key]
+
+
+def _find_backend(connection):
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [TABLE])
+            return 'fts5' if cursor.fetchone() else None
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM information_schema.columns WHERE table_name = 'luwasapp_incidentreport' AND column_name = 'search_vector'"
+            )
+            return 'tsvector' if cursor.fetchone() else None
+    return None
+
+
+def _fts5_available(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return any(option == 'ENABLE_FTS5' for option, in cursor.fetchall())
+
+
+def install(connection):
+    # Creates the index if the database can have one, and returns whether it can; safe to run again.
+    # A new SQLite index is empty until rebuild().
+    _backends.clear()
+    if connection.vendor == 'sqlite':
+        if not _fts5_available(connection):
+            return False
+        with connection.cursor() as cursor:
+            cursor.execute(f'''
+                CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5(
+                    {', '.join(COLUMNS)},
+                    content='luwasapp_incidentreport', content_rowid='reportid',
+                    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+                )''')
+            for sql in _SQLITE_TRIGGERS.values():
+                cursor.execute(sql)
+        return True
+    if connection.vendor == 'postgresql':
+        # Adding a stored generated column rewrites the table once; updates keep it current after that
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'ALTER TABLE luwasapp_incidentreport ADD COLUMN IF NOT EXISTS search_vector tsvector '
+                f'GENERATED ALWAYS AS ({_postgres_vector()}) STORED'
+            )
+            cursor.execute('CREATE INDEX IF NOT EXISTS incident_search_idx ON luwasapp_incidentreport USING GIN (search_vector)')
+        return True
+    return False
+
+
+def uninstall(connection):
+    _backends.clear()
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            for name in _SQLITE_TRIGGERS:
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+        elif connection.vendor == 'postgresql':
+            cursor.execute('DROP INDEX IF EXISTS incident_search_idx')
+            cursor.execute('ALTER TABLE luwasapp_incidentreport DROP COLUMN IF EXISTS search_vector')
+
+
+def ensure_triggers(connection):
+    # Migrations that rebuild luwasapp_incidentreport on SQLite (most field changes do) drop its
+    # triggers with the old table. Recreates them and reindexes; returns whether any were missing.
+    if connection.vendor != 'sqlite' or backend(connection) is None:
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'luwasapp_incidentreport'")
+        existing = {name for name, in cursor.fetchall()}
+    if set(_SQLITE_TRIGGERS) <= existing:
+        return False
+    install(connection)
+    rebuild(connection)
+    return True
+
+
+def rebuild(connection, optimize=False):
+    # Reindexes every incident (SQLite; PostgreSQL's generated column can't fall behind). `optimize`
+    # merges the index into one segment, for the fastest queries after large imports.
+    if backend(connection) != 'fts5':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('rebuild')")
+        if optimize:
+            cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('optimize')")
+    return True
+
+
+@contextmanager
+def triggers_paused(connection):
+    # For bulk loads nothing else writes during (seed_data): rows are indexed by one rebuild at the end
+    # rather than by a trigger each, which halves SQLite's insert rate
+    paused = backend(connection) == 'fts5'
+    if paused:
+        with connection.cursor() as cursor:
+            for name in _SQLITE_TRIGGERS:
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+    try:
+        yield
+    finally:
+        if paused:
+            install(connection)
+            rebuild(connection)
+
+
+#======================================================QUERIES======================================================#
+
+def terms(query):
+    return TERM.findall(query.lower())[:MAX_TERMS]
+
+
+def _match_expression(words, prefix, index):
+    # Every word must match; the last one as a prefix while the user is still typing it. Words are
+    # letters and digits only, so quoting them is all the escaping needed.
+    if index == 'fts5':
+        quoted = [f'"{word}"' for word in words]
+        if prefix:
+            quoted[-1] += '*'
+        return ' '.join(quoted)
+    parts = list(words)
+    if prefix:
+        parts[-1] += ':*'
+    return ' & '.join(parts)
+
+
+def search(query, categories, status=None, limit=20):
+    # [(incident, score)] best first, for incidents in `categories` (and `status`) matching `query`;
+    # score is None when there's no index to rank with
+    words = terms(query)
+    categories = list(categories)
+    if not words or sum(len(word) for word in words) < MIN_QUERY_LENGTH or not categories:
+        return []
+    limit = max(1, min(limit, MAX_RESULTS))
+    # A trailing space means the last word is finished
+    prefix = not query[-1:].isspace()
+
+    alias = replicas.read_alias()
+    index = backend(connections[alias])
+    if index is None:
+        return _substring_search(words, categories, status, limit, alias)
+
+    params = [_match_expression(words, prefix, index), *categories]
+    filters = f"i.category IN ({', '.join(['%s'] * len(categories))})"
+    if status:
+        filters += ' AND i.status = %s'
+        params.append(status)
+    params.append(limit)
+    columns = ', '.join(f'i.{field}' for field in RESULT_FIELDS)
+
+    if index == 'fts5':
+        # bm25() is lower for better matches
+        sql = f'''
+            SELECT {columns}, -bm25({TABLE}, {', '.join(map(str, WEIGHTS))}) AS score
+            FROM {TABLE} JOIN luwasapp_incidentreport i ON i.reportid = {TABLE}.rowid
+            WHERE {TABLE} MATCH %s AND {filters}
+            ORDER BY score DESC, i.timestamp DESC LIMIT %s'''
+    else:
+        sql = f'''
+            SELECT {columns}, ts_rank_cd(i.search_vector, query) AS score
+            FROM luwasapp_incidentreport i, to_tsquery('simple', %s) query
+            WHERE i.search_vector @@ query AND {filters}
+            ORDER BY score DESC, i.timestamp DESC LIMIT %s'''
+    return [(incident, incident.score) for incident in IncidentReport.objects.using(alias).raw(sql, params)]
+
+
+def matching(queryset, query):
+    # `queryset` narrowed to the incidents matching `query`, unranked (the admin's search box)
+    words = terms(query)
+    if not words:
+        return queryset
+    index = backend(connections[queryset.db])
+    if index == 'fts5':
+        ids = RawSQL(f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s', [_match_expression(words, True, index)])
+    elif index == 'tsvector':
+        ids = RawSQL(
+            "SELECT reportid FROM luwasapp_incidentreport WHERE search_vector @@ to_tsquery('simple', %s)",
+            [_match_expression(words, True, index)],
+        )
+    else:
+        return queryset.filter(_substring_filter(words))
+    return queryset.filter(reportid__in=ids)
+
+
+def _substring_filter(words):
+    matches = Q()
+    for word in words:
+        matches &= Q(*[Q(**{f'{column}__icontains': word}) for column in COLUMNS], _connector=Q.OR)
+    return matches
+
+
+def _substring_search(words, categories, status, limit, alias):
+    incidents = IncidentReport.objects.using(alias).only(*RESULT_FIELDS).filter(_substring_filter(words), category__in=categories)
+    if status:
+        incidents = incidents.filter(status=status)
+    return [(incident, None) for incident in incidents.order_by('-timestamp')[:limit]]
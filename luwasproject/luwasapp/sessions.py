@@ -0,0 +1,32 @@
+from django.contrib.sessions.backends import cached_db
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+from . import users
+
+# cached_db sessions whose cache entries, in a per-process cache, expire within seconds: a session
+# logged out or rotated in one worker stops being accepted by the others at the same bound as the
+# cached user (users.py). With a shared cache they are kept for the session's lifetime as usual.
+
+
+class _CappedCache:
+    def __init__(self, backend):
+        self._backend = backend
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        self._backend.set(key, value, users.local_timeout(self._backend, timeout))
+
+    async def aset(self, key, value, timeout=DEFAULT_TIMEOUT):
+        await self._backend.aset(key, value, users.local_timeout(self._backend, timeout))
+
+    def __contains__(self, key):
+        return key in self._backend
+
+    def __getattr__(self, name):
+        return getattr(self._backend, name)
+
+
+class SessionStore(cached_db.SessionStore):
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        if not users.is_shared(self._cache):
+            self._cache = _CappedCache(self._cache)
@@ -0,0 +1,154 @@
+from django.db import connections, router, transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import attachments, avatars, counters, database, dispatch, events, metrics, routing, search, users
+from .models import CategoryRoute, Department, Establishment, IncidentAssignment, IncidentAttachment, IncidentReport, User
+
+
+#======================================================CONNECTIONS======================================================#
+
+@receiver(connection_created)
+def configure_connection(sender, connection, **kwargs):
+    database.apply_pragmas(connection)
+
+
+@receiver(connection_created)
+def count_request_queries(sender, connection, **kwargs):
+    metrics.install(connection)
+
+
+#======================================================USERS======================================================#
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    users.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def queue_profile_thumbnails(sender, instance, raw=False, **kwargs):
+    # Also for images set in the admin, and ones from before thumbnails
+    if not raw and instance.profile_image and not avatars.is_current(instance):
+        avatars.enqueue(instance.pk)
+
+
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+@receiver(post_save, sender=Establishment)
+@receiver(post_delete, sender=Establishment)
+def invalidate_cached_users(sender, **kwargs):
+    # Cached users carry their department and establishment
+    users.invalidate_all()
+
+
+#======================================================ROUTING======================================================#
+
+@receiver(post_save, sender=Department)
+def seed_department_routes(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        routing.seed_default_routes(instance)
+
+
+@receiver(post_save, sender=CategoryRoute)
+@receiver(post_delete, sender=CategoryRoute)
+def invalidate_routing_index(sender, **kwargs):
+    routing.invalidate()
+
+
+#======================================================DISPATCH======================================================#
+
+@receiver(post_save, sender=Establishment)
+@receiver(post_delete, sender=Establishment)
+def invalidate_dispatch_index(sender, **kwargs):
+    dispatch.invalidate()
+
+
+#======================================================ATTACHMENTS======================================================#
+
+@receiver(post_delete, sender=IncidentAttachment)
+def delete_attachment_files(sender, instance, **kwargs):
+    transaction.on_commit(lambda: attachments.delete_files(instance))
+    if instance.status == 'ready':
+        attachments.refresh_cover(instance.incident_report_id)
+
+
+#======================================================SEARCH======================================================#
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using, **kwargs):
+    # A migration that rebuilt the incident table on SQLite took the search index's triggers with it
+    if sender.name == 'luwasapp' and router.allow_migrate_model(using, IncidentReport):
+        search.ensure_triggers(connections[using])
+
+
+#======================================================DASHBOARD COUNTERS======================================================#
+
+def _counts_towards(update_fields):
+    return update_fields is None or 'category' in update_fields or 'status' in update_fields
+
+
+@receiver(pre_save, sender=IncidentReport)
+def remember_counted_fields(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._counted_before = None
+    if raw or instance._state.adding or not _counts_towards(update_fields):
+        return
+    instance._counted_before = (
+        IncidentReport.objects.filter(pk=instance.pk).values_list('category', 'status').first()
+    )
+
+
+@receiver(post_save, sender=IncidentReport)
+def count_saved_incident(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or not _counts_towards(update_fields):
+        return
+    old = None if created else getattr(instance, '_counted_before', None)
+    if not created and old is None:
+        return
+    counters.record_incident_change(instance.pk, old, (instance.category, instance.status))
+
+
+@receiver(pre_delete, sender=IncidentReport)
+def count_deleted_incident(sender, instance, **kwargs):
+    # Per-user counters are adjusted by the cascaded assignment deletes
+    counters.record_incident_change(instance.pk, (instance.category, instance.status), None)
+
+
+@receiver(post_save, sender=IncidentAssignment)
+def count_new_assignment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.record_assignments([(instance.user_id, instance.incident_report_id)])
+
+
+@receiver(pre_delete, sender=IncidentAssignment)
+def count_deleted_assignment(sender, instance, **kwargs):
+    counters.record_assignments([(instance.user_id, instance.incident_report_id)], sign=-1)
+
+
+#======================================================LIVE FEED======================================================#
+# Runs after the counter receivers above, so _counted_before holds the (category, status) before the save
+
+@receiver(post_save, sender=IncidentReport)
+def publish_saved_incident(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        events.publish_on_commit('created', events.incident_data(instance))
+        return
+    before = getattr(instance, '_counted_before', None)
+    if before is not None and before != (instance.category, instance.status):
+        events.publish_on_commit('updated', events.incident_data(
+            instance, previous_category=before[0], previous_status=before[1]
+        ))
+
+
+@receiver(post_delete, sender=IncidentReport)
+def publish_deleted_incident(sender, instance, **kwargs):
+    events.publish_on_commit('deleted', events.incident_data(instance))
+
+
+@receiver(post_save, sender=IncidentAssignment)
+def publish_new_assignment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        events.publish_on_commit('assigned', {'id': instance.incident_report_id, 'user_id': instance.user_id})
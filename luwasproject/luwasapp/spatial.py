@@ -0,0 +1,91 @@
+import heapq
+import math
+
+from django.db.models import Q
+
+from .geohash import bbox_around, cover, haversine_km, next_prefix
+from .models import IncidentReport
+
+# Spatial queries over IncidentReport: prune by indexed geohash cell ranges, then filter exactly
+
+MAX_RADIUS_KM = 20037.5  # half the Earth's circumference
+
+
+def _cells(prefixes):
+    cells = Q()
+    for prefix in prefixes:
+        if not prefix:
+            return Q(geohash__gt='')
+        upper = next_prefix(prefix)
+        cell = Q(geohash__gte=prefix)
+        if upper is not None:
+            cell &= Q(geohash__lt=upper)
+        cells |= cell
+    return cells
+
+
+def _longitudes(min_lon, max_lon):
+    if max_lon - min_lon >= 360:
+        return Q()
+    if min_lon < -180:
+        return Q(longitude__gte=min_lon + 360) | Q(longitude__lte=max_lon)
+    if max_lon > 180:
+        return Q(longitude__gte=min_lon) | Q(longitude__lte=max_lon - 360)
+    return Q(longitude__gte=min_lon, longitude__lte=max_lon)
+
+
+def _check_finite(*values):
+    if not all(math.isfinite(value) for value in values):
+        raise ValueError('Coordinates and distances must be finite numbers.')
+
+
+def in_bbox(min_lat, min_lon, max_lat, max_lon, queryset=None):
+    _check_finite(min_lat, min_lon, max_lat, max_lon)
+    if queryset is None:
+        queryset = IncidentReport.objects.all()
+    if min_lon > max_lon:
+        # Viewport crossing the antimeridian
+        max_lon += 360
+    return (
+        queryset
+        .filter(_cells(cover(min_lat, min_lon, max_lat, max_lon)))
+        .filter(latitude__gte=min_lat, latitude__lte=max_lat)
+        .filter(_longitudes(min_lon, max_lon))
+    )
+
+
+def _scan(lat, lon, radius_km, queryset, limit):
+    # [(incident, distance_km)] within radius_km, nearest first; the nearest `limit` when given
+    _check_finite(lat, lon, radius_km)
+    matches = (
+        (incident, distance)
+        for incident in in_bbox(*bbox_around(lat, lon, radius_km), queryset=queryset).iterator()
+        for distance in [haversine_km(lat, lon, incident.latitude, incident.longitude)]
+        if distance <= radius_km
+    )
+    if limit is None:
+        return sorted(matches, key=lambda result: result[1])
+    return heapq.nsmallest(limit, matches, key=lambda result: result[1])
+
+
+def within_radius(lat, lon, radius_km, queryset=None, limit=None):
+    # [(incident, distance_km)] within radius_km, nearest first. With `limit`, the search starts small
+    # and widens (nearest()), so a huge radius doesn't read every incident to return a few.
+    _check_finite(lat, lon, radius_km)
+    radius_km = min(radius_km, MAX_RADIUS_KM)
+    if limit is None:
+        return _scan(lat, lon, radius_km, queryset, None)
+    return nearest(lat, lon, limit, queryset=queryset, max_radius_km=radius_km)
+
+
+def nearest(lat, lon, k, queryset=None, initial_radius_km=1.0, max_radius_km=MAX_RADIUS_KM):
+    # k nearest incidents within max_radius_km; widens the search until k are found within the radius,
+    # which makes them exact
+    if k < 1:
+        raise ValueError('k must be at least 1.')
+    radius = min(initial_radius_km, max_radius_km)
+    while True:
+        results = _scan(lat, lon, radius, queryset, k)
+        if len(results) >= k or radius >= max_radius_km:
+            return results
+        radius = min(radius * 4, max_radius_km)
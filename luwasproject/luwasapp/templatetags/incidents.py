@@ -0,0 +1,81 @@
+from functools import lru_cache
+
+from django import template
+from django.contrib.staticfiles import finders
+from django.templatetags.static import static
+from django.urls import reverse
+from django.utils.html import format_html
+
+from .. import attachments, fragments
+from ..models import IncidentReport
+
+register = template.Library()
+
+CATEGORY_LABELS = dict(IncidentReport.CATEGORY_CHOICES)
+
+
+@lru_cache(maxsize=None)
+def placeholder(category):
+    # (url, alt text) of the category's placeholder image, or None; resolved once per category
+    path = f'placeholder/placeholder_{category}.jpg'
+    if category not in CATEGORY_LABELS or not finders.find(path):
+        return None
+    return static(path), f'{CATEGORY_LABELS[category]} Placeholder'
+
+
+@register.simple_tag
+def placeholder_image(category):
+    # <img> of the category's placeholder, or nothing for a category without one
+    image = placeholder(category)
+    if image is None:
+        return ''
+    return format_html('<img src="{}" alt="{}">', *image)
+
+
+@register.simple_tag
+def card_image(incident):
+    # <img> of the incident's cover photo thumbnail, else of its category's placeholder
+    if incident.cover_thumbnail:
+        return format_html('<img src="{}" alt="Incident photo" loading="lazy">', attachments.thumbnail_url(incident.cover_thumbnail))
+    return placeholder_image(incident.category)
+
+
+@register.simple_tag
+def incident_photos(incident):
+    # The incident's photos that have thumbnails, oldest first; for use inside a cached fragment
+    return [
+        {'url': reverse('attachment_file', args=[attachment.pk]), 'filename': attachment.filename,
+         'thumbnail': attachments.thumbnail_url(attachment.thumbnails['large'])}
+        for attachment in incident.attachments.filter(status='ready').order_by('pk')
+    ]
+
+
+class FragmentNode(template.Node):
+    def __init__(self, nodelist, name, obj, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.obj = obj
+        self.vary_on = vary_on
+
+    def render(self, context):
+        obj = self.obj.resolve(context)
+        vary_on = [variable.resolve(context) for variable in self.vary_on]
+        key, html = fragments.get(self.name, obj, vary_on)
+        if html is None:
+            html = self.nodelist.render(context)
+            fragments.store(key, html)
+        return html
+
+
+@register.tag
+def fragment(parser, token):
+    # {% fragment 'card' incident [vary_on ...] %}...{% endfragment %}: the block's output, cached
+    # until the incident's updated_at changes. Only put in it what depends on the incident (and vary_on).
+    bits = token.split_contents()
+    if len(bits) < 3 or bits[1][0] not in '\'"' or bits[1][0] != bits[1][-1]:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes a quoted fragment name and an object.")
+    nodelist = parser.parse(('endfragment',))
+    parser.delete_first_token()
+    return FragmentNode(
+        nodelist, bits[1][1:-1], parser.compile_filter(bits[2]), [parser.compile_filter(bit) for bit in bits[3:]],
+    )
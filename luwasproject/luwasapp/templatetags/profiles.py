@@ -0,0 +1,12 @@
+from django import template
+from django.templatetags.static import static
+
+from .. import avatars
+
+register = template.Library()
+
+
+@register.simple_tag
+def avatar_url(user, size):
+    # The user's thumbnail of `size` ('small' or 'large'), or the default avatar
+    return avatars.url(user, size) or static('image/LairPfp.jpg')
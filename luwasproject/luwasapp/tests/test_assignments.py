@@ -0,0 +1,90 @@
+import json
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+
+from luwasapp import assignments, counters, events, notifications
+from luwasapp.models import IncidentAssignment, IncidentCounter
+
+from .utils import clear_caches, make_incident, make_user
+
+
+def counter_snapshot():
+    return set(IncidentCounter.objects.filter(count__gt=0).values_list('user_id', 'dimension', 'key', 'count'))
+
+
+class BulkAssignTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.alice, self.bob = make_user('alice'), make_user('bob')
+        self.incidents = [make_incident(), make_incident('flooding'), make_incident('road_accident')]
+        self.ids = [incident.pk for incident in self.incidents]
+        # Already assigned before the bulk request
+        IncidentAssignment.objects.create(user=self.alice, incident_report=self.incidents[0])
+
+    def published(self, call):
+        # The 'assigned' events call publishes once its transaction commits
+        with mock.patch.object(events.broker, 'publish') as publish, self.captureOnCommitCallbacks(execute=True):
+            result = call()
+        return result, [(args[1]['user_id'], args[1]['id']) for args, _ in publish.call_args_list if args[0] == 'assigned']
+
+    def test_skips_existing_and_repeated_pairs(self):
+        (created, already), published = self.published(lambda: assignments.bulk_assign(
+            [self.alice.pk, self.bob.pk, self.bob.pk, 999], self.ids + [self.ids[0], 999],
+        ))
+        pairs = {(assignment.user_id, assignment.incident_report_id) for assignment in created}
+        self.assertEqual(len(created), 5)
+        self.assertNotIn((self.alice.pk, self.ids[0]), pairs)
+        self.assertEqual(already, 1)
+        self.assertEqual(set(published), pairs)
+        self.assertEqual(IncidentAssignment.objects.count(), 6)
+        self.assertEqual(notifications.pending().count(), 6)
+
+        incremental = counter_snapshot()
+        self.assertIn((self.bob.pk, 'category', 'flooding', 1), incremental)
+        counters.rebuild()
+        self.assertEqual(counter_snapshot(), incremental)
+
+    def test_pair_assigned_concurrently_is_counted_once(self):
+        insert = assignments._insert
+
+        def raced(candidates):
+            # Another request assigns bob to the first incident between the duplicate check and the insert
+            IncidentAssignment.objects.create(user=self.bob, incident_report=self.incidents[0])
+            return insert(candidates)
+
+        with mock.patch('luwasapp.assignments._insert', raced):
+            (created, already), published = self.published(
+                lambda: assignments.bulk_assign([self.bob.pk], self.ids)
+            )
+        self.assertEqual(
+            [(assignment.user_id, assignment.incident_report_id) for assignment in created],
+            [(self.bob.pk, self.ids[1]), (self.bob.pk, self.ids[2])],
+        )
+        self.assertEqual(already, 1)
+        # The concurrent request announced its own pair; each pair is announced once
+        self.assertEqual(sorted(published), [(self.bob.pk, incident_id) for incident_id in sorted(self.ids)])
+        self.assertEqual(IncidentAssignment.objects.filter(user=self.bob).count(), 3)
+
+        # The concurrent request's own signal counted its pair; bulk_assign didn't count it again
+        incremental = counter_snapshot()
+        self.assertIn((self.bob.pk, 'category', 'fire_incident', 1), incremental)
+        counters.rebuild()
+        self.assertEqual(counter_snapshot(), incremental)
+
+    def test_view(self):
+        url = reverse('bulk_assign')
+        self.client.force_login(make_user('staff'))
+        response = self.client.post(
+            url, {'user': [self.bob.pk], 'incident': self.ids[:2]}, HTTP_ACCEPT='application/json',
+        )
+        self.assertEqual(json.loads(response.content), {
+            'created': [[self.bob.pk, self.ids[0]], [self.bob.pk, self.ids[1]]], 'already_assigned': 0,
+        })
+        response = self.client.post(url, {'user': [self.bob.pk], 'incident': ['1; DROP']}, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        self.client.force_login(make_user('responder', is_staff=False))
+        self.assertEqual(self.client.post(url, {'user': [self.bob.pk], 'incident': self.ids}).status_code, 302)
+        self.assertEqual(IncidentAssignment.objects.filter(user=self.bob).count(), 2)
@@ -0,0 +1,91 @@
+import io
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from luwasapp import attachments
+
+from .utils import clear_caches, make_incident, make_user
+
+
+class RangeTests(TestCase):
+    def test_requested_range(self):
+        size = 1000
+        self.assertIsNone(attachments._requested_range(None, size))
+        self.assertIsNone(attachments._requested_range('bytes=-', size))
+        self.assertIsNone(attachments._requested_range('bytes=0-1,5-9', size))
+        self.assertIsNone(attachments._requested_range('items=0-10', size))
+        self.assertEqual(attachments._requested_range('bytes=0-99', size), (0, 99))
+        self.assertEqual(attachments._requested_range('bytes=900-', size), (900, 999))
+        self.assertEqual(attachments._requested_range('bytes=500-5000', size), (500, 999))
+        self.assertEqual(attachments._requested_range('bytes=-100', size), (900, 999))
+        self.assertEqual(attachments._requested_range('bytes=-5000', size), (0, 999))
+        self.assertEqual(attachments._requested_range('bytes=1000-', size), 'unsatisfiable')
+        self.assertEqual(attachments._requested_range('bytes=20-10', size), 'unsatisfiable')
+        self.assertEqual(attachments._requested_range('bytes=-0', size), 'unsatisfiable')
+
+
+class UploadTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        settings = override_settings(MEDIA_ROOT=self.media, ATTACHMENTS={'WORKER': 'command'})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        clear_caches()
+        self.user = make_user('uploader')
+        self.incident = make_incident()
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 48), 'red').save(buffer, 'PNG')
+        self.photo = buffer.getvalue()
+
+    def test_rejects_bad_content_range(self):
+        attachment = attachments.start(self.incident, self.user, 'photo.png', len(self.photo))
+        size = len(self.photo)
+        for header in ('', 'bytes 0-9', f'bytes 0-9/{size + 1}', f'bytes 10-9/{size}', f'bytes 0-{size}/{size}'):
+            with self.subTest(header=header), self.assertRaises(ValueError):
+                attachments.receive(attachment, header, io.BytesIO(self.photo))
+
+    def test_chunked_upload_resumes_from_offset(self):
+        size = len(self.photo)
+        attachment = attachments.start(self.incident, self.user, 'photo.png', size)
+        middle = size // 2
+        attachment = attachments.receive(attachment, f'bytes 0-{middle - 1}/{size}', io.BytesIO(self.photo[:middle]))
+        self.assertEqual(attachment.received, middle)
+
+        # A repeated chunk is refused with where the upload stands
+        with self.assertRaises(attachments.OffsetMismatch) as raised:
+            attachments.receive(attachment, f'bytes 0-{middle - 1}/{size}', io.BytesIO(self.photo[:middle]))
+        self.assertEqual(raised.exception.attachment.received, middle)
+
+        # A chunk cut short doesn't move the offset
+        with self.assertRaises(ValueError):
+            attachments.receive(attachment, f'bytes {middle}-{size - 1}/{size}', io.BytesIO(self.photo[middle:-5]))
+        attachment.refresh_from_db()
+        self.assertEqual(attachment.received, middle)
+
+        attachment = attachments.receive(attachment, f'bytes {middle}-{size - 1}/{size}', io.BytesIO(self.photo[middle:]))
+        self.assertEqual(attachment.status, 'processing')
+        self.assertEqual(attachment.content_type, 'image/png')
+        with attachment.file.open('rb') as f:
+            self.assertEqual(f.read(), self.photo)
+
+    def test_serves_ranges(self):
+        size = len(self.photo)
+        attachment = attachments.start(self.incident, self.user, 'photo.png', size)
+        attachments.receive(attachment, f'bytes 0-{size - 1}/{size}', io.BytesIO(self.photo))
+        self.client.force_login(self.user)
+        url = reverse('attachment_file', args=[attachment.pk])
+
+        response = self.client.get(url, HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 0-9/{size}')
+        self.assertEqual(b''.join(response.streaming_content), self.photo[:10])
+
+        response = self.client.get(url, HTTP_RANGE=f'bytes={size}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{size}')
@@ -0,0 +1,61 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from luwasapp.management.commands.benchmark_views import QUERY_BUDGETS
+from luwasapp.management.commands.benchmark_views import Command as BenchmarkViews
+from luwasapp.models import Department, IncidentAssignment
+
+from .utils import clear_caches, make_incident, make_user
+
+
+class QueryBudgetTests(TestCase):
+    # The views benchmark_views times, on a small fixture. Counts are pinned exactly, so any new query
+    # shows up here; they must stay within QUERY_BUDGETS, which also hold for the seeded database
+    QUERIES = {
+        'dashboard': {'cold': 4, 'warm': 0},
+        'dashboard_api': {'cold': 4, 'warm': 0},
+        'incident_list': {'cold': 4, 'warm': 1},
+        'incident_search': {'cold': 4, 'warm': 1},
+        # No establishments nearby or photos here
+        'incident_detail': {'cold': 8, 'warm': 3},
+        'assign_user': {'cold': 6, 'warm': 3},
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        # Routed to fire_incident (among others) by name, see routing.DEFAULT_CATEGORY_ROUTES
+        fire = Department.objects.create(name='Fire Department')
+        Department.objects.create(name='Police Department')
+        cls.staff = make_user('staff', fire)
+        cls.responder = make_user('responder', fire)
+        incidents = [make_incident(latitude=10.3 + i / 100, longitude=123.9) for i in range(12)]
+        incidents.append(make_incident('crime_related', location='Mandaue'))
+        for incident in incidents[:4]:
+            IncidentAssignment.objects.create(user=cls.staff, incident_report=incident)
+
+    def setUp(self):
+        clear_caches()
+        self.client.force_login(self.staff)
+
+    def test_pinned_counts_within_budget(self):
+        for name, counts in self.QUERIES.items():
+            for state, count in counts.items():
+                self.assertLessEqual(count, QUERY_BUDGETS[name][state], f'{name} {state}')
+
+    def test_view_queries(self):
+        urls = dict(BenchmarkViews().urls(self.staff))
+        self.assertEqual(set(urls), set(QUERY_BUDGETS))
+        for name, url in urls.items():
+            with self.subTest(view=name, state='cold'):
+                # Sessions and the cached user too, like benchmark_views
+                clear_caches()
+                with self.assertNumQueries(self.QUERIES[name]['cold']):
+                    self.assertEqual(self.client.get(url).status_code, 200)
+            with self.subTest(view=name, state='warm'):
+                with self.assertNumQueries(self.QUERIES[name]['warm']):
+                    self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_incident_list_shows_department_categories_only(self):
+        response = self.client.get(reverse('incident_list'))
+        self.assertContains(response, 'Cebu City')
+        self.assertNotContains(response, 'Mandaue')
@@ -0,0 +1,91 @@
+import unittest
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from luwasapp import changelists
+from luwasapp.changelists import EstimatedCountPaginator, estimated_rows
+from luwasapp.models import IncidentAssignment, IncidentReport
+
+from .utils import clear_caches, make_incident, make_user
+
+
+def analyze(model):
+    with connection.cursor() as cursor:
+        cursor.execute(f'ANALYZE {model._meta.db_table}')
+
+
+def forget_statistics(model):
+    # As if the table had never been analyzed (the migrations ANALYZE the empty tables)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+        if cursor.fetchone():
+            cursor.execute('DELETE FROM sqlite_stat1 WHERE tbl = %s', [model._meta.db_table])
+
+
+def set_statistics(model, rows):
+    # Planner statistics as ANALYZE of a table with `rows` rows would leave them, for every index
+    with connection.cursor() as cursor:
+        cursor.execute('UPDATE sqlite_stat1 SET stat = %s WHERE tbl = %s', [f'{rows} 1', model._meta.db_table])
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'statistics are read from sqlite_stat1 here')
+class EstimatedCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        incident = make_incident()
+        cls.users = [make_user(f'responder{i}') for i in range(5)]
+        for user in cls.users:
+            IncidentAssignment.objects.create(user=user, incident_report=incident)
+
+    def setUp(self):
+        forget_statistics(IncidentAssignment)
+        forget_statistics(IncidentReport)
+
+    def test_no_statistics(self):
+        self.assertIsNone(estimated_rows(IncidentAssignment, 'default'))
+
+    def test_largest_index_count_is_the_table(self):
+        # assignment_outbox_idx only covers unsent assignments, so ANALYZE counts fewer rows for it
+        IncidentAssignment.objects.filter(user__in=self.users[:3]).update(notification_sent=True)
+        analyze(IncidentAssignment)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT stat FROM sqlite_stat1 WHERE idx = 'assignment_outbox_idx'")
+            self.assertEqual(int(cursor.fetchone()[0].split()[0]), 2)
+        self.assertEqual(estimated_rows(IncidentAssignment, 'default'), 5)
+
+    def test_small_or_unanalyzed_table_is_counted_exactly(self):
+        queryset = IncidentAssignment.objects.order_by('pk')
+        with self.assertNumQueries(2):
+            self.assertEqual(EstimatedCountPaginator(queryset, 2).count, 5)
+        analyze(IncidentAssignment)
+        with self.assertNumQueries(2):
+            self.assertEqual(EstimatedCountPaginator(queryset, 2).count, 5)
+
+    def test_large_table_uses_the_estimate(self):
+        analyze(IncidentAssignment)
+        set_statistics(IncidentAssignment, 250_000)
+        paginator = EstimatedCountPaginator(IncidentAssignment.objects.order_by('pk'), 100)
+        with self.assertNumQueries(1):
+            self.assertEqual(paginator.count, 250_000)
+        self.assertEqual(paginator.num_pages, 2500)
+
+    def test_filtered_list_is_counted_up_to_the_limit(self):
+        analyze(IncidentAssignment)
+        set_statistics(IncidentAssignment, 250_000)
+        filtered = IncidentAssignment.objects.filter(notification_sent=False).order_by('pk')
+        with self.assertNumQueries(1):
+            self.assertEqual(EstimatedCountPaginator(filtered, 2).count, 5)
+        with mock.patch.object(changelists, 'COUNT_LIMIT', 3):
+            self.assertEqual(EstimatedCountPaginator(filtered, 2).count, 3)
+
+    def test_changelist(self):
+        clear_caches()
+        analyze(IncidentReport)
+        set_statistics(IncidentReport, 250_000)
+        self.client.force_login(make_user('admin', is_superuser=True))
+        response = self.client.get(reverse('admin:luwasapp_incidentreport_changelist'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 250_000)
@@ -0,0 +1,46 @@
+from django.test import TestCase
+
+from luwasapp import counters
+from luwasapp.models import IncidentAssignment, IncidentCounter, IncidentReport
+
+from .utils import make_incident, make_user
+
+
+class CounterTests(TestCase):
+    def snapshot(self):
+        return set(IncidentCounter.objects.filter(count__gt=0).values_list('user_id', 'dimension', 'key', 'count'))
+
+    def test_rebuild_matches_incremental_counts(self):
+        alice, bob = make_user('alice'), make_user('bob')
+        incidents = [make_incident(category) for category in ('fire_incident', 'fire_incident', 'flooding', 'road_accident')]
+        for incident in incidents[:3]:
+            IncidentAssignment.objects.create(user=alice, incident_report=incident)
+        IncidentAssignment.objects.create(user=bob, incident_report=incidents[0])
+        IncidentAssignment.objects.create(user=bob, incident_report=incidents[3])
+
+        incidents[0].status = 'resolved'
+        incidents[0].save()
+        incidents[1].category = 'gas_leak'
+        incidents[1].save()
+        IncidentAssignment.objects.get(user=bob, incident_report=incidents[3]).delete()
+        incidents[2].delete()
+
+        incremental = self.snapshot()
+        self.assertIn((None, 'category', 'gas_leak', 1), incremental)
+        self.assertIn((alice.pk, 'status', 'resolved', 1), incremental)
+        counters.rebuild()
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_series_in_dashboard_shape(self):
+        alice = make_user('alice')
+        for category in ('flooding', 'fire_incident', 'fire_incident'):
+            make_incident(category)
+        IncidentAssignment.objects.create(user=alice, incident_report=IncidentReport.objects.get(category='flooding'))
+        series = counters.global_series()
+        self.assertEqual(series['incidents_by_category'], [
+            {'category': 'fire_incident', 'count': 2}, {'category': 'flooding', 'count': 1},
+        ])
+        self.assertEqual(series['incidents_by_status'], [{'status': 'reported', 'count': 3}])
+        self.assertEqual(counters.user_series(alice)['user_incidents_by_category'], [
+            {'incident_report__category': 'flooding', 'count': 1},
+        ])
@@ -0,0 +1,66 @@
+import json
+
+from django.test import TestCase
+from django.urls import reverse
+
+from luwasapp.models import IncidentAssignment
+
+from .utils import clear_caches, make_incident, make_user
+
+
+class DashboardApiTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.user = make_user('alice')
+        self.other = make_user('bob')
+        self.incident = make_incident()
+        self.client.force_login(self.user)
+        self.url = reverse('dashboard_api')
+
+    def get(self, **headers):
+        return self.client.get(self.url, **headers)
+
+    def write(self, action):
+        # Versions are bumped once the write commits
+        with self.captureOnCommitCallbacks(execute=True):
+            action()
+
+    def test_validators_and_cache_headers(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+        data = json.loads(response.content)
+        self.assertEqual(data['incidents_by_category'], [{'category': 'fire_incident', 'count': 1}])
+        self.assertEqual(data['user_incidents_by_category'], [])
+
+    def test_not_modified(self):
+        response = self.get()
+        with self.assertNumQueries(0):
+            revalidated = self.get(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated.content, b'')
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+    def test_incident_write_changes_version(self):
+        etag = self.get()['ETag']
+        self.write(lambda: make_incident('flooding'))
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn({'category': 'flooding', 'count': 1}, json.loads(response.content)['incidents_by_category'])
+
+    def test_assignment_changes_only_that_users_version(self):
+        etag = self.get()['ETag']
+        self.write(lambda: IncidentAssignment.objects.create(user=self.other, incident_report=self.incident))
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.write(lambda: IncidentAssignment.objects.create(user=self.user, incident_report=self.incident))
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            json.loads(response.content)['user_incidents_by_category'],
+            [{'incident_report__category': 'fire_incident', 'count': 1}],
+        )
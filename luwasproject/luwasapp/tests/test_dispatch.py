@@ -0,0 +1,96 @@
+import json
+import unittest
+
+from django.test import TestCase
+from django.urls import reverse
+
+from luwasapp import dispatch
+from luwasapp.geohash import haversine_km
+from luwasapp.models import Department, Establishment, IncidentAssignment
+
+from .utils import clear_caches, make_incident, make_user
+
+# Around Cebu City; fire_incident is routed to the Fire Department by name
+INCIDENT = (10.3157, 123.8854)
+
+
+class EstablishmentIndexTests(unittest.TestCase):
+    ROWS = [
+        (1, 10, 10.30, 123.89),
+        (2, 10, 10.40, 123.90),
+        (3, 20, 10.316, 123.886),  # next door, another department
+        (4, 10, 11.00, 124.00),
+        (5, 10, None, None),
+    ]
+
+    def check(self, use_numpy):
+        index = dispatch.EstablishmentIndex(self.ROWS, use_numpy=use_numpy)
+        self.assertEqual(len(index), 4)
+        self.assertEqual([row[0] for row in index.rank(*INCIDENT)], [3, 1, 2, 4])
+        self.assertEqual([row[0] for row in index.rank(*INCIDENT, department_ids=[10], limit=2)], [1, 2])
+        self.assertEqual(index.rank(*INCIDENT, department_ids=[99]), [])
+        distance = index.rank(*INCIDENT, limit=1)[0][1]
+        self.assertAlmostEqual(distance, haversine_km(*INCIDENT, 10.316, 123.886), places=9)
+
+    def test_python(self):
+        self.check(use_numpy=False)
+
+    @unittest.skipIf(dispatch.numpy is None, 'numpy is not installed')
+    def test_numpy_matches_python(self):
+        self.check(use_numpy=True)
+        python, vectorised = (dispatch.EstablishmentIndex(self.ROWS, use_numpy=flag) for flag in (False, True))
+        for limit in (1, 3, 10):
+            expected = python.rank(*INCIDENT, limit=limit)
+            actual = vectorised.rank(*INCIDENT, limit=limit)
+            self.assertEqual([row[0] for row in actual], [row[0] for row in expected])
+            for (_, a), (_, b) in zip(actual, expected):
+                self.assertAlmostEqual(a, b, places=9)
+
+
+class SuggestTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        fire = Department.objects.create(name='Fire Department')
+        police = Department.objects.create(name='Police Department')
+        self.near = Establishment.objects.create(name='Station 1', location='', department=fire, latitude=10.30, longitude=123.89)
+        self.far = Establishment.objects.create(name='Station 2', location='', department=fire, latitude=10.40, longitude=123.90)
+        Establishment.objects.create(name='Precinct', location='', department=police, latitude=10.316, longitude=123.886)
+        self.incident = make_incident()
+
+        self.busy = make_user('busy', fire, establishment=self.near)
+        self.idle = make_user('idle', fire, establishment=self.near)
+        self.finished = make_user('finished', fire, establishment=self.near)
+        make_user('retired', fire, establishment=self.near, is_active=False)
+        for _ in range(2):
+            IncidentAssignment.objects.create(user=self.busy, incident_report=make_incident())
+        # Closed work doesn't count against a responder
+        IncidentAssignment.objects.create(user=self.finished, incident_report=make_incident(status='closed'))
+        IncidentAssignment.objects.create(user=self.idle, incident_report=self.incident)
+
+    def test_nearest_establishments_with_least_busy_responders(self):
+        suggestions = dispatch.suggest(self.incident, responders_per_establishment=2)
+        self.assertEqual([suggestion['establishment'] for suggestion in suggestions], [self.near, self.far])
+        self.assertLess(suggestions[0]['distance_km'], suggestions[1]['distance_km'])
+        responders = suggestions[0]['responders']
+        self.assertEqual([responder.username for responder in responders], ['finished', 'idle'])
+        self.assertEqual([responder.open_assignments for responder in responders], [0, 1])
+        self.assertEqual([responder.assigned_here for responder in responders], [False, True])
+        self.assertEqual(suggestions[1]['responders'], [])
+
+    def test_index_follows_establishment_changes(self):
+        self.assertEqual(dispatch.suggest(self.incident, limit=1)[0]['establishment'], self.near)
+        self.far.latitude, self.far.longitude = INCIDENT
+        self.far.save()
+        self.assertEqual(dispatch.suggest(self.incident, limit=1)[0]['establishment'], self.far)
+
+    def test_no_coordinates(self):
+        self.assertEqual(dispatch.suggest(make_incident(latitude=None, longitude=None)), [])
+
+    def test_view(self):
+        self.client.force_login(make_user('staff'))
+        url = reverse('incident_dispatch', args=[self.incident.pk])
+        data = json.loads(self.client.get(url, {'limit': 1}).content)
+        self.assertEqual(len(data['suggestions']), 1)
+        self.assertEqual(data['suggestions'][0]['establishment']['name'], 'Station 1')
+        self.assertEqual(data['suggestions'][0]['responders'][0]['username'], 'finished')
+        self.assertEqual(self.client.get(url, {'limit': 'x'}).status_code, 400)
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import unittest
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+
+from luwasapp import events
+from luwasapp.models import Department
+
+from .utils import clear_caches, make_incident, make_user
+
+
+def parse_sse(body):
+    # [(field, value), ...] per message of a text/event-stream body
+    return [
+        [tuple(line.split(': ', 1)) for line in message.splitlines()]
+        for message in body.split('\n\n') if message
+    ]
+
+
+class BrokerTests(unittest.TestCase):
+    def setUp(self):
+        self.broker = events.Broker(history_size=3)
+
+    def test_publish_reaches_matching_subscribers(self):
+        async def run():
+            fires = self.broker.subscribe(lambda event: event['data']['category'] == 'fire_incident')
+            everything = self.broker.subscribe()
+            self.broker.publish('created', {'id': 1, 'category': 'crime_incident'})
+            fire = self.broker.publish('created', {'id': 2, 'category': 'fire_incident'})
+            self.assertEqual(await asyncio.wait_for(fires.get(), 1), fire)
+            self.assertEqual([(await everything.get())['data']['id'] for _ in range(2)], [1, 2])
+            self.assertTrue(fires.queue.empty())
+            async with fires:
+                pass
+            self.assertEqual(len(self.broker), 1)
+        asyncio.run(run())
+
+    def test_publish_from_another_thread(self):
+        async def run():
+            subscription = self.broker.subscribe()
+            event = await asyncio.to_thread(self.broker.publish, 'created', {'id': 1, 'category': 'fire_incident'})
+            self.assertEqual(await asyncio.wait_for(subscription.get(), 1), event)
+        asyncio.run(run())
+
+    def test_closed_loop_unsubscribes(self):
+        asyncio.run(self._subscribe())
+        self.broker.publish('created', {'id': 1, 'category': 'fire_incident'})
+        self.assertEqual(len(self.broker), 0)
+
+    async def _subscribe(self):
+        self.broker.subscribe()
+
+    def test_full_queue_becomes_reset(self):
+        async def run():
+            subscription = self.broker.subscribe()
+            subscription.queue = asyncio.Queue(2)
+            for pk in range(3):
+                last = self.broker.publish('created', {'id': pk, 'category': 'fire_incident'})
+            await asyncio.sleep(0)
+            self.assertEqual(subscription.queue.qsize(), 1)
+            self.assertEqual(await subscription.get(), {'id': last['id'], 'type': 'reset', 'data': {}})
+        asyncio.run(run())
+
+    def test_subscribe_replays_missed_events(self):
+        first = self.broker.publish('created', {'id': 1, 'category': 'fire_incident'})
+        self.broker.publish('created', {'id': 2, 'category': 'crime_incident'})
+        third = self.broker.publish('created', {'id': 3, 'category': 'fire_incident'})
+
+        async def run():
+            subscription = self.broker.subscribe(lambda event: event['data']['category'] == 'fire_incident', first['id'])
+            self.assertEqual(await subscription.get(), third)
+            self.assertTrue(subscription.queue.empty())
+        asyncio.run(run())
+
+    def test_catch_up(self):
+        first = self.broker.publish('created', {'id': 1, 'category': 'fire_incident'})
+        second = self.broker.publish('created', {'id': 2, 'category': 'fire_incident'})
+        self.assertEqual(self.broker.catch_up(first['id']), ([second], second['id']))
+        self.assertEqual(self.broker.catch_up(second['id']), ([], second['id']))
+        self.assertEqual(self.broker.catch_up(None), ([], second['id']))
+        self.assertEqual(self.broker.catch_up('0123abcd:1'), (None, second['id']))
+
+    def test_catch_up_past_history(self):
+        first = self.broker.publish('created', {'id': 1, 'category': 'fire_incident'})
+        for pk in range(2, 5):
+            newest = self.broker.publish('created', {'id': pk, 'category': 'fire_incident'})
+        # History holds 2-4: a client that saw 1 can still catch up, one that saw nothing cannot
+        self.assertEqual(len(self.broker.catch_up(first['id'])[0]), 3)
+        self.assertEqual(self.broker.catch_up(f'{events.BOOT_TOKEN}:0'), (None, newest['id']))
+
+
+class CatchUpTests(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(events, 'broker', events.Broker(history_size=3))
+        self.broker = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.accept = events.feed_filter(7, ['fire_incident'])
+
+    def test_missed_events_and_newest_id(self):
+        seen = self.broker.publish('created', {'id': 1, 'category': 'fire_incident'})
+        self.broker.publish('created', {'id': 2, 'category': 'crime_incident'})
+        fire = self.broker.publish('updated', {'id': 2, 'category': 'fire_incident', 'previous_category': 'crime_incident'})
+        mine = self.broker.publish('assigned', {'id': 2, 'user_id': 7})
+
+        messages = parse_sse(events.sse_catch_up(self.accept, seen['id']))
+        self.assertEqual(messages[0], [('retry', str(events.POLL_MILLISECONDS))])
+        self.assertEqual(messages[1], [('id', fire['id']), ('event', 'updated'), ('data', json.dumps(fire['data']))])
+        self.assertEqual(messages[2], [('id', mine['id']), ('event', 'assigned'), ('data', json.dumps(mine['data']))])
+        self.assertEqual(messages[3:], [[('id', mine['id'])]])
+
+    def test_first_poll_starts_from_now(self):
+        newest = self.broker.publish('created', {'id': 1, 'category': 'fire_incident'})
+        messages = parse_sse(events.sse_catch_up(self.accept))
+        self.assertEqual(messages[1:], [[('id', newest['id'])]])
+
+    def test_lost_history_resets(self):
+        for pk in range(5):
+            newest = self.broker.publish('created', {'id': pk, 'category': 'fire_incident'})
+        messages = parse_sse(events.sse_catch_up(self.accept, f'{events.BOOT_TOKEN}:0'))
+        self.assertEqual(messages[1:], [[('id', newest['id']), ('event', 'reset'), ('data', '{}')]])
+
+    def test_other_process_id_starts_from_now(self):
+        newest = self.broker.publish('created', {'id': 1, 'category': 'fire_incident'})
+        messages = parse_sse(events.sse_catch_up(self.accept, 'feedbeef:99'))
+        self.assertEqual(messages[1:], [[('id', newest['id'])]])
+
+    def test_stream(self):
+        async def run():
+            stream = events.sse_stream(self.accept)
+            self.assertEqual(await anext(stream), f'retry: {events.RETRY_MILLISECONDS}\n\n')
+            waiting = asyncio.ensure_future(anext(stream))
+            await asyncio.sleep(0)
+            self.broker.publish('created', {'id': 1, 'category': 'crime_incident'})
+            event = self.broker.publish('created', {'id': 2, 'category': 'fire_incident'})
+            self.assertEqual(await asyncio.wait_for(waiting, 1), events.format_sse(event))
+            await stream.aclose()
+            self.assertEqual(len(self.broker), 0)
+        asyncio.run(run())
+
+
+class IncidentEventsViewTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        patcher = mock.patch.object(events, 'broker', events.Broker())
+        self.broker = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = make_user('responder', Department.objects.create(name='Fire Department'))
+        self.client.force_login(self.user)
+        self.url = reverse('incident_events')
+
+    def test_wsgi_poll_returns_what_was_missed(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first['Content-Type'], 'text/event-stream')
+        self.assertEqual(first['Cache-Control'], 'no-cache')
+        last_event_id = parse_sse(first.content.decode())[-1][0][1]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            fire = make_incident()
+            make_incident(category='crime_incident')
+
+        response = self.client.get(self.url, headers={'Last-Event-ID': last_event_id})
+        messages = parse_sse(response.content.decode())
+        self.assertEqual([dict(message).get('event') for message in messages[1:]], ['created', None])
+        self.assertEqual(json.loads(dict(messages[1])['data'])['id'], fire.reportid)
+        newest = messages[-1][0][1]
+        self.assertEqual(parse_sse(self.client.get(self.url, {'last_event_id': newest}).content.decode())[1:], [[('id', newest)]])
+
+    def test_needs_a_department(self):
+        self.client.force_login(make_user('clerk'))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
@@ -0,0 +1,158 @@
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import zlib
+from datetime import datetime
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from luwasapp import exporting
+from luwasapp.models import Department, IncidentAssignment, IncidentReport
+
+from .utils import clear_caches, make_incident, make_user
+
+
+def moment(day, hour=12):
+    return timezone.make_aware(datetime(2024, 3, day, hour))
+
+
+def gunzip_so_far(data):
+    # What a gzip stream decodes to up to this point, without its end
+    return zlib.decompressobj(31).decompress(data)
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.fire_department = Department.objects.create(name='Fire Department')
+        cls.police = Department.objects.create(name='Police Department')
+        cls.admin = make_user('admin')
+        cls.firefighter = make_user('firefighter', cls.fire_department)
+        cls.officer = make_user('officer', cls.police)
+
+        cls.early = make_incident(description=None)
+        cls.late = make_incident(category='gas_leak', location='Mandaue, "Block 4"')
+        cls.crime = make_incident(category='crime_related', incident_type='Theft')
+        for incident, day in ((cls.early, 1), (cls.late, 3), (cls.crime, 3)):
+            IncidentReport.objects.filter(pk=incident.pk).update(timestamp=moment(day, hour=23))
+        IncidentAssignment.objects.create(user=cls.firefighter, incident_report=cls.early)
+        IncidentAssignment.objects.create(user=cls.officer, incident_report=cls.crime)
+
+    def setUp(self):
+        clear_caches()
+        self.client.force_login(self.admin)
+
+    def export(self, kind='incidents', **params):
+        response = self.client.get(reverse('export', args=[kind]), params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def csv_rows(self, kind='incidents', **params):
+        _, body = self.export(kind, **params)
+        return list(csv.DictReader(io.StringIO(body.decode())))
+
+    def exported_ids(self, kind='incidents', **params):
+        key = 'reportid' if kind == 'incidents' else 'incident_id'
+        return [int(row[key]) for row in self.csv_rows(kind, **params)]
+
+    def test_csv(self):
+        response, body = self.export()
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertRegex(response['Content-Disposition'], r'^attachment; filename="luwas-incidents-[\d-]+\.csv"$')
+        reader = csv.reader(io.StringIO(body.decode()))
+        self.assertEqual(next(reader), exporting.EXPORTS['incidents']['columns'])
+        rows = {row[0]: dict(zip(exporting.EXPORTS['incidents']['columns'], row)) for row in reader}
+        self.assertEqual(set(rows), {str(self.early.pk), str(self.late.pk), str(self.crime.pk)})
+        early, late = rows[str(self.early.pk)], rows[str(self.late.pk)]
+        self.assertEqual(early['description'], '')
+        self.assertEqual(late['location'], 'Mandaue, "Block 4"')
+        self.assertEqual(parse_datetime(early['timestamp']), moment(1, hour=23))
+        self.assertEqual(float(early['latitude']), self.early.latitude)
+
+    def test_ndjson(self):
+        response, body = self.export(format='ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        lines = body.decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        first = json.loads(lines[0])
+        self.assertEqual(list(first), exporting.EXPORTS['incidents']['columns'])
+        self.assertEqual(first['reportid'], self.early.pk)
+        self.assertIsNone(first['description'])
+        self.assertEqual(parse_datetime(first['timestamp']), moment(1, hour=23))
+
+    def test_assignments(self):
+        rows = self.csv_rows('assignments', format='csv')
+        self.assertEqual(
+            [(row['username'], row['department'], row['category'], row['notification_sent']) for row in rows],
+            [('firefighter', 'Fire Department', 'fire_incident', 'False'), ('officer', 'Police Department', 'crime_related', 'False')],
+        )
+        self.assertEqual(rows[0]['notified_at'], '')
+
+    def test_date_range(self):
+        # A bare date as `until` takes in the whole of that day
+        self.assertEqual(self.exported_ids(until='2024-03-01'), [self.early.pk])
+        self.assertEqual(self.exported_ids(since='2024-03-02'), [self.late.pk, self.crime.pk])
+        self.assertEqual(self.exported_ids(since='2024-03-01', until='2024-03-02'), [self.early.pk])
+        self.assertEqual(self.exported_ids(until=moment(3, hour=23).isoformat()), [self.early.pk])
+        self.assertEqual(self.exported_ids(since='2024-03-04'), [])
+
+    def test_category_and_department(self):
+        self.assertEqual(self.exported_ids(category=['gas_leak', 'crime_related']), [self.late.pk, self.crime.pk])
+        # Incidents routed to the department, or assignments of its members
+        self.assertEqual(self.exported_ids(department=self.fire_department.pk), [self.early.pk, self.late.pk])
+        self.assertEqual(self.exported_ids('assignments', department=self.police.pk), [self.crime.pk])
+        self.assertEqual(self.exported_ids(department=self.fire_department.pk, category='gas_leak', since='2024-03-02'), [self.late.pk])
+
+    def test_gzip(self):
+        response, body = self.export(format='ndjson', gzip='1')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertTrue(response['Content-Disposition'].endswith('.ndjson.gz"'))
+        _, plain = self.export(format='ndjson')
+        self.assertEqual(gzip.decompress(body), plain)
+
+    def test_streamed_in_pieces(self):
+        # The first line is flushed on its own, gzipped or not, so the download starts at once
+        rows = exporting.queryset('incidents', exporting.parse_filters())
+        with mock.patch.object(exporting, 'FLUSH_BYTES', 1):
+            plain = list(exporting.stream('incidents', 'csv', rows, chunk_size=1))
+            packed = list(exporting.stream('incidents', 'csv', rows, compress=True, chunk_size=1))
+        self.assertEqual(len(plain), 4)
+        self.assertEqual(plain[0].decode(), ','.join(exporting.EXPORTS['incidents']['columns']) + '\r\n')
+        self.assertEqual(gzip.decompress(b''.join(packed)), b''.join(plain))
+        self.assertEqual(gunzip_so_far(packed[0]), plain[0])
+
+    def test_bad_requests(self):
+        url = reverse('export', args=['incidents'])
+        for params in ({'since': 'yesterday'}, {'category': 'arson'}, {'department': 'fire'}):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn('error', response.json())
+        self.assertEqual(self.client.get(url, {'format': 'xml'}).status_code, 404)
+        self.assertEqual(self.client.get(reverse('export', args=['users'])).status_code, 404)
+
+        self.client.force_login(make_user('responder', is_staff=False))
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+    def test_command(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'crime.ndjson.gz')
+        call_command(
+            'export', 'incidents', '--category', 'crime_related', '--format', 'ndjson', '--gzip', '--output', path,
+            stdout=io.StringIO(),
+        )
+        with gzip.open(path, 'rt') as f:
+            self.assertEqual([json.loads(line)['reportid'] for line in f], [self.crime.pk])
+        with self.assertRaises(CommandError):
+            call_command('export', 'incidents', '--since', 'yesterday')
+
@@ -0,0 +1,67 @@
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from luwasapp import importing
+from luwasapp.models import ImportCheckpoint, IncidentCounter, IncidentReport
+
+
+class ImportResumeTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'history.csv')
+        with open(self.path, 'w') as f:
+            f.write('incident_type,severity,category,status,location,latitude,longitude\n')
+            for i in range(7):
+                f.write(f'Fire {i},high,fire_incident,reported,Cebu City,10.3,123.9\n')
+            f.write('Broken,extreme,fire_incident,reported,Cebu City,10.3,123.9\n')
+
+    def run_import(self, *args):
+        call_command('import_incidents', self.path, '--chunk-size', '3', *args, stdout=io.StringIO())
+
+    def test_resume_continues_after_last_committed_chunk(self):
+        write_chunk = importing.write_chunk
+        calls = []
+
+        def interrupted(chunk, notify=False):
+            calls.append(chunk)
+            if len(calls) == 2:
+                raise RuntimeError('Interrupted')
+            return write_chunk(chunk, notify)
+
+        with mock.patch('luwasapp.importing.write_chunk', interrupted), self.assertRaises(RuntimeError):
+            self.run_import()
+        # Only the first chunk was committed, with its checkpoint
+        self.assertEqual(IncidentReport.objects.count(), 3)
+        checkpoint = ImportCheckpoint.objects.get()
+        self.assertEqual((checkpoint.rows_read, checkpoint.rows_imported), (3, 3))
+        self.assertIsNone(checkpoint.finished_at)
+
+        with self.assertRaises(CommandError):
+            self.run_import()
+        self.run_import('--resume')
+        self.assertEqual(
+            list(IncidentReport.objects.order_by('reportid').values_list('incident_type', flat=True)),
+            [f'Fire {i}' for i in range(7)],
+        )
+        checkpoint.refresh_from_db()
+        self.assertEqual((checkpoint.rows_read, checkpoint.rows_imported, checkpoint.rows_rejected), (8, 7, 1))
+        self.assertIsNotNone(checkpoint.finished_at)
+        self.assertEqual(IncidentCounter.objects.get(user=None, dimension='category', key='fire_incident').count, 7)
+
+    def test_resume_after_finishing_imports_appended_rows_only(self):
+        self.run_import()
+        with self.assertRaises(CommandError):
+            self.run_import()
+        with open(self.path, 'a') as f:
+            f.write('Fire 7,high,fire_incident,reported,Cebu City,10.3,123.9\n')
+        self.run_import('--resume')
+        self.assertEqual(IncidentReport.objects.count(), 8)
+        self.assertEqual(ImportCheckpoint.objects.get().rows_imported, 8)
@@ -0,0 +1,91 @@
+import io
+import threading
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from luwasapp import notifications
+from luwasapp.management.commands.smtp_stub_server import StubSMTPServer
+from luwasapp.models import IncidentAssignment
+
+from .utils import make_incident, make_user
+
+
+class NotificationBackoffTests(TestCase):
+    # Against smtp_stub_server, rejecting every other message with a temporary failure
+
+    def setUp(self):
+        self.server = StubSMTPServer(('127.0.0.1', 0), io.StringIO(), fail_every=2)
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        settings = override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1', EMAIL_PORT=self.server.server_address[1], EMAIL_USE_TLS=False,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        incident = make_incident()
+        for username in ('alice', 'bob'):
+            IncidentAssignment.objects.create(user=make_user(username), incident_report=incident)
+
+    def test_failed_digest_is_retried_after_backoff(self):
+        with self.assertLogs('luwasapp.notifications', 'WARNING'):
+            sent, failed, digests = notifications.process_batch(concurrency=1)
+        self.assertEqual((sent, failed, digests), (1, 1, 1))
+        self.assertEqual(self.server.messages_delivered, 1)
+
+        retry = IncidentAssignment.objects.get(notification_sent=False)
+        self.assertEqual(retry.notification_attempts, 1)
+        self.assertIn('Temporary failure', retry.notification_error)
+        self.assertEqual(retry.notification_claim, '')
+        base = notifications.get_setting('RETRY_BASE')
+        delay = retry.notification_due_at - timezone.now()
+        self.assertTrue(base * 0.7 < delay <= base * 1.2, delay)
+
+        # Not due yet
+        self.assertEqual(notifications.process_batch(concurrency=1), (0, 0, 0))
+        IncidentAssignment.objects.filter(pk=retry.pk).update(notification_due_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(notifications.process_batch(concurrency=1), (1, 0, 1))
+        retry.refresh_from_db()
+        self.assertTrue(retry.notification_sent)
+        self.assertEqual(retry.notification_attempts, 2)
+        self.assertEqual(self.server.messages_delivered, 2)
+
+    def test_retry_delay_doubles_up_to_max(self):
+        base, ceiling = notifications.get_setting('RETRY_BASE'), notifications.get_setting('RETRY_MAX')
+        for attempts in range(1, 5):
+            delay = notifications.retry_delay(attempts)
+            self.assertTrue(base * 2 ** (attempts - 1) * 0.8 <= delay <= base * 2 ** (attempts - 1) * 1.2, attempts)
+        self.assertLessEqual(notifications.retry_delay(30), ceiling * 1.2)
+
+
+class LeaseTests(TestCase):
+    def setUp(self):
+        incident = make_incident()
+        for username in ('alice', 'bob'):
+            IncidentAssignment.objects.create(user=make_user(username), incident_report=incident)
+
+    def test_expired_lease_is_not_recorded_over_the_new_claim(self):
+        # The first worker stalls past its lease; a second claims the same rows before the first records
+        stalled = notifications.claim(now=timezone.now() - notifications.get_setting('LEASE') - timedelta(seconds=1))
+        current = notifications.claim()
+        self.assertEqual(len(stalled), 2)
+        self.assertEqual({a.pk for a in current}, {a.pk for a in stalled})
+
+        digests = notifications.build_digests(stalled)
+        with self.assertLogs('luwasapp.notifications', 'WARNING'):
+            results = [(digests[0], None, False), (digests[1], 'Temporary failure', False)]
+            self.assertEqual(notifications.record(results), (0, 0))
+        for assignment in IncidentAssignment.objects.all():
+            self.assertFalse(assignment.notification_sent)
+            self.assertEqual(assignment.notification_attempts, 0)
+            self.assertEqual(assignment.notification_claim, current[0].notification_claim)
+
+        results = [(digest, None, False) for digest in notifications.build_digests(current)]
+        self.assertEqual(notifications.record(results), (2, 0))
+        self.assertFalse(IncidentAssignment.objects.filter(notification_sent=False).exists())
+        self.assertFalse(IncidentAssignment.objects.exclude(notification_claim='').exists())
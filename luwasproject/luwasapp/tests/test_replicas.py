@@ -0,0 +1,131 @@
+import asyncio
+import time
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+
+from luwasapp import replicas
+from luwasapp.models import IncidentReport
+
+from .utils import make_incident
+
+router = replicas.ReplicaRouter()
+
+
+def reads_from():
+    # Where the router sends a read made now, checked against read_alias() for streamed querysets
+    alias = router.db_for_read(IncidentReport)
+    assert alias == replicas.read_alias()
+    return alias
+
+
+def view(request):
+    # Records where its reads went, before and after an optional write
+    request.reads = [reads_from()]
+    if request.GET.get('write'):
+        router.db_for_write(IncidentReport)
+        request.reads.append(reads_from())
+    with replicas.use_primary():
+        request.reads.append(reads_from())
+    return HttpResponse()
+
+
+class ReplicaRoutingTests(SimpleTestCase):
+    # No 'replica' alias exists here; the router is asked where queries would go, none are run
+    def setUp(self):
+        patcher = mock.patch.object(replicas, 'replica_configured', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.factory = RequestFactory()
+
+    def call(self, view, method='get', sticky_until=None, **params):
+        request = getattr(self.factory, method)('/', params)
+        if sticky_until is not None:
+            request.COOKIES[replicas.STICKY_COOKIE] = str(sticky_until)
+        response = replicas.ReplicaMiddleware(view)(request)
+        return request, response
+
+    def test_replica_reads_view_reads_from_replica(self):
+        request, response = self.call(replicas.replica_reads(view))
+        self.assertEqual(request.reads, ['replica', 'default'])
+        self.assertNotIn(replicas.STICKY_COOKIE, response.cookies)
+
+    def test_other_views_read_from_primary(self):
+        request, response = self.call(view)
+        self.assertEqual(request.reads, ['default', 'default'])
+        self.assertNotIn(replicas.STICKY_COOKIE, response.cookies)
+
+    def test_write_sets_sticky_cookie(self):
+        before = time.time()
+        request, response = self.call(replicas.replica_reads(view), write='1')
+        # Reads after the write see it
+        self.assertEqual(request.reads, ['replica', 'default', 'default'])
+        cookie = response.cookies[replicas.STICKY_COOKIE]
+        self.assertEqual(cookie['max-age'], 10)
+        self.assertTrue(cookie['httponly'])
+        self.assertAlmostEqual(float(cookie.value), before + 10, delta=1)
+
+        # The next request from that browser reads from the primary until the cookie runs out
+        request, response = self.call(replicas.replica_reads(view), sticky_until=cookie.value)
+        self.assertEqual(request.reads, ['default', 'default'])
+        self.assertNotIn(replicas.STICKY_COOKIE, response.cookies)
+        request, _ = self.call(replicas.replica_reads(view), sticky_until=time.time() - 1)
+        self.assertEqual(request.reads, ['replica', 'default'])
+        request, _ = self.call(replicas.replica_reads(view), sticky_until='soon')
+        self.assertEqual(request.reads, ['replica', 'default'])
+
+    def test_unsafe_methods_read_from_primary(self):
+        request, response = self.call(replicas.replica_reads(view), method='post')
+        self.assertEqual(request.reads, ['default', 'default'])
+        self.assertIn(replicas.STICKY_COOKIE, response.cookies)
+
+    def test_async_view(self):
+        async def async_view(request):
+            request.reads = [reads_from()]
+            return HttpResponse()
+
+        # Run on its own loop inside the middleware, which shares its routing state through the context
+        def get_response(request):
+            return asyncio.run(replicas.replica_reads(async_view)(request))
+
+        request = self.factory.get('/')
+        replicas.ReplicaMiddleware(get_response)(request)
+        self.assertEqual(request.reads, ['replica'])
+
+    def test_outside_a_request(self):
+        self.assertEqual(reads_from(), 'default')
+        self.assertEqual(router.db_for_write(IncidentReport), 'default')
+
+    def test_migrations_skip_the_replica(self):
+        self.assertFalse(router.allow_migrate(replicas.REPLICA, 'luwasapp'))
+        self.assertTrue(router.allow_migrate('default', 'luwasapp'))
+
+
+class ReplicaConfigurationTests(SimpleTestCase):
+    def test_without_a_replica(self):
+        request = RequestFactory().get('/', {'write': '1'})
+        response = replicas.ReplicaMiddleware(replicas.replica_reads(view))(request)
+        self.assertEqual(request.reads, ['default', 'default', 'default'])
+        self.assertNotIn(replicas.STICKY_COOKIE, response.cookies)
+
+
+class ReplicaWriteTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(replicas, 'replica_configured', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_orm_write_sets_sticky_cookie(self):
+        def write_view(request):
+            make_incident()
+            return HttpResponse()
+
+        response = replicas.ReplicaMiddleware(replicas.replica_reads(write_view))(RequestFactory().get('/'))
+        self.assertIn(replicas.STICKY_COOKIE, response.cookies)
+
+    def test_reads_inside_a_transaction_stay_on_the_primary(self):
+        # As in every TestCase test: the primary's transaction is open
+        request = RequestFactory().get('/')
+        replicas.ReplicaMiddleware(replicas.replica_reads(view))(request)
+        self.assertEqual(request.reads, ['default', 'default'])
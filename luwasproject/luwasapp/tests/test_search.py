@@ -0,0 +1,185 @@
+import unittest
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from luwasapp import search
+from luwasapp.models import Department, IncidentReport
+
+from .utils import clear_caches, make_incident, make_user
+
+CATEGORIES = ['fire_incident', 'gas_leak']
+
+
+def fts5_index():
+    return search.backend(connection) == 'fts5'
+
+
+def found(query, categories=CATEGORIES, **kwargs):
+    return [incident.reportid for incident, _ in search.search(query, categories, **kwargs)]
+
+
+def indexed(word):
+    # Rows the FTS5 index itself has for `word`, whatever the incident table says
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT rowid FROM {search.TABLE} WHERE {search.TABLE} MATCH %s ORDER BY rowid', [f'"{word}"'])
+        return [rowid for rowid, in cursor.fetchall()]
+
+
+def check_integrity():
+    # FTS5 raises if the index and the incident table disagree
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {search.TABLE}({search.TABLE}, rank) VALUES ('integrity-check', 1)")
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'the FTS5 index is SQLite only')
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        if not fts5_index():
+            self.skipTest('SQLite built without FTS5')
+
+    def test_insert_is_indexed(self):
+        incident = make_incident(description='Smoke from the bakery oven')
+        self.assertEqual(indexed('bakery'), [incident.pk])
+        self.assertEqual(found('bakery'), [incident.pk])
+        check_integrity()
+
+    def test_update_reindexes_changed_text(self):
+        incident = make_incident(description='Smoke from the bakery oven')
+        incident.description = 'Smoke from the laundry'
+        incident.save()
+        self.assertEqual(indexed('bakery'), [])
+        self.assertEqual(indexed('laundry'), [incident.pk])
+        # Queryset updates go through the trigger as well
+        IncidentReport.objects.filter(pk=incident.pk).update(resolved_address='Colon Street, Cebu City')
+        self.assertEqual(found('colon'), [incident.pk])
+        check_integrity()
+
+    def test_other_updates_leave_the_index_alone(self):
+        incident = make_incident(description='Smoke from the bakery oven')
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {search.TABLE}_data')
+            before = cursor.fetchone()
+            IncidentReport.objects.filter(pk=incident.pk).update(status='resolved')
+            cursor.execute(f'SELECT COUNT(*) FROM {search.TABLE}_data')
+            self.assertEqual(cursor.fetchone(), before)
+        self.assertEqual(found('bakery', status='resolved'), [incident.pk])
+
+    def test_delete_is_unindexed(self):
+        incident = make_incident(description='Smoke from the bakery oven')
+        kept = make_incident(description='Bakery storeroom')
+        incident.delete()
+        self.assertEqual(indexed('bakery'), [kept.pk])
+        IncidentReport.objects.filter(pk=kept.pk).delete()
+        self.assertEqual(found('bakery'), [])
+        check_integrity()
+
+    def test_bulk_load_with_triggers_paused(self):
+        with search.triggers_paused(connection):
+            IncidentReport.objects.bulk_create([
+                IncidentReport(incident_type='Fire', description=f'Warehouse {i}', category='fire_incident') for i in range(3)
+            ])
+            self.assertEqual(indexed('warehouse'), [])
+        self.assertEqual(len(indexed('warehouse')), 3)
+        check_integrity()
+
+    def test_ensure_triggers_restores_dropped_ones(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TRIGGER {search.TABLE}_insert')
+        incident = make_incident(description='Bakery')
+        self.assertTrue(search.ensure_triggers(connection))
+        self.assertEqual(indexed('bakery'), [incident.pk])
+        self.assertFalse(search.ensure_triggers(connection))
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'the FTS5 index is SQLite only')
+class SearchRankingTests(TestCase):
+    def setUp(self):
+        if not fts5_index():
+            self.skipTest('SQLite built without FTS5')
+
+    def test_type_above_description_above_location_above_address(self):
+        # The same word in each column of otherwise alike incidents, created in that order so the
+        # newest-first tie-break would list them the other way round
+        fields = {'incident_type': 'Other', 'description': 'Other', 'location': 'Other', 'resolved_address': 'Other'}
+        by_column = {column: make_incident(**{**fields, column: 'Sunog'}).pk for column in search.COLUMNS}
+        results = search.search('sunog', CATEGORIES)
+        self.assertEqual([incident.reportid for incident, _ in results], [by_column[column] for column in search.COLUMNS])
+        scores = [score for _, score in results]
+        for better, worse in zip(scores, scores[1:]):
+            self.assertGreater(better, worse)
+
+    def test_last_word_is_a_prefix_until_finished(self):
+        kitchen = make_incident(description='Kitchen fire on the second floor')
+        self.assertEqual(found('kit'), [kitchen.pk])
+        self.assertEqual(found('second flo'), [kitchen.pk])
+        self.assertEqual(found('kit '), [])
+        self.assertEqual(found('flo second'), [])
+
+    def test_every_word_must_match(self):
+        kitchen = make_incident(description='Kitchen fire')
+        make_incident(description='Garage fire')
+        self.assertEqual(found('fire kitchen'), [kitchen.pk])
+        self.assertEqual(found('"kitchen" OR garage'), [])
+
+    def test_filters(self):
+        fire = make_incident(description='Smoke')
+        make_incident(category='crime_related', description='Smoke')
+        resolved = make_incident(category='gas_leak', status='resolved', description='Smoke')
+        self.assertEqual(sorted(found('smoke')), [fire.pk, resolved.pk])
+        self.assertEqual(found('smoke', status='resolved'), [resolved.pk])
+        self.assertEqual(found('smoke', categories=[]), [])
+        self.assertEqual(found('s'), [])
+
+    def test_limit(self):
+        IncidentReport.objects.bulk_create([
+            IncidentReport(incident_type='Fire', description='Smoke', category='fire_incident') for _ in range(search.MAX_RESULTS + 5)
+        ])
+        self.assertEqual(len(found('smoke', limit=3)), 3)
+        self.assertEqual(len(found('smoke', limit=1000)), search.MAX_RESULTS)
+        self.assertEqual(len(found('smoke', limit=0)), 1)
+
+    def test_matching(self):
+        kitchen = make_incident(description='Kitchen fire')
+        make_incident(description='Garage fire')
+        self.assertEqual(list(search.matching(IncidentReport.objects.all(), 'kitch').values_list('pk', flat=True)), [kitchen.pk])
+        self.assertEqual(search.matching(IncidentReport.objects.all(), '').count(), 2)
+
+
+class SubstringSearchTests(TestCase):
+    # Databases without an index match substrings, newest first, unranked
+    def setUp(self):
+        patcher = mock.patch.object(search, 'backend', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_search(self):
+        kitchen = make_incident(description='Kitchen fire')
+        make_incident(description='Garage fire')
+        self.assertEqual(search.search('itchen fire', CATEGORIES), [(kitchen, None)])
+        self.assertEqual(list(search.matching(IncidentReport.objects.all(), 'GARAGE').values_list('description', flat=True)), ['Garage fire'])
+
+
+class SearchViewTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.user = make_user('responder', Department.objects.create(name='Fire Department'))
+        self.client.force_login(self.user)
+        self.url = reverse('incident_search')
+
+    def test_results(self):
+        incident = make_incident(description='Kitchen fire')
+        make_incident(category='crime_related', description='Kitchen break-in')
+        response = self.client.get(self.url, {'q': 'kitchen', 'limit': 5})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['incidents']
+        self.assertEqual([result['id'] for result in results], [incident.pk])
+        self.assertEqual(results[0]['url'], reverse('incident_detail', args=[incident.pk]))
+
+    def test_bad_requests(self):
+        self.assertEqual(self.client.get(self.url, {'q': 'fire', 'limit': 'all'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'q': 'fire', 'status': 'lost'}).status_code, 400)
+        self.client.force_login(make_user('clerk'))
+        self.assertEqual(self.client.get(self.url, {'q': 'fire'}).status_code, 403)
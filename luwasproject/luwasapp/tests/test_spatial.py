@@ -0,0 +1,136 @@
+import json
+import math
+
+from django.test import TestCase
+from django.urls import reverse
+
+from luwasapp import geohash, spatial
+
+from .utils import clear_caches, make_incident, make_user
+
+
+def destination(lat, lon, bearing, distance_km):
+    # The point distance_km from (lat, lon) along `bearing` degrees, on the same sphere as haversine_km
+    phi, angle, theta = math.radians(lat), distance_km / geohash.EARTH_RADIUS_KM, math.radians(bearing)
+    phi2 = math.asin(math.sin(phi) * math.cos(angle) + math.cos(phi) * math.sin(angle) * math.cos(theta))
+    lambda2 = math.radians(lon) + math.atan2(
+        math.sin(theta) * math.sin(angle) * math.cos(phi), math.cos(angle) - math.sin(phi) * math.sin(phi2),
+    )
+    return math.degrees(phi2), (math.degrees(lambda2) + 540) % 360 - 180
+
+
+class GeohashTests(TestCase):
+    def test_encode_known_values(self):
+        self.assertEqual(geohash.encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        self.assertEqual(geohash.encode(-25.382708, -49.265506, 8), '6gkzwgjz')
+
+    def test_cover_contains_every_point_in_box(self):
+        box = (10.25, 123.80, 10.40, 123.95)
+        prefixes = geohash.cover(*box)
+        self.assertLessEqual(len(prefixes), 32)
+        for step in range(11):
+            lat = box[0] + (box[2] - box[0]) * step / 10
+            lon = box[1] + (box[3] - box[1]) * step / 10
+            self.assertTrue(any(geohash.encode(lat, lon).startswith(prefix) for prefix in prefixes), (lat, lon))
+
+    def test_cover_respects_max_cells(self):
+        prefixes = geohash.cover(-10, -10, 10, 10, max_cells=4)
+        self.assertLessEqual(len(prefixes), 4)
+        self.assertTrue(any(geohash.encode(0, 0).startswith(prefix) for prefix in prefixes))
+
+    def test_next_prefix(self):
+        self.assertEqual(geohash.next_prefix('wdq'), 'wdr')
+        self.assertEqual(geohash.next_prefix('wdz'), 'we')
+        self.assertIsNone(geohash.next_prefix('zz'))
+
+    def test_haversine(self):
+        self.assertEqual(geohash.haversine_km(10.3, 123.9, 10.3, 123.9), 0)
+        # One degree of latitude
+        self.assertAlmostEqual(geohash.haversine_km(0, 0, 1, 0), 111.195, places=2)
+        # Manila to Cebu City
+        self.assertAlmostEqual(geohash.haversine_km(14.5995, 120.9842, 10.3157, 123.8854), 571, delta=3)
+        # Across the antimeridian: the short way round
+        self.assertAlmostEqual(geohash.haversine_km(0, 179.5, 0, -179.5), 111.195, places=2)
+
+    def test_bbox_around_encloses_circle(self):
+        for lat, lon, radius in ((60, 0, 1000), (-75, 170, 500), (10.3, 123.9, 5), (0, 0, 3000), (85, 0, 100)):
+            min_lat, min_lon, max_lat, max_lon = geohash.bbox_around(lat, lon, radius)
+            for bearing in range(0, 360, 5):
+                point_lat, point_lon = destination(lat, lon, bearing, radius * 0.9999)
+                # The box's longitudes may run past +/-180
+                point_lon = min((point_lon + turn for turn in (-360, 0, 360)), key=lambda value: abs(value - lon))
+                with self.subTest(centre=(lat, lon), radius=radius, bearing=bearing):
+                    self.assertTrue(min_lat <= point_lat <= max_lat)
+                    self.assertTrue(min_lon <= point_lon <= max_lon or max_lon - min_lon >= 360)
+
+    def test_bbox_around_is_tight(self):
+        # The widest point of a 1000 km circle at 60N lies near 61.24N, 18.22E
+        min_lat, min_lon, max_lat, max_lon = geohash.bbox_around(60, 0, 1000)
+        self.assertAlmostEqual(max_lon, 18.218, places=2)
+        self.assertAlmostEqual(min_lon, -18.218, places=2)
+        self.assertAlmostEqual(max_lat - 60, 8.993, places=2)
+        # Wide enough to wrap the circle of latitude
+        self.assertEqual(geohash.bbox_around(70, 0, 2500)[1::2], (-180.0, 180.0))
+
+
+#======================================================SPATIAL======================================================#
+
+class SpatialTests(TestCase):
+    # Near the widest point of a 1000 km circle around (60, 0), where the box has least room to spare
+    CENTRE = (60.0, 0.0)
+    EDGE = (61.24, 18.218)  # 999.998 km away
+
+    def setUp(self):
+        self.edge = make_incident(latitude=self.EDGE[0], longitude=self.EDGE[1])
+        self.outside = make_incident(latitude=61.24, longitude=18.24)  # 1001 km
+        self.near = make_incident(latitude=60.1, longitude=0.1)
+        self.pole = make_incident(latitude=89.9, longitude=-120)
+        self.dateline = make_incident(latitude=-16.5, longitude=179.9)
+        self.no_coordinates = make_incident(latitude=None, longitude=None)
+
+    def ids(self, results):
+        return [incident.pk for incident, _ in results]
+
+    def test_within_radius_keeps_points_near_the_edge(self):
+        results = spatial.within_radius(*self.CENTRE, 1000)
+        self.assertEqual(self.ids(results), [self.near.pk, self.edge.pk])
+        self.assertAlmostEqual(results[1][1], 999.998, places=2)
+        self.assertEqual(self.ids(spatial.within_radius(*self.CENTRE, 1000, limit=1)), [self.near.pk])
+        self.assertEqual(self.ids(spatial.within_radius(*self.CENTRE, 1000, limit=5)), [self.near.pk, self.edge.pk])
+
+    def test_nearest_matches_brute_force(self):
+        located = [incident for incident in spatial.IncidentReport.objects.exclude(latitude=None)]
+        for lat, lon in (self.CENTRE, (-16.5, -179.9), (89, 60), (10.3, 123.9)):
+            expected = sorted(located, key=lambda incident: geohash.haversine_km(lat, lon, incident.latitude, incident.longitude))
+            for k in (1, 3, len(located) + 1):
+                with self.subTest(centre=(lat, lon), k=k):
+                    self.assertEqual(self.ids(spatial.nearest(lat, lon, k)), [incident.pk for incident in expected[:k]])
+        with self.assertRaises(ValueError):
+            spatial.nearest(*self.CENTRE, 0)
+
+    def test_nearest_within_max_radius(self):
+        self.assertEqual(self.ids(spatial.nearest(*self.CENTRE, 3, max_radius_km=1000)), [self.near.pk, self.edge.pk])
+
+    def test_in_bbox(self):
+        box = geohash.bbox_around(*self.CENTRE, 1000)
+        ids = set(spatial.in_bbox(*box).values_list('pk', flat=True))
+        self.assertEqual(ids, {self.near.pk, self.edge.pk})
+        # Crossing the antimeridian: west > east
+        self.assertEqual(list(spatial.in_bbox(-20, 179, -10, -179).values_list('pk', flat=True)), [self.dateline.pk])
+        with self.assertRaises(ValueError):
+            spatial.in_bbox(0, float('-inf'), 10, 10)
+
+    def test_geo_view_rejects_bad_input(self):
+        clear_caches()
+        self.client.force_login(make_user('staff'))
+        url = reverse('incident_geo')
+        for params in (
+            {'bbox': '-inf,0,10,10'}, {'lat': 'nan', 'lon': 0, 'radius_km': 10}, {'lat': 60, 'lon': 0, 'radius_km': 'inf'},
+            {'lat': 60, 'lon': 0, 'radius_km': -1}, {'lat': 60, 'lon': 0, 'k': 0}, {'lat': 60, 'lon': 0, 'radius_km': 10, 'limit': 0},
+            {'lat': 60},
+        ):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(url, params).status_code, 400)
+
+        response = self.client.get(url, {'lat': 60, 'lon': 0, 'radius_km': 1e9, 'limit': 2})
+        self.assertEqual([row['id'] for row in json.loads(response.content)['incidents']], [self.near.pk, self.edge.pk])
@@ -0,0 +1,119 @@
+import time
+from unittest import mock
+
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.test import TestCase, override_settings
+
+from luwasapp import sessions, users
+from luwasapp.models import Department
+
+from .utils import clear_caches, make_user
+
+
+def later(seconds):
+    # The clock the local-memory caches expire entries by, moved forward
+    return mock.patch('time.time', return_value=time.time() + seconds)
+
+
+class CachedUserTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.department = Department.objects.create(name='Fire Department')
+        self.user = make_user('responder', self.department)
+        self.backend = users.CachedUserBackend()
+
+    def test_loaded_once_with_department(self):
+        with self.assertNumQueries(1):
+            users.load(self.user.pk)
+        with self.assertNumQueries(0):
+            user = self.backend.get_user(self.user.pk)
+            self.assertEqual(user.department.name, 'Fire Department')
+
+    def test_save_invalidates(self):
+        users.load(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = 'Maria'
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(users.load(self.user.pk).first_name, 'Maria')
+        self.assertIsNone(self.backend.get_user(self.user.pk))
+
+    def test_delete_invalidates(self):
+        users.load(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        self.assertIsNone(users.load(self.user.pk))
+
+    def test_department_change_retires_every_entry(self):
+        other = make_user('other', self.department)
+        users.load(self.user.pk)
+        users.load(other.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.department.name = 'Bureau of Fire Protection'
+            self.department.save()
+        with self.assertNumQueries(2):
+            self.assertEqual(users.load(self.user.pk).department.name, 'Bureau of Fire Protection')
+            self.assertEqual(users.load(other.pk).department.name, 'Bureau of Fire Protection')
+
+    def test_invalidation_waits_for_commit(self):
+        users.load(self.user.pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user.first_name = 'Maria'
+            self.user.save()
+            self.assertEqual(users.load(self.user.pk).first_name, '')
+        self.assertEqual(len(callbacks), 1)
+
+    def test_local_entries_expire_within_the_bound(self):
+        # Another worker's invalidation never reaches this process's cache; the entry runs out instead
+        users.load(self.user.pk)
+        with later(4), self.assertNumQueries(0):
+            users.load(self.user.pk)
+        with later(6), self.assertNumQueries(1):
+            users.load(self.user.pk)
+
+
+class LocalTimeoutTests(TestCase):
+    def test_capped_for_a_local_cache(self):
+        local = caches['default']
+        self.assertFalse(users.is_shared(local))
+        for timeout, capped in ((None, 5), (DEFAULT_TIMEOUT, 5), (users.TIMEOUT, 5), (2, 2)):
+            self.assertEqual(users.local_timeout(local, timeout), capped, timeout)
+        with override_settings(LOCAL_AUTH_CACHE_TIMEOUT=30):
+            self.assertEqual(users.local_timeout(local, users.TIMEOUT), 30)
+
+    def test_unchanged_for_a_shared_cache(self):
+        shared = object()
+        self.assertTrue(users.is_shared(shared))
+        self.assertEqual(users.local_timeout(shared, users.TIMEOUT), users.TIMEOUT)
+        self.assertIsNone(users.local_timeout(shared, None))
+
+
+class SessionTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.session = sessions.SessionStore()
+        self.session['user'] = 'responder'
+        self.session.save()
+        self.cache = caches['sessions']
+
+    def test_local_cache_entries_are_capped(self):
+        self.assertIsInstance(self.session._cache, sessions._CappedCache)
+        self.assertIsNotNone(self.cache.get(self.session.cache_key))
+        with later(6):
+            self.assertIsNone(self.cache.get(self.session.cache_key))
+            # Still in the database, for the session's whole lifetime
+            self.assertEqual(sessions.SessionStore(self.session.session_key)['user'], 'responder')
+        self.assertIsNotNone(self.cache.get(self.session.cache_key))
+
+    def test_logout_elsewhere_is_seen_within_the_bound(self):
+        # As if another worker deleted the session: only the database row goes
+        Session.objects.filter(session_key=self.session.session_key).delete()
+        self.assertEqual(sessions.SessionStore(self.session.session_key).get('user'), 'responder')
+        with later(6):
+            self.assertIsNone(sessions.SessionStore(self.session.session_key).get('user'))
+
+    def test_shared_cache_is_not_capped(self):
+        with mock.patch.object(users, 'is_shared', return_value=True):
+            self.assertNotIsInstance(sessions.SessionStore()._cache, sessions._CappedCache)
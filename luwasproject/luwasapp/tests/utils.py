@@ -0,0 +1,24 @@
+from django.core.cache import caches
+
+from luwasapp.models import IncidentReport, User
+
+# Fixtures shared by the test modules
+
+
+def make_user(username, department=None, **fields):
+    return User.objects.create_user(username, f'{username}@luwas.test', 'password', department=department, **fields)
+
+
+def make_incident(category='fire_incident', status='reported', **fields):
+    fields = {
+        'incident_type': 'Fire', 'description': 'Kitchen fire', 'severity': 'high', 'location': 'Cebu City',
+        'latitude': 10.3157, 'longitude': 123.8854, **fields,
+    }
+    return IncidentReport.objects.create(category=category, status=status, **fields)
+
+
+def clear_caches():
+    # Test databases reuse ids after each rollback, so a user or session cached by an earlier test
+    # would otherwise be served for a different row
+    for cache in caches.all():
+        cache.clear()
@@ -7,6 +7,7 @@ urlpatterns = [
     path('login/', views.login_view, name='login'),
     path('signup/', views.signup_view, name='signup'),
     path('dashboard/', views.dashboard_view, name='dashboard'),
+    path('api/dashboard/', views.dashboard_api_view, name='dashboard_api'),
     path('logout/', views.logout_view, name='logout'),
 
     # User Management
@@ -14,6 +15,7 @@ urlpatterns = [
     path('profile/', views.user_profile_view, name='user_profile'),
     path('update_user/', views.update_user_view, name='update_user'),
     path('delete_user/', views.delete_user_view, name='delete_user'),
+    path('avatars/<str:name>', views.avatar_view, name='avatar'),
     
     # Incident Reports Management
     path('incidents/new/', views.incident_create_view, name='incident_create'),
@@ -21,12 +23,25 @@ urlpatterns = [
     path('incidents/<int:pk>/', views.incident_detail_view, name='incident_detail'), 
     path('incidents/<int:pk>/update/', views.incident_update_view, name='incident_update'),
     path('incidents/<int:pk>/delete/', views.incident_delete_view, name='incident_delete'),
+    path('incidents/<int:pk>/card/', views.incident_card_view, name='incident_card'),
+    path('incidents/events/', views.incident_events_view, name='incident_events'),
+    path('api/incidents/geo/', views.incident_geo_view, name='incident_geo'),
+    path('api/incidents/search/', views.incident_search_view, name='incident_search'),
+    path('api/incidents/<int:pk>/dispatch/', views.incident_dispatch_view, name='incident_dispatch'),
+    path('incidents/<int:pk>/attachments/', views.attachment_create_view, name='attachment_create'),
+    path('attachments/<int:attachment_id>/upload/', views.attachment_upload_view, name='attachment_upload'),
+    path('attachments/<int:attachment_id>/', views.attachment_file_view, name='attachment_file'),
+    path('attachments/thumbs/<str:name>', views.attachment_thumbnail_view, name='attachment_thumbnail'),
 
     #Incident Assignment Management
     path('assignments/', views.incident_assignment_list, name='incident_assignment_list'),
     path('admin/assign/<int:user_id>/', views.assign_user_to_incident_admin, name='assign_user'),
+    path('admin/assign/bulk/', views.bulk_assign_view, name='bulk_assign'),
 
     #Admin
     path('admin/users/', views.list_users_view, name='list_users'),
     path('admin/users/edit/<int:user_id>/', views.edit_user_view, name='edit_user'),
+    path('admin/geocode/stats/', views.geocode_stats_view, name='geocode_stats'),
+    path('admin/export/<str:kind>/', views.export_view, name='export'),
+    path('metrics', views.metrics_view, name='metrics'),
 ]
@@ -0,0 +1,73 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+from . import replicas
+
+# The logged-in user, cached with its department and establishment so a warm request loads it without
+# a query, and templates reading request.user.department don't add one. A user's entry is dropped
+# when the user is saved or deleted (signals.py); department and establishment changes bump a
+# version stamp that retires every entry.
+#
+# Invalidation only reaches the cache it runs against. With a per-process cache (LocMem, the
+# default), other workers would keep a deactivated user, or the password hash old sessions are
+# checked against, until the entry expires; there entries last LOCAL_AUTH_CACHE_TIMEOUT seconds.
+# Point CACHES at Redis or Memcached (LUWAS_REDIS_URL) to keep them for TIMEOUT.
+
+TIMEOUT = 15 * 60
+VERSION_KEY = 'users:version'
+
+
+def is_shared(backend):
+    # Whether every worker sees the same entries
+    return not isinstance(backend, (LocMemCache, DummyCache))
+
+
+def local_timeout(backend, timeout):
+    # `timeout`, capped for caches only this process sees
+    if is_shared(backend):
+        return timeout
+    cap = getattr(settings, 'LOCAL_AUTH_CACHE_TIMEOUT', 5)
+    return cap if timeout is None or timeout is DEFAULT_TIMEOUT else min(timeout, cap)
+
+
+def _key(user_id):
+    return f'users:{user_id}'
+
+
+def load(user_id):
+    key = _key(user_id)
+    cached = cache.get_many([VERSION_KEY, key])
+    version = cached.get(VERSION_KEY, 0)
+    entry = cached.get(key)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+
+    # From the primary: a user read from a lagging replica would be cached past the invalidation
+    from .models import User
+    with replicas.use_primary():
+        user = User.objects.select_related('department', 'establishment').filter(pk=user_id).first()
+    if user is not None:
+        cache.set(key, (version, user), local_timeout(caches['default'], TIMEOUT))
+    return user
+
+
+def invalidate(user_id):
+    transaction.on_commit(lambda: cache.delete(_key(user_id)))
+
+
+def invalidate_all():
+    transaction.on_commit(lambda: cache.set(VERSION_KEY, time.time_ns(), None))
+
+
+class CachedUserBackend(ModelBackend):
+    # ModelBackend, with the per-request user lookup answered from the cache
+    def get_user(self, user_id):
+        user = load(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
@@ -1,24 +1,33 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponseForbidden
-import requests
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
 
 from django.contrib import messages
+from django.core.handlers.asgi import ASGIRequest
 
 
 from .forms import SignupForm, LoginForm, IncidentReportForm
-from .models import IncidentReport, Establishment, Department, IncidentAssignment, User
+from .models import IncidentReport, Establishment, Department, IncidentAssignment, IncidentAttachment, User
 
 from .utils import get_location_from_coordinates
+from . import attachments, avatars, board, dashboard, dispatch, events, exporting, fragments, geocoding, metrics, replicas, routing, search, spatial
+from .replicas import replica_reads
+from .assignments import bulk_assign
 
 
+from django.conf import settings
 from django.contrib.auth.decorators import user_passes_test
 from django.contrib.admin.views.decorators import staff_member_required
-from django.db.models import Count
+from django.utils.crypto import constant_time_compare
+from django.db import transaction
+from django.views.decorators.http import condition, require_POST
 import json
 
+from asgiref.sync import sync_to_async
+
 
 #======================================================GENERAL VIEW======================================================#
 #Homepage view
@@ -27,20 +36,12 @@ def home_view(request):
 
 # Dashboard view
 @login_required
+@replica_reads
 def dashboard_view(request):
     user = request.user
 
-    # Group incidents by category and count them
-    incidents_by_category = list(IncidentReport.objects.values('category').annotate(count=Count('category')).order_by('-count'))
-
-    # Group incidents by status and count them
-    incidents_by_status = list(IncidentReport.objects.values('status').annotate(count=Count('status')).order_by('-count'))
-
-    # Group user's assigned incidents by category and count them
-    user_incidents_by_category = list(IncidentAssignment.objects.filter(user=user).values('incident_report__category').annotate(count=Count('incident_report__category')).order_by('-count'))
-
-    # Group user's assigned incidents by status and count them
-    user_incidents_by_status = list(IncidentAssignment.objects.filter(user=user).values('incident_report__status').annotate(count=Count('incident_report__status')).order_by('-count'))
+    # Pre-aggregated counts, kept up to date on every incident and assignment write
+    series = dashboard.series(user)
 
     # Mapping of category/status keys to display names
     category_display_names = {
@@ -75,15 +76,27 @@ def dashboard_view(request):
 
     context = {
         'user': user,
-        'incidents_by_category': json.dumps(incidents_by_category),
-        'incidents_by_status': json.dumps(incidents_by_status),
-        'user_incidents_by_category': json.dumps(user_incidents_by_category),
-        'user_incidents_by_status': json.dumps(user_incidents_by_status),
+        'incidents_by_category': json.dumps(series['incidents_by_category']),
+        'incidents_by_status': json.dumps(series['incidents_by_status']),
+        'user_incidents_by_category': json.dumps(series['user_incidents_by_category']),
+        'user_incidents_by_status': json.dumps(series['user_incidents_by_status']),
         'category_display_names': json.dumps(category_display_names),
         'status_display_names': json.dumps(status_display_names)
     }
     return render(request, 'general/dashboard.html', context)
 
+# Dashboard chart data for polling; answers 304 until the user's or the global counts change
+@login_required
+@replica_reads
+@condition(
+    etag_func=lambda request: dashboard.etag(request.user.pk),
+    last_modified_func=lambda request: dashboard.last_modified(request.user.pk),
+)
+def dashboard_api_view(request):
+    response = JsonResponse(dashboard.series(request.user))
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
 #======================================================USER VIEW======================================================#
 #Signup view
 def signup_view(request):
@@ -150,8 +163,12 @@ def update_user_view(request):
         user.birth_date = request.POST['birth_date']
         
         if 'profile_image' in request.FILES:
-            user.profile_image = request.FILES['profile_image']
-        
+            try:
+                avatars.save_upload(user, request.FILES['profile_image'])
+            except ValueError as error:
+                return render(request, 'profile/update_user.html', {'user': user, 'image_error': str(error)}, status=400)
+
+        # Thumbnails are queued once this commits (signals.py)
         user.save()
         return redirect('user_profile')
     return render(request, 'profile/update_user.html', {'user': user})
@@ -165,6 +182,17 @@ def delete_user_view(request):
         return redirect('login')
     return render(request, 'profile/delete_user.html', {'user': user})
 
+# Profile image thumbnails; their names are content hashes, so browsers may keep them for good
+@login_required
+def avatar_view(request, name):
+    path = avatars.thumbnail_path(name)
+    storage = User._meta.get_field('profile_image').storage
+    if path is None or not storage.exists(path):
+        raise Http404('No such avatar.')
+    response = FileResponse(storage.open(path), content_type='image/webp' if name.endswith('.webp') else 'image/jpeg')
+    response['Cache-Control'] = f'private, max-age={avatars.CACHE_SECONDS}, immutable'
+    return response
+
 
 #======================================================INCIDENT VIEW======================================================#
 
@@ -185,7 +213,11 @@ def incident_create_view(request):
             incident.latitude = latitude
             incident.longitude = longitude
             incident.location = location
-            incident.save()
+            with transaction.atomic():
+                incident.save()
+
+            # Resolve the address once, in the background
+            geocoding.enqueue(incident)
 
             return redirect('home')  # Redirect to a home page
     else:
@@ -197,6 +229,7 @@ def incident_create_view(request):
 
 #Incident Detail View
 @login_required
+@replica_reads
 def incident_detail_view(request, pk):
     # Get the incident report
     incident = get_object_or_404(IncidentReport, pk=pk)
@@ -204,30 +237,54 @@ def incident_detail_view(request, pk):
     # Check if the user is assigned to this incident
     is_assigned = IncidentAssignment.objects.filter(incident_report=incident, user=request.user).exists()
 
-    # Fetch location details from Nominatim
-    location_details = {}
-    if incident.latitude and incident.longitude:
-        NOMINATIM_URL = "https://nominatim.openstreetmap.org/reverse"
-        params = {
-            "lat": incident.latitude,
-            "lon": incident.longitude,
-            "format": "json",
-        }
-        try:
-            response = requests.get(NOMINATIM_URL, params=params)
-            if response.status_code == 200:
-                location_details = response.json()
-        except requests.RequestException as e:
-            # Log error in production
-            print(f"Error fetching location details: {e}")
+    # Location details are resolved at write time; until then use whatever the geocode cache already has
+    if incident.geocode_status == 'resolved':
+        location_details = incident.location_details
+    else:
+        location_details = geocoding.reverse_geocode(incident.latitude, incident.longitude, allow_network=False)
+
+    # Staff get the nearest establishments that respond to this category, to assign from
+    suggestions = dispatch.suggest(incident) if request.user.is_staff else []
 
     # Render the template
     return render(request, 'incident/detail.html', {
         'incident': incident,
         'is_assigned': is_assigned,
         'location_details': location_details,
+        'suggestions': suggestions,
     })
 
+# Nearest-responder suggestions for one incident
+@staff_member_required
+@replica_reads
+def incident_dispatch_view(request, pk):
+    incident = get_object_or_404(IncidentReport.objects.only('reportid', 'category', 'latitude', 'longitude'), pk=pk)
+    try:
+        limit = min(int(request.GET.get('limit', dispatch.SUGGESTION_LIMIT)), 50)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be a number.'}, status=400)
+
+    return JsonResponse({'suggestions': [
+        {
+            'establishment': {
+                'id': suggestion['establishment'].pk,
+                'name': suggestion['establishment'].name,
+                'department': suggestion['establishment'].department.name,
+            },
+            'distance_km': round(suggestion['distance_km'], 3),
+            'responders': [
+                {
+                    'id': responder.pk,
+                    'username': responder.username,
+                    'open_assignments': responder.open_assignments,
+                    'assigned': responder.assigned_here,
+                }
+                for responder in suggestion['responders']
+            ],
+        }
+        for suggestion in dispatch.suggest(incident, limit=limit)
+    ]})
+
 
 #Update Incident View
 @login_required
@@ -236,7 +293,10 @@ def incident_update_view(request, pk):
     if request.method == 'POST':
         form = IncidentReportForm(request.POST, instance=incident)
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                incident = form.save()
+            if 'latitude' in form.changed_data or 'longitude' in form.changed_data:
+                geocoding.enqueue(incident)
             return redirect('incident_detail', pk=pk)
     else:
         form = IncidentReportForm(instance=incident)
@@ -252,139 +312,268 @@ def incident_delete_view(request, pk):
     return render(request, 'incident/delete.html', {'incident': incident})
 
 @login_required
+@replica_reads
 def incident_list_view(request):
     if not request.user.department:
         # If the user doesn't belong to any department, deny access
         return render(request, 'general/not_assigned.html')
     
-    # Map categories to departments (create this mapping as needed)
-    category_to_department = {
-        'fire_incident': ['Fire Department', 'Medical Department', 'Emergency Response'],
-        'medical_emergency': ['Medical Department', 'Emergency Response'],
-        'road_accident': ['Transportation Department', 'Medical Department'],
-        'natural_disaster': ['Disaster Response', 'Emergency Management Department'],
-        'crime_related': ['Police Department', 'Law Enforcement'],
-        'domestic_violence': ['Social Services', 'Domestic Violence Response Team'],
-        'psychological_crisis': ['Mental Health Services', 'Crisis Intervention Team'],
-        'missing_person': ['Police Department', 'Missing Persons Unit'],
-        'poisoning': ['Poison Control Center', 'Health Department'],
-        'gas_leak': ['Fire Department', 'Hazardous Materials (HazMat) Team'],
-        'electrical_hazard': ['Electrical Utility Company', 'Fire Department'],
-        'hazardous_materials': ['Hazardous Materials (HazMat) Response', 'Environmental Protection Agency'],
-        'flooding': ['Emergency Management', 'Flood Control Department'],
-        'earthquake': ['Emergency Management', 'Geological Survey Department'],
-        'typhoon': ['National Disaster Risk Reduction and Management Council (NDRRMC)', 'Emergency Management'],
-        'animal_attack': ['Animal Control', 'Emergency Medical Services (EMS)'],
-        'terrorist_threat': ['Counter-Terrorism Unit', 'National Security Agency'],
-        'building_collapse': ['Fire Department', 'Rescue and Emergency Response'],
-        'public_disturbance': ['Public Safety', 'Police Department'],
-        'child_abuse': ['Child Protective Services', 'Social Services'],
-        'elderly_abuse': ['Adult Protective Services', 'Social Services']
-    }
+    # Categories routed to the user's department (cached inverted index)
+    relevant_categories = routing.categories_for_department(request.user.department)
 
-    # Get the department name of the logged-in user
-    user_department_name = request.user.department.name
+    # "Load more" for a single column, continuing after that column's cursor
+    status = request.GET.get('status')
+    if status in board.BOARD_STATUSES and 'after' in request.GET:
+        columns = board.load_board(relevant_categories, [status], {status: board.decode_cursor(request.GET['after'])})
+        fragments.prefetch('card', columns[status]['incidents'])
+        return render(request, 'incident/_cards.html', {'status': status, 'column': columns[status]})
 
-    # Filter categories where the user's department is involved
-    relevant_categories = [
-        category for category, departments in category_to_department.items()
-        if user_department_name in departments
-    ]
-    
-    # Group incidents by their status
-    statuses = ['reported', 'resolved', 'closed']
-    incidents_by_status = {
-        status: IncidentReport.objects.filter(
-            category__in=relevant_categories, status=status
-        ).order_by('-timestamp')
-        for status in statuses
-    }
+    # First page of every status column, in a single query; cards of unchanged incidents come from the cache
+    columns = board.load_board(relevant_categories)
+    fragments.prefetch('card', [incident for column in columns.values() for incident in column['incidents']])
 
-    return render(request, 'incident/list.html', {'incidents_by_status': incidents_by_status})
+    return render(request, 'incident/list.html', {'board': columns})
+
+# One card, for the live feed to insert into the board. Read from the primary: it is fetched the
+# moment the incident is published, possibly before a replica has it.
+@login_required
+def incident_card_view(request, pk):
+    incident = get_object_or_404(IncidentReport.objects.only(*board.CARD_FIELDS), pk=pk)
+    if incident.category not in routing.categories_for_department(request.user.department_id):
+        raise Http404
+    return render(request, 'incident/_card.html', {'incident': incident})
+
+# Live feed (server-sent events): new incidents, moves between columns and the user's own assignments.
+# Under ASGI, luwasapp.live serves this path before Django's handler so idle clients don't hold a thread.
+# A WSGI server (runserver included) would read the endless stream to the end before sending any of
+# it, so there each request gets what it missed and closes, and the browser polls (sse_catch_up).
+@login_required
+async def incident_events_view(request):
+    user = await request.auser()
+    if not user.department_id:
+        return HttpResponseForbidden('You are not assigned to a department.')
+    categories = await sync_to_async(routing.categories_for_department)(user.department_id)
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    accept = events.feed_filter(user.pk, categories)
+
+    if isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(events.sse_stream(accept, last_event_id), content_type='text/event-stream')
+    else:
+        response = HttpResponse(events.sse_catch_up(accept, last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+# Incidents for the map views: ?bbox=west,south,east,north, ?lat=&lon=&radius_km= or ?lat=&lon=&k=
+GEO_MAX_RESULTS = 2000
+
+@login_required
+@replica_reads
+def incident_geo_view(request):
+    try:
+        limit = min(int(request.GET.get('limit', 500)), GEO_MAX_RESULTS)
+        if limit < 1:
+            raise ValueError('limit must be at least 1.')
+        incidents = IncidentReport.objects.only('reportid', 'incident_type', 'category', 'status', 'latitude', 'longitude')
+        if request.GET.get('status'):
+            incidents = incidents.filter(status=request.GET['status'])
+
+        if 'bbox' in request.GET:
+            west, south, east, north = (float(value) for value in request.GET['bbox'].split(','))
+            matches = [(incident, None) for incident in spatial.in_bbox(south, west, north, east, incidents).order_by('-timestamp')[:limit]]
+        else:
+            lat, lon = float(request.GET['lat']), float(request.GET['lon'])
+            if 'k' in request.GET:
+                matches = spatial.nearest(lat, lon, min(int(request.GET['k']), limit), incidents)
+            else:
+                radius_km = float(request.GET['radius_km'])
+                if radius_km < 0:
+                    raise ValueError('radius_km must not be negative.')
+                matches = spatial.within_radius(lat, lon, radius_km, incidents, limit=limit)
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'Pass bbox=west,south,east,north, or lat, lon and radius_km or k.'}, status=400)
+
+    return JsonResponse({'incidents': [
+        {
+            'id': incident.reportid,
+            'incident_type': incident.incident_type,
+            'category': incident.category,
+            'status': incident.status,
+            'latitude': incident.latitude,
+            'longitude': incident.longitude,
+            'distance_km': None if distance is None else round(distance, 3),
+            'url': reverse('incident_detail', args=[incident.reportid]),
+        }
+        for incident, distance in matches
+    ]})
+
+
+# Typeahead search over the user's department's incidents: ?q=&status=&limit=, best matches first
+@login_required
+@replica_reads
+def incident_search_view(request):
+    if not request.user.department_id:
+        return JsonResponse({'error': 'You are not assigned to a department.'}, status=403)
+    try:
+        limit = int(request.GET.get('limit', 10))
+    except ValueError:
+        return JsonResponse({'error': 'limit must be a number.'}, status=400)
+    status = request.GET.get('status') or None
+    if status is not None and status not in dict(IncidentReport.STATUS_CHOICES):
+        return JsonResponse({'error': 'Unknown status.'}, status=400)
+
+    matches = search.search(
+        request.GET.get('q', ''), routing.categories_for_department(request.user.department_id), status, limit,
+    )
+    return JsonResponse({'incidents': [
+        {
+            'id': incident.reportid,
+            'incident_type': incident.incident_type,
+            'category': incident.category,
+            'status': incident.status,
+            'location': incident.location,
+            'timestamp': incident.timestamp,
+            'score': None if score is None else round(score, 4),
+            'url': reverse('incident_detail', args=[incident.reportid]),
+        }
+        for incident, score in matches
+    ]})
+
+
+#======================================================INCIDENT ATTACHMENTS======================================================#
+
+# Start a photo upload: JSON {"filename", "size"} -> the upload URL and chunk size (see attachments.py)
+@login_required
+@require_POST
+def attachment_create_view(request, pk):
+    incident = get_object_or_404(IncidentReport.objects.only('reportid'), pk=pk)
+    try:
+        data = json.loads(request.body)
+        attachment = attachments.start(incident, request.user, data.get('filename'), data.get('size'))
+    except (ValueError, AttributeError) as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    return JsonResponse(attachments.upload_state(attachment), status=201)
+
+# Resumable upload: GET tells how many bytes have arrived, PUT sends the next chunk from there with
+# Content-Range: bytes <first>-<last>/<size>
+@login_required
+def attachment_upload_view(request, attachment_id):
+    attachment = get_object_or_404(IncidentAttachment, pk=attachment_id, uploaded_by=request.user)
+    if request.method == 'PUT':
+        try:
+            attachment = attachments.receive(attachment, request.headers.get('Content-Range', ''), request)
+        except attachments.OffsetMismatch as mismatch:
+            return JsonResponse({**attachments.upload_state(mismatch.attachment), 'error': str(mismatch)}, status=409)
+        except ValueError as error:
+            return JsonResponse({**attachments.upload_state(attachment), 'error': str(error)}, status=400)
+    elif request.method != 'GET':
+        return HttpResponseNotAllowed(['GET', 'PUT'])
+    return JsonResponse(attachments.upload_state(attachment))
+
+# The uploaded photo, with Range support
+@login_required
+def attachment_file_view(request, attachment_id):
+    attachment = get_object_or_404(IncidentAttachment.objects.exclude(file=''), pk=attachment_id)
+    return attachments.serve(request, attachment.file.storage, attachment.file.name, attachment.content_type)
+
+# Photo thumbnails; their names are content hashes, so browsers may keep them for good
+@login_required
+def attachment_thumbnail_view(request, name):
+    path = attachments.thumbnail_path(name)
+    storage = IncidentAttachment._meta.get_field('file').storage
+    if path is None or not storage.exists(path):
+        raise Http404('No such thumbnail.')
+    return attachments.serve(request, storage, path, 'image/webp' if name.endswith('.webp') else 'image/jpeg')
 
 
 #============================Incident Assignment====================================================================
 
 @login_required
+@replica_reads
 def incident_assignment_list(request):
-    assignments = IncidentAssignment.objects.filter(user=request.user)
+    assignments = IncidentAssignment.objects.filter(user=request.user).select_related('incident_report')
+    fragments.prefetch('assignment_card', [assignment.incident_report for assignment in assignments])
     return render(request, 'incident_assignment/incident_assignment_list.html', {'assignments': assignments})
 
-# Mapping of incident categories to departments
-category_to_department = {
-    'fire_incident': ['Fire Department', 'Medical Department', 'Emergency Response'],
-    'medical_emergency': ['Medical Department', 'Emergency Response'],
-    'road_accident': ['Transportation Department', 'Medical Department'],
-    'natural_disaster': ['Disaster Response', 'Emergency Management Department'],
-    'crime_related': ['Police Department', 'Law Enforcement'],
-    'domestic_violence': ['Social Services', 'Domestic Violence Response Team'],
-    'psychological_crisis': ['Mental Health Services', 'Crisis Intervention Team'],
-    'missing_person': ['Police Department', 'Missing Persons Unit'],
-    'poisoning': ['Poison Control Center', 'Health Department'],
-    'gas_leak': ['Fire Department', 'Hazardous Materials (HazMat) Team'],
-    'electrical_hazard': ['Electrical Utility Company', 'Fire Department'],
-    'hazardous_materials': ['Hazardous Materials (HazMat) Response', 'Environmental Protection Agency'],
-    'flooding': ['Emergency Management', 'Flood Control Department'],
-    'earthquake': ['Emergency Management', 'Geological Survey Department'],
-    'typhoon': ['National Disaster Risk Reduction and Management Council (NDRRMC)', 'Emergency Management'],
-    'animal_attack': ['Animal Control', 'Emergency Medical Services (EMS)'],
-    'terrorist_threat': ['Counter-Terrorism Unit', 'National Security Agency'],
-    'building_collapse': ['Fire Department', 'Rescue and Emergency Response'],
-    'public_disturbance': ['Public Safety', 'Police Department'],
-    'child_abuse': ['Child Protective Services', 'Social Services'],
-    'elderly_abuse': ['Adult Protective Services', 'Social Services']
-}
+from django.core.paginator import Paginator
+from django.db.models import Exists, OuterRef
+from django.utils.http import url_has_allowed_host_and_scheme
 
-from django.urls import reverse
+ASSIGNABLE_INCIDENTS_PER_PAGE = 50
 
+@replica_reads
 def assign_user_to_incident_admin(request, user_id):
-    users = User.objects.all()
-    incidents = IncidentReport.objects.all()
-
     # Get the user who will be assigned
-    user_to_assign = get_object_or_404(User, id=user_id)
+    user_to_assign = get_object_or_404(User.objects.select_related('department'), id=user_id)
 
-    # Assuming the user has a 'department' field or related model, we can get the department
-    user_department = getattr(user_to_assign, 'department', None)
+    user_department = user_to_assign.department
     if not user_department:
         messages.error(request, 'User department not found.')
-        return redirect('assign_user')
-
-    # Convert the department to a string
-    user_department_str = str(user_department).lower()
-
-    # Filter incidents based on the user's department and category
-    filtered_incidents = []
-    for incident in incidents:
-        incident_category = getattr(incident, 'category', None)
-        if not incident_category:
-            messages.error(request, f'Incident {incident.id} does not have a category.')
-            continue
-        incident_category = incident_category.lower()
-        allowed_departments = category_to_department.get(incident_category, [])
-        if user_department_str in [dept.lower() for dept in allowed_departments]:
-            filtered_incidents.append(incident)
+        return redirect('list_users')
 
     if request.method == 'POST':
-        incident_reportid = request.POST['incident']
-        incident = get_object_or_404(IncidentReport, reportid=incident_reportid)
+        incident_ids = [value for value in request.POST.getlist('incident') if value.isdigit()]
+        created, already_assigned = bulk_assign([user_to_assign.pk], incident_ids)
+        if len(created) == 1:
+            messages.success(request, f'{user_to_assign.username} has been assigned to Incident {created[0].incident_report_id}.')
+        elif created:
+            messages.success(request, f'{user_to_assign.username} has been assigned to {len(created)} incidents.')
+        if already_assigned:
+            messages.info(request, f'{user_to_assign.username} was already assigned to {already_assigned} of the selected incidents.')
+
+        # Stay on the same page and filter
+        url = reverse('assign_user', args=[user_id])
+        if request.GET:
+            url = f'{url}?{request.GET.urlencode()}'
+        return redirect(url)
+
+    # Open incidents in categories routed to the user's department, filtered and paginated by the database
+    unassigned_only = request.GET.get('unassigned') == '1'
+    incidents = (
+        routing.incidents_for_department(user_department)
+        .exclude(status__in=['closed', 'resolved'])
+        .only('reportid', 'category', 'status')
+        .annotate(assigned_to_user=Exists(
+            IncidentAssignment.objects.filter(incident_report=OuterRef('pk'), user=user_to_assign)
+        ))
+        .order_by('-timestamp', '-reportid')
+    )
+    if unassigned_only:
+        incidents = incidents.filter(~Exists(IncidentAssignment.objects.filter(incident_report=OuterRef('pk'))))
+
+    page = Paginator(incidents, ASSIGNABLE_INCIDENTS_PER_PAGE).get_page(request.GET.get('page'))
 
-        assignment, created = IncidentAssignment.objects.get_or_create(
-            user=user_to_assign,
-            incident_report=incident
-        )
-        if created:
-            messages.success(request, f'{user_to_assign.username} has been assigned to Incident {incident.reportid}.')
-        else:
-            messages.info(request, f'{user_to_assign.username} is already assigned to Incident {incident.reportid}.')
-        
-        return redirect(reverse('assign_user', args=[user_id]))
-    
     return render(request, 'incident_assignment/assign_user.html', {
-        'users': users, 
-        'incidents': filtered_incidents,  # Pass the filtered incidents
+        'incidents': page.object_list,
+        'page': page,
+        'unassigned_only': unassigned_only,
         'user_to_assign': user_to_assign  # Pass the user to be assigned
     })
+
+# Bulk assignment: one responder to many incidents, or many responders to one
+@staff_member_required
+@require_POST
+def bulk_assign_view(request):
+    user_ids = request.POST.getlist('user')
+    incident_ids = request.POST.getlist('incident')
+    if not all(value.isdigit() for value in user_ids + incident_ids):
+        return JsonResponse({'error': 'user and incident must be ids.'}, status=400)
+
+    created, already_assigned = bulk_assign(user_ids, incident_ids)
+
+    if request.headers.get('Accept', '').startswith('application/json'):
+        return JsonResponse({
+            'created': [[assignment.user_id, assignment.incident_report_id] for assignment in created],
+            'already_assigned': already_assigned,
+        })
+
+    messages.success(request, f'Created {len(created)} assignments ({already_assigned} already existed).')
+    next_url = request.POST.get('next')
+    if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}, require_https=request.is_secure()):
+        next_url = reverse('list_users')
+    return redirect(next_url)
+
 #====================================Admin View=====================================================================
 @staff_member_required
 def list_users_view(request):
@@ -398,6 +587,31 @@ def edit_user_view(request, user_id):
 
 
 #====================================Admin View=====================================================================
+# Streaming CSV/NDJSON export: ?format=csv|ndjson&since=&until=&category=...&department=<id>&gzip=1
+@staff_member_required
+@replica_reads
+def export_view(request, kind):
+    fmt = request.GET.get('format', 'csv')
+    if kind not in exporting.EXPORTS or fmt not in exporting.FORMATS:
+        raise Http404
+    try:
+        filters = exporting.parse_filters(
+            request.GET.get('since'), request.GET.get('until'),
+            request.GET.getlist('category'), request.GET.get('department'),
+        )
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    compress = request.GET.get('gzip') == '1'
+    response = StreamingHttpResponse(
+        # Pinned: the rows are read after the view has returned
+        exporting.stream(kind, fmt, exporting.queryset(kind, filters).using(replicas.read_alias()), compress),
+        content_type='application/gzip' if compress else f'{exporting.FORMATS[fmt]}; charset=utf-8',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{exporting.filename(kind, fmt, compress)}"'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @staff_member_required
 def list_users_view(request):
     users = User.objects.all()
@@ -443,3 +657,15 @@ def edit_user_view(request, user_id):
     }
     return render(request, 'admin/edit_user.html', context)
 
+@staff_member_required
+def geocode_stats_view(request):
+    return JsonResponse(geocoding.stats())
+
+# Prometheus scrape endpoint: staff in the browser, or a scraper with the METRICS_TOKEN bearer token
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    if not (request.user.is_authenticated and request.user.is_staff) and not (
+        token and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    ):
+        return HttpResponseForbidden('Staff only.')
+    return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -2,6 +2,7 @@
 ASGI config for luwasproject project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+The live incident feed is served by luwasapp.live in front of Django's handler.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -13,4 +14,8 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'luwasproject.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from luwasapp.live import LiveFeedApplication  # noqa: E402 (needs the app registry loaded above)
+
+application = LiveFeedApplication(django_application)
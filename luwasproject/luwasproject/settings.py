@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,7 +43,13 @@ INSTALLED_APPS = [
 
 AUTH_USER_MODEL =  "luwasapp.User"
 
+# Loads the logged-in user (with department and establishment) from the cache; see luwasapp/users.py.
+# Sessions made under the previous backend log in again once.
+AUTHENTICATION_BACKENDS = ['luwasapp.users.CachedUserBackend']
+
 MIDDLEWARE = [
+    'luwasapp.metrics.MetricsMiddleware',
+    'luwasapp.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,7 +65,6 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'luwasapp/templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -66,6 +72,14 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Compiled templates are kept per process, so the card include isn't re-parsed for every card.
+            # runserver still reloads them when a template changes.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -75,13 +89,123 @@ WSGI_APPLICATION = 'luwasproject.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
+# LUWAS_DB_PROFILE picks the layout:
+#   sqlite             one SQLite file (LUWAS_SQLITE_PATH, e.g. one filled by `manage.py seed_data` for benchmarks)
+#   sqlite-production  the same file tuned for concurrent writers (SQLITE_PRODUCTION below)
+#   sqlite-replica     tuned, plus a second file read as a replica (LUWAS_REPLICA_SQLITE_PATH); refresh it
+#                      with `manage.py sync_replica`
+#   postgres           a primary (LUWAS_PG_HOST) and a replica (LUWAS_PG_REPLICA_HOST, by default the same
+#                      server), with persistent connections
+# Views marked @replica_reads read from the 'replica' alias when there is one (see luwasapp/replicas.py).
+# `manage.py stress_sqlite_writes` compares stock and tuned SQLite under concurrent writers.
+
+DB_PROFILE = os.environ.get('LUWAS_DB_PROFILE', 'sqlite')
+# Seconds a connection is reused across requests (production profiles); health-checked before reuse
+CONN_MAX_AGE = int(os.environ.get('LUWAS_CONN_MAX_AGE', 600))
+
+SQLITE_PRODUCTION = {
+    'OPTIONS': {
+        # Take the write lock when a transaction starts, so concurrent writers wait their turn (busy_timeout)
+        # instead of failing with "database is locked" when a read lock can't be upgraded
+        'transaction_mode': 'IMMEDIATE',
+    },
+    # Set on every new connection by luwasapp.database
+    'PRAGMAS': {
+        'journal_mode': 'wal',              # readers and the writer don't block each other
+        'synchronous': 'normal',            # fsync at checkpoints; a power cut may lose the last commits, never corrupts
+        'busy_timeout': 5000,               # ms a writer waits for the lock
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -32000,               # KiB of page cache per connection
+        'temp_store': 'memory',
+    },
+    'CONN_MAX_AGE': CONN_MAX_AGE,
+    'CONN_HEALTH_CHECKS': True,
+}
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+if DB_PROFILE == 'postgres':
+    _postgres = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('LUWAS_PG_NAME', 'luwas'),
+        'USER': os.environ.get('LUWAS_PG_USER', 'luwas'),
+        'PASSWORD': os.environ.get('LUWAS_PG_PASSWORD', ''),
+        'PORT': os.environ.get('LUWAS_PG_PORT', '5432'),
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
     }
-}
+    DATABASES = {
+        'default': {**_postgres, 'HOST': os.environ.get('LUWAS_PG_HOST', 'localhost')},
+        'replica': {
+            **_postgres,
+            'HOST': os.environ.get('LUWAS_PG_REPLICA_HOST', os.environ.get('LUWAS_PG_HOST', 'localhost')),
+            'TEST': {'MIRROR': 'default'},
+        },
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('LUWAS_SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        }
+    }
+    if DB_PROFILE in ('sqlite-production', 'sqlite-replica'):
+        DATABASES['default'].update(SQLITE_PRODUCTION)
+    if DB_PROFILE == 'sqlite-replica':
+        DATABASES['replica'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('LUWAS_REPLICA_SQLITE_PATH', BASE_DIR / 'db-replica.sqlite3'),
+            **SQLITE_PRODUCTION,
+            'TEST': {'MIRROR': 'default'},
+        }
+
+DATABASE_ROUTERS = ['luwasapp.replicas.ReplicaRouter']
+
+# After a write, the same browser reads from the primary for this long, so it sees its own changes
+# through replication lag
+REPLICA_STICKY_SECONDS = 10
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Per-process by default; set LUWAS_REDIS_URL (and install redis) when running several workers so invalidations
+# (dashboard counters, routing index, logged-in users, sessions) are seen by all of them.
+
+REDIS_URL = os.environ.get('LUWAS_REDIS_URL', '')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL, 'KEY_PREFIX': 'luwas'},
+        'sessions': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL, 'KEY_PREFIX': 'luwas-sessions'},
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'luwas',
+            # Room for the rendered incident fragments (fragments.py) besides the small keys
+            'OPTIONS': {'MAX_ENTRIES': 20000},
+        },
+        # Sessions on their own, so culled fragments don't push them out
+        'sessions': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'luwas-sessions',
+            'OPTIONS': {'MAX_ENTRIES': 20000},
+        },
+    }
+
+# Sessions are read from the cache and written through to the database, which keeps them across
+# restarts and cache evictions
+SESSION_ENGINE = 'luwasapp.sessions'
+SESSION_CACHE_ALIAS = 'sessions'
+
+# Upper bound on how long a cached dashboard series can outlive a change made in another process
+DASHBOARD_CACHE_TIMEOUT = 60
+
+# With a per-process cache: how long another worker may keep accepting a user or session after it is
+# deactivated, logged out or has its password changed (users.py, sessions.py)
+LOCAL_AUTH_CACHE_TIMEOUT = 5
+
+# /metrics is for staff, or for a scraper sending "Authorization: Bearer <token>" when this is set
+METRICS_TOKEN = os.environ.get('LUWAS_METRICS_TOKEN', '')
 
 
 # Password validation
@@ -127,6 +251,55 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_URL = 'login'
 
-import os
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Reverse geocoding (see luwasapp/geocoding.py for the defaults)
+
+from datetime import timedelta
+
+GEOCODING = {
+    'PRECISION': 4,
+    'TTL': timedelta(days=30),
+    'STALE_TTL': timedelta(days=7),
+    'NEGATIVE_TTL': timedelta(hours=1),
+    'TIMEOUT': 5,
+    'RATE_LIMIT': 1.0,
+    'WORKER': os.environ.get('GEOCODING_WORKER', 'thread'),
+    'NOMINATIM_URL': os.environ.get('NOMINATIM_URL', 'https://nominatim.openstreetmap.org/reverse'),
+    'OPENCAGE_KEY': os.environ.get('OPENCAGE_KEY', '0addd8efb8194cebb0d715a1cb3d980d'),
+}
+
+# Profile image thumbnails (see luwasapp/avatars.py); with 'command', run `manage.py profile_thumbnails --poll-interval 5`
+
+PROFILE_IMAGES = {
+    'FORMAT': 'webp',
+    'WORKER': os.environ.get('PROFILE_IMAGES_WORKER', 'thread'),
+}
+
+# Incident photos (see luwasapp/attachments.py); with 'command', run `manage.py process_attachments --poll-interval 5`
+
+ATTACHMENTS = {
+    'MAX_SIZE': 20 * 1024 * 1024,
+    'WORKER': os.environ.get('ATTACHMENTS_WORKER', 'thread'),
+}
+
+# Outgoing mail (assignment notifications). Point EMAIL_HOST/EMAIL_PORT at `manage.py smtp_stub_server` to test locally.
+
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 25))
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', '') == '1'
+EMAIL_TIMEOUT = 10
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'Luwas <no-reply@luwas.local>')
+
+# Assignment notification outbox (see luwasapp/notifications.py for the defaults)
+
+NOTIFICATIONS = {
+    'BATCH_SIZE': 200,
+    'CONCURRENCY': 4,
+    'MAX_ATTEMPTS': 5,
+    'RETRY_BASE': timedelta(seconds=30),
+    'MAX_AGE': timedelta(days=1),
+}